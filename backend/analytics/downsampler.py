@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+import config
+from database.repositories.data_repository import DataRepository
+from log_handler.log_handler import Module, log as logger
+
+
+class Downsampler:
+    """
+    Downsamples the data of a test to a given pixel width for chart rendering.
+
+    Methods:
+    - "minmax": the samples are split into width / 2 buckets, returning min and max per bucket and channel.
+    - "lttb": Largest-Triangle-Three-Buckets, returning width representative points per channel.
+    Results are cached per (test, width, range, method, channels) and invalidated when the test receives new data.
+    """
+
+    CHANNELS: List[str] = DataRepository.CHANNELS
+    METHODS: List[str] = ['minmax', 'lttb']
+
+    @staticmethod
+    def __lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+        """
+        Selects the indices of the points to keep using Largest-Triangle-Three-Buckets.
+        :param x: the x values (timestamps).
+        :param y: the y values of a single channel.
+        :param threshold: the number of points to keep.
+        :return: the indices of the selected points.
+        """
+        n: int = len(y)
+        if threshold >= n or threshold < 3:
+            return np.arange(n)
+        every: float = (n - 2) / (threshold - 2)
+        indices: np.ndarray = np.empty(threshold, dtype=np.int64)
+        indices[0], indices[-1] = 0, n - 1
+        a: int = 0
+        for i in range(threshold - 2):
+            start: int = int(i * every) + 1
+            end: int = int((i + 1) * every) + 1
+            next_end: int = min(int((i + 2) * every) + 1, n)
+            avg_x: float = x[end:next_end].mean()
+            avg_y: float = y[end:next_end].mean()
+            area: np.ndarray = np.abs(
+                (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+            )
+            a = start + int(np.argmax(area))
+            indices[i + 1] = a
+        return indices
+
+    def __downsample(
+            self,
+            timestamps: np.ndarray,
+            values: np.ndarray,
+            width: int,
+            method: str,
+            channels: List[str]
+    ) -> Dict[str, Any]:
+        n: int = len(timestamps)
+        if n <= width:
+            return {
+                'method': 'raw',
+                'samples': n,
+                'timestamps': timestamps.tolist(),
+                'channels': {channel: values[:, i].tolist() for i, channel in enumerate(channels)}
+            }
+        if method == 'lttb':
+            result: Dict[str, Any] = {}
+            for i, channel in enumerate(channels):
+                indices: np.ndarray = self.__lttb_indices(timestamps.astype(np.float64), values[:, i], width)
+                result[channel] = {
+                    'timestamps': timestamps[indices].tolist(),
+                    'values': values[indices, i].tolist()
+                }
+            return {'method': 'lttb', 'samples': n, 'channels': result}
+        buckets: int = max(1, width // 2)
+        edges: np.ndarray = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+        minimums: np.ndarray = np.minimum.reduceat(values, edges, axis=0)
+        maximums: np.ndarray = np.maximum.reduceat(values, edges, axis=0)
+        return {
+            'method': 'minmax',
+            'samples': n,
+            'timestamps': timestamps[edges].tolist(),
+            'channels': {
+                channel: {'min': minimums[:, i].tolist(), 'max': maximums[:, i].tolist()}
+                for i, channel in enumerate(channels)
+            }
+        }
+
+    def get_downsampled(
+            self,
+            test_name: str,
+            width: int,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            method: str = 'minmax',
+            channels: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Get the downsampled data of a test.
+        :param test_name: the test name.
+        :param width: the chart width in pixels.
+        :param start: (Optional) range start (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :param end: (Optional) range end (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :param method: (Optional) "minmax" (default) or "lttb".
+        :param channels: (Optional) the channels to return, default: all.
+        :return: the downsampled data. Timestamps are seconds since epoch (naive, as stored).
+        :raise ValueError: if the parameters are invalid.
+        """
+        if width < 2:
+            raise ValueError('Width must be at least 2.')
+        if method not in self.METHODS:
+            raise ValueError(f'Unknown method "{method}". Available: {self.METHODS}')
+        channels = channels or self.CHANNELS
+        unknown: List[str] = [channel for channel in channels if channel not in self.CHANNELS]
+        if len(unknown):
+            raise ValueError(f'Unknown channels: {unknown}')
+        key: Tuple = (test_name, width, start, end, method, tuple(channels))
+        last_id: Optional[int] = self.__data_repository.get_last_id_by_test_name(test_name)
+        with self.__lock:
+            cached = self.__cache.get(key)
+            if cached is not None and cached[0] == last_id:
+                self.__cache.move_to_end(key)
+                return cached[1]
+        timestamps, values = self.__data_repository.query_channels(
+            test_name=test_name,
+            start=start,
+            end=end,
+            channels=channels
+        )
+        result: Dict[str, Any] = self.__downsample(timestamps, values, width, method, channels)
+        result['test_name'] = test_name
+        with self.__lock:
+            self.__cache[key] = (last_id, result)
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        logger.debug(f'Downsampled test \"{test_name}\" to width {width} ({method}).', module=Module.ANALYTICS)
+        return result
+
+    def __init__(self, data_repository: DataRepository, cache_size: Optional[int] = None):
+        """
+        Constructor.
+        :param data_repository: the data repository to read test data from.
+        :param cache_size: (Optional) the maximum number of cached results, default: config.DOWNSAMPLE_CACHE_SIZE.
+        """
+        self.__data_repository: DataRepository = data_repository
+        self.__cache_size: int = config.DOWNSAMPLE_CACHE_SIZE if cache_size is None else cache_size
+        self.__cache: OrderedDict[Tuple, Tuple[Optional[int], Dict[str, Any]]] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
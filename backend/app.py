@@ -1,18 +1,29 @@
-import json
+import os
+import tempfile
 from typing import Tuple
 
-from flask import Flask, request, send_from_directory
+from flask import Flask, request, send_file, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 
+import config
+from metrics.metrics import metrics, CONTENT_TYPE
+from metrics.tracing import tracer
 from middleware.connections_handler import MiddlewareConnectionHandler
 from ml_helper import ml_helper
+from responses.response_layer import response_layer, dumps
+from serial_com.port_discovery import port_discovery
 
-ml_helper.init()
 app = Flask(__name__, static_folder='build/static', template_folder='build')
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=config.SERVER_ASYNC_MODE)
 CORS(app, origins=['*'])
+response_layer.init_app(app)
 middleware: MiddlewareConnectionHandler = MiddlewareConnectionHandler()
+ml_helper.init()
+port_discovery.start(lambda ports: socketio.emit('ports_changed', {'ports': ports}))
+if config.SIMULATED_DEVICES > 0:
+    from simulator.device_simulator import start_simulated_devices
+    start_simulated_devices(config.SIMULATED_DEVICES, rate=config.SIMULATED_DEVICE_RATE)
 
 
 def get_error_message(*args) -> Tuple[str, int]:
@@ -22,11 +33,11 @@ def get_error_message(*args) -> Tuple[str, int]:
     :return: a json error message and a 401 status code.
     """
     if not len(args):
-        return json.dumps({'error': 'Error in request.'}), 401
+        return dumps({'error': 'Error in request.'}), 401
     if len(args) == 1:
-        return json.dumps({'error': f'Missing data. Required: "{args[0]}"'}), 401
+        return dumps({'error': f'Missing data. Required: "{args[0]}"'}), 401
     args = ' and '.join([f'"{arg}"' for arg in args])
-    return json.dumps({'error': f'Missing data. Required: {args}'}), 401
+    return dumps({'error': f'Missing data. Required: {args}'}), 401
 
 
 def validate_body(body, args) -> bool:
@@ -62,6 +73,23 @@ def catch_all(path):
     return send_from_directory('build', 'index.html')
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Exposes the acquisition metrics in the Prometheus text format.
+    """
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+
+@app.route('/debug/traces', methods=['GET'])
+def get_traces():
+    """
+    Dumps the most recent frame traces and per-stage latency percentiles.
+    """
+    limit = request.args.get('limit', default=100, type=int)
+    return dumps({'summary': tracer.get_summary(), 'traces': tracer.get_traces(limit)}), 200
+
+
 @app.route('/get_serial_ports', methods=['GET'])
 def get_serial_ports():
     return middleware.get_serial_ports()
@@ -133,6 +161,105 @@ def get_substance():
     return middleware.get_test_substance(body[args[0]])
 
 
+@app.route('/get_test_data_downsampled', methods=['POST'])
+def get_test_data_downsampled():
+    body = request.get_json()
+    args = ['test_name', 'width']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    return middleware.get_downsampled_test_data(
+        body[args[0]],
+        body[args[1]],
+        start=body.get('start'),
+        end=body.get('end'),
+        method=body.get('method', 'minmax'),
+        channels=body.get('channels')
+    )
+
+
+@app.route('/get_data_rollups', methods=['POST'])
+def get_data_rollups():
+    body = request.get_json()
+    args = ['resolution']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    return middleware.get_data_rollups(
+        body[args[0]],
+        test_name=body.get('test_name'),
+        substance_id=body.get('substance_id'),
+        start=body.get('start'),
+        end=body.get('end')
+    )
+
+
+@app.route('/archive_test', methods=['POST'])
+def archive_test():
+    body = request.get_json()
+    args = ['test_name']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    return middleware.archive_test(body[args[0]], prune=body.get('prune'))
+
+
+@app.route('/get_archived_tests', methods=['GET'])
+def get_archived_tests():
+    return middleware.get_archived_tests()
+
+
+@app.route('/get_test_gaps', methods=['POST'])
+def get_test_gaps():
+    body = request.get_json()
+    args = ['test_name']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    return middleware.get_test_gaps(body[args[0]])
+
+
+@app.route('/export_test_csv', methods=['POST'])
+def export_test_csv():
+    """
+    Streams the data of a test as CSV file, exported from a consistent snapshot.
+    """
+    body = request.get_json()
+    args = ['test_name']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    handle, filename = tempfile.mkstemp(suffix='.csv')
+    os.close(handle)
+    result, code = middleware.export_test_csv(body[args[0]], filename)
+    if code != 200:
+        os.remove(filename)
+        return result, code
+    response = send_file(filename, mimetype='text/csv', as_attachment=True, download_name=f'{body[args[0]]}.csv')
+    response.call_on_close(lambda: os.remove(filename))
+    return response
+
+
+@app.route('/create_backup', methods=['POST'])
+def create_backup():
+    return middleware.create_backup()
+
+
+@app.route('/get_backups', methods=['GET'])
+def get_backups():
+    return middleware.get_backups()
+
+
+@app.route('/run_maintenance', methods=['POST'])
+def run_maintenance():
+    return middleware.run_maintenance()
+
+
+@app.route('/convert_database_vacuum', methods=['POST'])
+def convert_database_vacuum():
+    return middleware.convert_database_vacuum()
+
+
+@app.route('/get_database_size_history', methods=['GET'])
+def get_database_size_history():
+    return middleware.get_database_size_history(request.args.get('start'))
+
+
 @app.route('/update_test_substance', methods=['POST'])
 def update_test_substance():
     body = request.get_json()
@@ -161,6 +288,15 @@ def register_device():
     return middleware.register_device(body[args[0]], body[args[1]])
 
 
+@app.route('/register_devices', methods=['POST'])
+def register_devices():
+    body = request.get_json()
+    args = ['devices']
+    if not validate_body(body, args):
+        return get_error_message(*args)
+    return middleware.register_devices(body[args[0]], timeout=body.get('timeout'))
+
+
 @app.route('/de_register_device', methods=['POST'])
 def de_register_device():
     body = request.get_json()
@@ -170,6 +306,23 @@ def de_register_device():
     return middleware.de_register_device(body['device_nickname'])
 
 
+@socketio.on('subscribe_test')
+def subscribe_test(body):
+    """
+    Subscribes the client to the data events of a test (used when EMIT_ROOMS is enabled).
+    """
+    if not validate_body(body, ['test_name']):
+        return
+    join_room(body['test_name'])
+
+
+@socketio.on('unsubscribe_test')
+def unsubscribe_test(body):
+    if not validate_body(body, ['test_name']):
+        return
+    leave_room(body['test_name'])
+
+
 @app.route('/get_ml_data', methods=['GET'])
 def get_ml_data():
     ml_helper.init()
@@ -179,4 +332,5 @@ def get_ml_data():
 
 
 if __name__ == '__main__':
-    app.run('0.0.0.0', port=8080)
+    # Flask development server, the production entry point is server.py
+    app.run(config.SERVER_HOST, port=config.SERVER_PORT)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Acquisition throughput benchmark (offline, Linux/macOS).
+
+Drives N simulated devices (simulator/device_simulator.py) through MiddlewareConnectionHandler.register_device
+and start_stop_test, i.e. SerialComHandler -> TestHandler -> DataRepository -> DataEmitter -> MLHelper, and
+measures per device count:
+- sustained frames per second persisted (offered load: devices * rate),
+- persist/parse/emit latency percentiles (from the frame traces, see metrics/tracing.py),
+- CPU per device (user + system time of the backend process) and resident memory,
+- SQLite file growth.
+
+Every device count runs in a fresh process. The simulator and a stub ML backend (answers 200) run in separate
+processes, so their CPU time is not attributed to the acquisition stack. Socketio emits go to a stub without
+clients.
+
+Usage (from the backend directory):
+    python -m benchmarks.acquisition_benchmark --devices 1 10 50 --rate 10 --duration 30
+    python -m benchmarks.acquisition_benchmark --devices 10 --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import http.server
+import json
+import os
+import platform
+import resource
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR: str = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+
+class _NullSocketIO:
+    """
+    Socketio stand-in without clients, the emit cost of the DataEmitter is still measured.
+    """
+
+    def emit(self, *args, **kwargs) -> None:
+        pass
+
+
+class _MLSinkHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stub ML backend, accepts every request.
+    """
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body: bytes = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _serve_ml_sink(port: int) -> None:
+    http.server.ThreadingHTTPServer(('127.0.0.1', port), _MLSinkHandler).serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 10) -> None:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'Port {port} did not open.')
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _rss_bytes() -> int:
+    """
+    Current resident memory (Linux), peak resident memory elsewhere.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _db_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def _count_rows(path: str) -> int:
+    conn: sqlite3.Connection = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM Data').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not len(values):
+        return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+    quantiles: List[float] = statistics.quantiles(values, n=100, method='inclusive') \
+        if len(values) > 1 else values * 99
+    return {
+        'count': len(values),
+        'p50_ms': round(quantiles[49], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'max_ms': round(max(values), 3)
+    }
+
+
+def _stage_latencies(traces: List[Dict[str, Any]], since: datetime) -> Dict[str, Dict[str, Optional[float]]]:
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        if datetime.strptime(trace['time'], '%Y-%m-%d %H:%M:%S.%f') < since:
+            continue
+        for span in trace['spans']:
+            durations.setdefault(span['stage'], []).append(span['duration_ms'])
+    return {stage: _percentiles(values) for stage, values in durations.items()}
+
+
+def run_single(ports: List[str], rate: float, warmup: float, duration: float) -> Dict[str, Any]:
+    """
+    Runs one measurement in this process (the environment is prepared by run_benchmark).
+    :param ports: the simulated device ports.
+    :param rate: the frame rate per device.
+    :param warmup: seconds before the measurement starts.
+    :param duration: measured seconds.
+    :return: the results.
+    """
+    import config
+    from metrics.tracing import tracer
+    from middleware.connections_handler import MiddlewareConnectionHandler
+
+    middleware: MiddlewareConnectionHandler = MiddlewareConnectionHandler()
+    socketio: _NullSocketIO = _NullSocketIO()
+    registration_start: float = time.perf_counter()
+    for i, port in enumerate(ports):
+        response, code = middleware.register_device(f'bench-{i}', port)
+        if code != 200:
+            raise RuntimeError(f'Registering device on "{port}" failed: {response}')
+    registration_seconds: float = time.perf_counter() - registration_start
+    for i in range(len(ports)):
+        response, code = middleware.start_stop_test(f'bench-test-{i}', f'bench-{i}', True, socketio)
+        if code != 200:
+            raise RuntimeError(f'Starting test on device {i} failed: {response}')
+
+    time.sleep(warmup)
+    since: datetime = datetime.now()
+    rows_before: int = _count_rows(config.DB_PATH)
+    size_before: int = _db_size(config.DB_PATH)
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start: float = time.monotonic()
+    time.sleep(duration)
+    elapsed: float = time.monotonic() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    rows_after: int = _count_rows(config.DB_PATH)
+    size_after: int = _db_size(config.DB_PATH)
+    rss: int = _rss_bytes()
+    traces: List[Dict[str, Any]] = tracer.get_traces()
+
+    for i in range(len(ports)):
+        middleware.start_stop_test(f'bench-test-{i}', f'bench-{i}', True, socketio)
+    for i in range(len(ports)):
+        middleware.de_register_device(f'bench-{i}')
+
+    frames: int = rows_after - rows_before
+    cpu_seconds: float = (usage_after.ru_utime - usage_before.ru_utime) + \
+                         (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        'devices': len(ports),
+        'offered_fps': round(len(ports) * rate, 3),
+        'sustained_fps': round(frames / elapsed, 3),
+        'frames': frames,
+        'registration_seconds': round(registration_seconds, 3),
+        'latency': _stage_latencies(traces, since),
+        'cpu_percent_total': round(cpu_seconds / elapsed * 100, 3),
+        'cpu_percent_per_device': round(cpu_seconds / elapsed * 100 / len(ports), 3),
+        'rss_bytes': rss,
+        'db_growth_bytes': size_after - size_before,
+        'db_bytes_per_frame': round((size_after - size_before) / frames, 1) if frames else None
+    }
+
+
+def run_benchmark(
+        devices: int,
+        rate: float,
+        warmup: float,
+        duration: float,
+        ml_url: str,
+        log_level: str
+) -> Dict[str, Any]:
+    """
+    Runs one device count with a fresh database, simulator and backend process.
+    """
+    with tempfile.TemporaryDirectory(prefix='acquisition-benchmark-') as tmp:
+        env: Dict[str, str] = {
+            **os.environ,
+            'DB_PATH': os.path.join(tmp, 'benchmark.db'),
+            'ARCHIVE_DIR': os.path.join(tmp, 'archive'),
+            'ARCHIVE_ON_STOP': 'false',
+            'LOGFILE': os.path.join(tmp, 'benchmark.log'),
+            'LOG_LEVEL': log_level,
+            'ML_BACKEND_URL': ml_url,
+            'SIMULATED_DEVICES': '0',
+            'PORT_DISCOVERY_WATCH': 'false',
+            'PORT_DISCOVERY_POLL_INTERVAL': '0',
+            'TRACE_BUFFER_SIZE': str(int(devices * rate * (warmup + duration) * 1.5) + 1000),
+            'TRACE_SAMPLE_RATE': '1'
+        }
+        simulator: subprocess.Popen = subprocess.Popen(
+            [sys.executable, '-m', 'simulator.device_simulator', '-n', str(devices), '--rate', str(rate),
+             '--seed', '1'],
+            cwd=BACKEND_DIR, env={**env, 'LOGFILE': os.devnull, 'LOG_LEVEL': 'silent'},
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        try:
+            ports: List[str] = [simulator.stdout.readline().split()[1] for _ in range(devices)]
+            result = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.acquisition_benchmark', '--single', *ports,
+                 '--rate', str(rate), '--warmup', str(warmup), '--duration', str(duration)],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+            )
+        finally:
+            simulator.terminate()
+            simulator.wait()
+        if result.returncode != 0:
+            raise RuntimeError(f'Benchmark with {devices} devices failed:\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results: Dict[str, Any], baseline_path: str) -> None:
+    """
+    Prints the relative change of the main figures against a previous result file.
+    """
+    with open(baseline_path) as f:
+        baseline: Dict[str, Any] = json.load(f)
+    previous: Dict[int, Dict[str, Any]] = {run['devices']: run for run in baseline['results']}
+    print(f'Compared to {baseline.get("commit")} ({baseline.get("timestamp")}):')
+    for run in results['results']:
+        old: Optional[Dict[str, Any]] = previous.get(run['devices'])
+        if old is None:
+            continue
+        figures: Dict[str, tuple] = {
+            'sustained_fps': (old['sustained_fps'], run['sustained_fps']),
+            'persist_p99_ms': (old['latency'].get('persist', {}).get('p99_ms'),
+                               run['latency'].get('persist', {}).get('p99_ms')),
+            'cpu_percent_per_device': (old['cpu_percent_per_device'], run['cpu_percent_per_device']),
+            'rss_bytes': (old['rss_bytes'], run['rss_bytes'])
+        }
+        changes: List[str] = []
+        for name, (before, after) in figures.items():
+            if before and after is not None:
+                changes.append(f'{name} {before} -> {after} ({(after - before) / before * 100:+.1f}%)')
+        print(f'  {run["devices"]} devices: ' + ', '.join(changes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Acquisition throughput benchmark with simulated devices.')
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 10], help='device counts to benchmark')
+    parser.add_argument('--rate', type=float, default=10, help='frames per second per device')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds before measuring')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds per device count')
+    parser.add_argument('--log-level', default='info', help='backend LOG_LEVEL during the benchmark')
+    parser.add_argument('--output', default=None, help='result file, default: benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', default=None, help='previous result file to compare with')
+    parser.add_argument('--single', nargs='+', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--ml-sink', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ml_sink is not None:
+        _serve_ml_sink(args.ml_sink)
+        return
+    if args.single is not None:
+        print(json.dumps(run_single(args.single, args.rate, args.warmup, args.duration)))
+        return
+
+    sink_port: int = _free_port()
+    sink: subprocess.Popen = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.acquisition_benchmark', '--ml-sink', str(sink_port)], cwd=BACKEND_DIR
+    )
+    commit: Optional[str] = _git_commit()
+    results: Dict[str, Any] = {
+        'benchmark': 'acquisition',
+        'commit': commit,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': {
+            'python': platform.python_version(),
+            'system': platform.system(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count()
+        },
+        'parameters': {
+            'rate': args.rate,
+            'warmup': args.warmup,
+            'duration': args.duration,
+            'log_level': args.log_level
+        },
+        'results': []
+    }
+    try:
+        _wait_for_port(sink_port)
+        for devices in args.devices:
+            print(f'Benchmarking {devices} device(s) at {args.rate} fps each...', flush=True)
+            run: Dict[str, Any] = run_benchmark(
+                devices, args.rate, args.warmup, args.duration, f'http://127.0.0.1:{sink_port}', args.log_level
+            )
+            persist: Dict[str, Any] = run['latency'].get('persist', {})
+            print(f'  {run["sustained_fps"]}/{run["offered_fps"]} fps, persist p50 {persist.get("p50_ms")} ms, '
+                  f'p99 {persist.get("p99_ms")} ms, {run["cpu_percent_per_device"]}% CPU/device, '
+                  f'{run["rss_bytes"] // 1024 // 1024} MiB RSS', flush=True)
+            results['results'].append(run)
+    finally:
+        sink.terminate()
+        sink.wait()
+
+    output: str = args.output or os.path.join(
+        RESULTS_DIR, f'acquisition-{commit or "unknown"}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
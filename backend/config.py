@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import os
+from typing import Optional, List, Dict
+
 import dotenv
 from log_handler.log_handler import log as logger, Module
 
@@ -9,3 +11,118 @@ if os.path.isfile('.env'):
 
 DB_PATH: str = os.getenv('DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database/database.db'))
 ML_BACKEND_URL: str = os.getenv('ML_BACKEND_URL', 'http://localhost:9090')
+
+
+def parse_boolean(value: Optional[str] | bool) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None or not len(value.strip()):
+        return False
+    return 'true' in value.lower()
+
+
+def parse_float(value: Optional[str], default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_int(value: Optional[str], default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_int_list(value: Optional[str], default: List[int]) -> List[int]:
+    try:
+        return [int(item) for item in value.split(',') if len(item.strip())]
+    except (AttributeError, ValueError):
+        return default
+
+
+def parse_retention_policies(value: Optional[str]) -> Dict[str, float]:
+    """
+    Parses comma separated "<pattern>=<days>" policies, e.g. "DEBUG*=7,tmp_*=1". Invalid entries are skipped.
+    """
+    policies: Dict[str, float] = {}
+    for item in (value or '').split(','):
+        pattern, _, days = item.strip().rpartition('=')
+        try:
+            if len(pattern.strip()) and float(days) > 0:
+                policies[pattern.strip()] = float(days)
+        except ValueError:
+            logger.warning(f'Invalid retention policy "{item}", skipped.', module=Module.SETUP)
+    return policies
+
+
+# Socketio emit settings, see middleware/data_emitter.py
+EMIT_INTERVAL: float = parse_float(os.getenv('EMIT_INTERVAL'), 0)
+EMIT_ROOMS: bool = parse_boolean(os.getenv('EMIT_ROOMS', False))
+EMIT_BINARY: bool = parse_boolean(os.getenv('EMIT_BINARY', False))
+# Maximum number of cached downsampling results, see analytics/downsampler.py
+DOWNSAMPLE_CACHE_SIZE: int = parse_int(os.getenv('DOWNSAMPLE_CACHE_SIZE'), 64)
+# Bucket sizes (seconds) of the aggregated data rollups, see database/repositories/rollup_repository.py
+ROLLUP_RESOLUTIONS: List[int] = parse_int_list(os.getenv('ROLLUP_RESOLUTIONS'), [60, 600])
+# Parquet archive of completed tests (requires pyarrow), see database/repositories/archive_repository.py
+ARCHIVE_DIR: str = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(DB_PATH), 'archive'))
+ARCHIVE_ON_STOP: bool = parse_boolean(os.getenv('ARCHIVE_ON_STOP', False))
+ARCHIVE_PRUNE: bool = parse_boolean(os.getenv('ARCHIVE_PRUNE', False))
+ARCHIVE_COMPRESSION: str = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+# Serial port discovery, see serial_com/port_discovery.py
+PORT_DISCOVERY_TTL: float = parse_float(os.getenv('PORT_DISCOVERY_TTL'), 2)
+PORT_DISCOVERY_WATCH: bool = parse_boolean(os.getenv('PORT_DISCOVERY_WATCH', True))
+PORT_DISCOVERY_POLL_INTERVAL: float = parse_float(os.getenv('PORT_DISCOVERY_POLL_INTERVAL'), 5)
+# Bulk device registration (/register_devices): concurrent handshakes and per-device timeout in seconds
+REGISTRATION_WORKERS: int = parse_int(os.getenv('REGISTRATION_WORKERS'), 8)
+REGISTRATION_TIMEOUT: float = parse_float(os.getenv('REGISTRATION_TIMEOUT'), 15)
+# Reconnect running tests after the serial connection was lost, see middleware/serial_db_test_handler.py
+RECONNECT_ENABLED: bool = parse_boolean(os.getenv('RECONNECT_ENABLED', True))
+RECONNECT_INTERVAL: float = parse_float(os.getenv('RECONNECT_INTERVAL'), 2)
+# Maximum time in seconds to search for the device before the test is stopped, 0 retries forever
+RECONNECT_TIMEOUT: float = parse_float(os.getenv('RECONNECT_TIMEOUT'), 600)
+# Per-frame span tracing, see metrics/tracing.py and /debug/traces. TRACE_BUFFER_SIZE=0 disables tracing.
+TRACE_BUFFER_SIZE: int = parse_int(os.getenv('TRACE_BUFFER_SIZE'), 1000)
+TRACE_SAMPLE_RATE: float = parse_float(os.getenv('TRACE_SAMPLE_RATE'), 1)
+# Start simulated SmellInspector devices on pseudo-terminals (Linux/macOS), see simulator/device_simulator.py
+SIMULATED_DEVICES: int = parse_int(os.getenv('SIMULATED_DEVICES'), 0)
+SIMULATED_DEVICE_RATE: float = parse_float(os.getenv('SIMULATED_DEVICE_RATE'), 1 / 1.8)
+# Web server, see server.py. SERVER_ASYNC_MODE: threading (waitress) or gevent (must be installed).
+SERVER_HOST: str = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT: int = parse_int(os.getenv('SERVER_PORT'), 8080)
+SERVER_ASYNC_MODE: str = (os.getenv('SERVER_ASYNC_MODE') or 'threading').strip().lower()
+if SERVER_ASYNC_MODE not in ('threading', 'gevent'):
+    logger.warning(f'Unknown SERVER_ASYNC_MODE "{SERVER_ASYNC_MODE}", using threading.', module=Module.SETUP)
+    SERVER_ASYNC_MODE = 'threading'
+# Worker threads of the threading mode, every waiting long-polling Socket.IO client occupies one
+SERVER_THREADS: int = parse_int(os.getenv('SERVER_THREADS'), 64)
+SERVER_CONNECTION_LIMIT: int = parse_int(os.getenv('SERVER_CONNECTION_LIMIT'), 1000)
+# Maximum time in seconds to wait for pending ML backend requests and open connections on shutdown
+SHUTDOWN_TIMEOUT: float = parse_float(os.getenv('SHUTDOWN_TIMEOUT'), 10)
+# Response compression (gzip, brotli if installed) above a size in bytes and ETags, see responses/response_layer.py
+RESPONSE_COMPRESSION: bool = parse_boolean(os.getenv('RESPONSE_COMPRESSION', True))
+RESPONSE_COMPRESSION_MIN_SIZE: int = parse_int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE'), 1024)
+RESPONSE_COMPRESSION_LEVEL: int = parse_int(os.getenv('RESPONSE_COMPRESSION_LEVEL'), 6)
+RESPONSE_ETAGS: bool = parse_boolean(os.getenv('RESPONSE_ETAGS', True))
+# WAL journal mode lets snapshots (ML sync, backups, CSV exports) read while tests write, see snapshot_service.py
+DB_WAL: bool = parse_boolean(os.getenv('DB_WAL', True))
+SNAPSHOT_DIR: str = os.getenv('SNAPSHOT_DIR') or os.path.join(os.path.dirname(DB_PATH), 'snapshots')
+# Pages copied per backup step and seconds between the steps
+SNAPSHOT_PAGES: int = parse_int(os.getenv('SNAPSHOT_PAGES'), 1024)
+SNAPSHOT_SLEEP: float = parse_float(os.getenv('SNAPSHOT_SLEEP'), 0.005)
+BACKUP_DIR: str = os.getenv('BACKUP_DIR') or os.path.join(os.path.dirname(DB_PATH), 'backups')
+# Number of kept backups, 0 keeps all
+BACKUP_RETENTION: int = parse_int(os.getenv('BACKUP_RETENTION'), 7)
+# Background database maintenance every MAINTENANCE_INTERVAL seconds (0 disables), see database/maintenance_service.py
+MAINTENANCE_INTERVAL: float = parse_float(os.getenv('MAINTENANCE_INTERVAL'), 3600)
+# Retention in days: samples older than RETENTION_MAX_AGE_DAYS (0 keeps all), samples of matching devices
+# ("<MAC glob>=<days>") and whole tests whose last sample is older than their policy ("<test name glob>=<days>")
+RETENTION_MAX_AGE_DAYS: float = parse_float(os.getenv('RETENTION_MAX_AGE_DAYS'), 0)
+RETENTION_DEVICE_POLICIES: Dict[str, float] = parse_retention_policies(os.getenv('RETENTION_DEVICE_POLICIES'))
+RETENTION_TEST_POLICIES: Dict[str, float] = parse_retention_policies(os.getenv('RETENTION_TEST_POLICIES'))
+# Rows deleted per transaction and seconds between the batches
+RETENTION_BATCH_SIZE: int = parse_int(os.getenv('RETENTION_BATCH_SIZE'), 1000)
+RETENTION_BATCH_SLEEP: float = parse_float(os.getenv('RETENTION_BATCH_SLEEP'), 0.05)
+# Free pages returned to the file system per incremental vacuum step
+VACUUM_PAGES: int = parse_int(os.getenv('VACUUM_PAGES'), 1024)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import csv
 import os
-from typing import Tuple, List
+from typing import Tuple, List, Iterable
 
 from log_handler.log_handler import Module, log as logger
 
@@ -25,21 +25,19 @@ class CSVHandler:
         writer.writerow(headers)
 
     @staticmethod
-    def __write_content(writer, content: [[str]]) -> None:
+    def __write_content(writer, content: Iterable[Iterable]) -> None:
         """
-        Write the csv content.
+        Write the csv content row by row, so cursors are streamed to the file.
         :param content: the csv content.
         :return:
         """
         logger.info('Writing CSV content to file...', module=Module.CSV)
-        filtered = []
         for line in content:
             filtered_line = [str(item) if item is not None else '' for item in line]
-            filtered.append(filtered_line)
             logger.debug('Writing row:', filtered_line, module=Module.CSV)
-        writer.writerows(filtered)
+            writer.writerow(filtered_line)
 
-    def export(self, headers: List[str], data: List[List[str]], filename: str) -> str:
+    def export(self, headers: List[str], data: Iterable[Iterable], filename: str) -> str:
         """
         Public interface for exporting csv data.
         :return:
@@ -1,9 +1,14 @@
 import os
 import sqlite3
 
+from database.maintenance_service import MaintenanceService
+from database.repositories.abstract_repository import LockingConnection
+from database.repositories.archive_repository import ArchiveRepository
 from database.repositories.data_repository import DataRepository
 from database.repositories.device_repository import DeviceRepository
+from database.repositories.rollup_repository import RollupRepository
 from database.repositories.substance_repository import SubstanceRepository
+from database.snapshot_service import SnapshotService
 from exception.Exceptions import DBInitialisationException
 from log_handler.log_handler import Module, log as logger
 import config
@@ -24,6 +29,13 @@ class DatabaseHandler:
                                 f'{__data_create_headers},'
                                 'TEMPERATURE TEXT NOT NULL,'
                                 'HUMIDITY TEXT NOT NULL );')
+    __create_gap_table_query: str = ('CREATE TABLE IF NOT EXISTS DataGap ('
+                                     'ID INTEGER PRIMARY KEY AUTOINCREMENT,'
+                                     'TEST_ID TEXT NOT NULL,'
+                                     'MAC_ADDRESS TEXT NOT NULL,'
+                                     'GAP_START DATE NOT NULL,'
+                                     'GAP_END DATE NOT NULL,'
+                                     'REASON TEXT NOT NULL);')
     __create_device_table_query: str = ('CREATE TABLE IF NOT EXISTS Device ('
                                         'ID INTEGER PRIMARY KEY AUTOINCREMENT,'
                                         'DEVICE_NAME TEXT NOT NULL,'
@@ -36,6 +48,9 @@ class DatabaseHandler:
                                            'ID INTEGER PRIMARY KEY AUTOINCREMENT,'
                                            'SUBSTANCE_NAME TEXT NOT NULL,'
                                            'QUANTITY TEXT NOT NULL);')
+    __create_data_index_query: str = 'CREATE INDEX IF NOT EXISTS Data_TEST_ID_DATETIME ON Data (TEST_ID, DATETIME);'
+    __create_data_substance_index_query: str = ('CREATE INDEX IF NOT EXISTS Data_SUBSTANCE_ID_DATETIME '
+                                                'ON Data (SUBSTANCE_ID, DATETIME);')
 
     def __create_tables(self) -> None:
         """
@@ -45,7 +60,17 @@ class DatabaseHandler:
         cursor: sqlite3.Cursor = self.conn.cursor()
         logger.info('Creating data table...', module=Module.DB)
         cursor.execute(self.__data_create_query)
+        cursor.execute(self.__create_data_index_query)
+        cursor.execute(self.__create_data_substance_index_query)
+        cursor.execute(self.__create_gap_table_query)
         logger.info('Data table created.', module=Module.DB)
+        logger.info('Creating rollup table...', module=Module.DB)
+        cursor.execute(RollupRepository.create_table_query)
+        logger.info('Rollup table created.', module=Module.DB)
+        logger.info('Creating archive catalogue table...', module=Module.DB)
+        cursor.execute(ArchiveRepository.create_table_query)
+        logger.info('Archive catalogue table created.', module=Module.DB)
+        cursor.execute(MaintenanceService.create_table_query)
         logger.info('Creating device table...', module=Module.DB)
         cursor.execute(self.__create_device_table_query)
         logger.info('Device table created.', module=Module.DB)
@@ -63,7 +88,11 @@ class DatabaseHandler:
         :return: the connection object.
         """
         logger.info(f'Connecting to database \"{db_path}\"...')
-        conn: sqlite3.Connection = sqlite3.connect(db_path, check_same_thread=False)
+        conn: sqlite3.Connection = sqlite3.connect(db_path, check_same_thread=False, factory=LockingConnection)
+        # only takes effect before the first table is created, see MaintenanceService.convert_to_incremental_vacuum
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        if config.DB_WAL:
+            conn.execute('PRAGMA journal_mode=WAL')
         logger.info('DB Connected.', module=Module.DB)
         return conn
 
@@ -73,10 +102,42 @@ class DatabaseHandler:
             if not db_path:
                 db_path: str = config.DB_PATH
             self.conn: sqlite3.Connection = self.__connect_db(db_path)
-            self.DataRepository: DataRepository = DataRepository(self.conn)
+            self.RollupRepository: RollupRepository = RollupRepository(self.conn, config.ROLLUP_RESOLUTIONS)
+            self.ArchiveRepository: ArchiveRepository = ArchiveRepository(
+                self.conn,
+                config.ARCHIVE_DIR,
+                config.ARCHIVE_COMPRESSION
+            )
+            self.DataRepository: DataRepository = DataRepository(
+                self.conn,
+                self.RollupRepository,
+                self.ArchiveRepository
+            )
             self.DeviceRepository: DeviceRepository = DeviceRepository(self.conn)
             self.SubstanceRepository: SubstanceRepository = SubstanceRepository(self.conn)
+            self.SnapshotService: SnapshotService = SnapshotService(
+                db_path,
+                config.SNAPSHOT_DIR,
+                config.BACKUP_DIR,
+                backup_retention=config.BACKUP_RETENTION,
+                pages=config.SNAPSHOT_PAGES,
+                sleep=config.SNAPSHOT_SLEEP
+            )
+            self.MaintenanceService: MaintenanceService = MaintenanceService(
+                db_path,
+                interval=config.MAINTENANCE_INTERVAL,
+                max_age_days=config.RETENTION_MAX_AGE_DAYS,
+                device_policies=config.RETENTION_DEVICE_POLICIES,
+                test_policies=config.RETENTION_TEST_POLICIES,
+                batch_size=config.RETENTION_BATCH_SIZE,
+                batch_sleep=config.RETENTION_BATCH_SLEEP,
+                vacuum_pages=config.VACUUM_PAGES,
+                rollup_resolutions=config.ROLLUP_RESOLUTIONS
+            )
             self.__create_tables()
+            if self.RollupRepository.is_empty():
+                # databases created before rollups were introduced
+                self.RollupRepository.rebuild()
             self.SubstanceRepository.create_air_substance()
             self.DeviceRepository.clear_connections()
             logger.info('Database created successfully.', module=Module.DB)
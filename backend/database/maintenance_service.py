@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from fnmatch import fnmatchcase
+from typing import Callable, Collection, Dict, Any, List, Optional
+
+from database.repositories.rollup_repository import RollupRepository
+from exception.Exceptions import MaintenanceException
+from log_handler.log_handler import Module, log as logger
+from metrics.metrics import metrics, Counter, Gauge, Histogram
+
+DELETED_SAMPLES: Counter = metrics.counter(
+    'smellinspector_retention_deleted_samples_total', 'Samples deleted by the retention policies.'
+)
+DATABASE_BYTES: Gauge = metrics.gauge(
+    'smellinspector_db_file_bytes', 'Size of the database file (without the WAL) at the last maintenance run.'
+)
+FREELIST_PAGES: Gauge = metrics.gauge(
+    'smellinspector_db_freelist_pages', 'Unused pages in the database file at the last maintenance run.'
+)
+MAINTENANCE_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_db_maintenance_seconds', 'Duration of the database maintenance runs.'
+)
+
+
+class MaintenanceService:
+    """
+    Background maintenance of the acquisition database, run every few hours and on demand.
+
+    1. Retention: deletes samples older than the maximum age or their device policy, and whole tests (with their gaps
+       and rollups) whose last sample is older than their test policy. Rows are deleted in small batches, each its
+       own transaction, so the test threads only ever wait for one batch. The rollup buckets up to the deleted range
+       are then recomputed from the remaining samples, except for archived tests: their rollups keep describing the
+       archive, which still holds the deleted samples.
+    2. While no test is running: returns the freed pages to the file system with incremental vacuum, truncates the
+       WAL and refreshes the query planner statistics (ANALYZE).
+    3. Records the database size in the DatabaseSize table.
+
+    Incremental vacuum requires auto_vacuum=INCREMENTAL, new databases are created with it. Older databases reuse
+    the freed pages but keep their file size until they are converted with convert_to_incremental_vacuum, a one-off
+    VACUUM that rewrites the whole file, started explicitly by the operator (see /convert_database_vacuum).
+    """
+
+    create_table_query: str = ('CREATE TABLE IF NOT EXISTS DatabaseSize ('
+                               'SAMPLED_AT DATE NOT NULL,'
+                               'FILE_BYTES INTEGER NOT NULL,'
+                               'WAL_BYTES INTEGER NOT NULL,'
+                               'PAGE_COUNT INTEGER NOT NULL,'
+                               'FREELIST_PAGES INTEGER NOT NULL);')
+    __HISTORY_SIZE: int = 10000
+    __ANALYSIS_LIMIT: int = 1000
+    __insert_size_query: str = 'INSERT INTO DatabaseSize VALUES (?, ?, ?, ?, ?);'
+    __trim_history_query: str = ('DELETE FROM DatabaseSize WHERE ROWID <= '
+                                 '(SELECT MAX(ROWID) FROM DatabaseSize) - ?;')
+    __delete_batch_query: str = 'DELETE FROM Data WHERE ID IN (SELECT ID FROM Data WHERE {0} LIMIT ?);'
+    __size_columns: List[str] = ['sampled_at', 'file_bytes', 'wal_bytes', 'page_count', 'freelist_pages']
+
+    def __get_conn(self) -> sqlite3.Connection:
+        """
+        Get the maintenance connection (autocommit, every statement is its own transaction), opened on first use.
+        """
+        if self.__conn is None:
+            self.__conn = sqlite3.connect(self.__db_path, check_same_thread=False, timeout=30,
+                                          isolation_level=None)
+        return self.__conn
+
+    def __get_running_tests(self) -> Collection[str]:
+        return self.__running_tests() if self.__running_tests is not None else []
+
+    def __delete_batched(self, condition: str, params: List[Any]) -> int:
+        """
+        Deletes the Data rows matching a condition in batches.
+        :param condition: the WHERE condition.
+        :param params: the parameters of the condition.
+        :return: the number of deleted rows.
+        """
+        query: str = self.__delete_batch_query.format(condition)
+        total: int = 0
+        while not self.__stopping.is_set():
+            deleted: int = self.__get_conn().execute(query, [*params, self.__batch_size]).rowcount
+            total += deleted
+            if deleted < self.__batch_size:
+                break
+            time.sleep(self.__batch_sleep)
+        DELETED_SAMPLES.inc(amount=total)
+        return total
+
+    def __delete_test(self, test_name: str) -> int:
+        """
+        Deletes a test with its gaps, and its rollups unless the test is archived.
+        """
+        deleted: int = self.__delete_batched('TEST_ID=?', [test_name])
+        conn: sqlite3.Connection = self.__get_conn()
+        conn.execute('DELETE FROM DataGap WHERE TEST_ID=?;', [test_name])
+        if conn.execute('SELECT 1 FROM ArchivedTest WHERE TEST_ID=?;', [test_name]).fetchone() is None:
+            conn.execute('DELETE FROM DataRollup WHERE TEST_ID=?;', [test_name])
+        logger.info(f'Retention deleted test \"{test_name}\" ({deleted} samples).', module=Module.MAINTENANCE)
+        return deleted
+
+    def __refresh_rollups(self, test_name: str, cutoff: str) -> None:
+        """
+        Recomputes the rollup buckets of a test up to the bucket containing the cutoff, after samples before the cutoff
+        were deleted. Archived tests keep their rollups.
+        :param test_name: the test name.
+        :param cutoff: the samples before it were deleted (format: %Y-%m-%d %H:%M:%S).
+        """
+        conn: sqlite3.Connection = self.__get_conn()
+        if conn.execute('SELECT 1 FROM ArchivedTest WHERE TEST_ID=?;', [test_name]).fetchone() is not None:
+            return
+        RollupRepository.register_functions(conn)
+        timestamp: datetime = datetime.strptime(cutoff, '%Y-%m-%d %H:%M:%S')
+        conn.execute('BEGIN IMMEDIATE;')
+        try:
+            for resolution in self.__rollup_resolutions:
+                bucket_start: str = RollupRepository.get_bucket_start(timestamp, resolution)
+                bucket_end: str = (datetime.strptime(bucket_start, '%Y-%m-%d %H:%M:%S') +
+                                   timedelta(seconds=resolution)).strftime('%Y-%m-%d %H:%M:%S')
+                conn.execute('DELETE FROM DataRollup WHERE TEST_ID=? AND RESOLUTION=? AND BUCKET_START<=?;',
+                             [test_name, resolution, bucket_start])
+                conn.execute(RollupRepository.get_rebuild_query(resolution, 'WHERE TEST_ID=? AND DATETIME<?'),
+                             [test_name, bucket_end])
+            conn.execute('COMMIT;')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK;')
+            raise
+
+    @staticmethod
+    def __get_cutoff(days: float) -> str:
+        return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def apply_retention(self) -> Dict[str, Any]:
+        """
+        Applies the retention policies. Running tests are never deleted as a whole.
+        :return: the number of deleted samples and the deleted tests.
+        :raise sqlite3.Error: on error.
+        """
+        conn: sqlite3.Connection = self.__get_conn()
+        running: Collection[str] = self.__get_running_tests()
+        test_names: List[str] = [row[0] for row in conn.execute('SELECT DISTINCT TEST_ID FROM Data;').fetchall()]
+        deleted_samples: int = 0
+        deleted_tests: List[str] = []
+        for test_name in test_names:
+            if self.__stopping.is_set():
+                break
+            test_days: List[float] = [days for pattern, days in self.__test_policies.items()
+                                      if fnmatchcase(test_name, pattern)]
+            if len(test_days) and test_name not in running:
+                last: Optional[str] = conn.execute('SELECT MAX(DATETIME) FROM Data WHERE TEST_ID=?;',
+                                                   [test_name]).fetchone()[0]
+                if last is not None and last < self.__get_cutoff(min(test_days)):
+                    deleted_samples += self.__delete_test(test_name)
+                    deleted_tests.append(test_name)
+                    continue
+            # the latest cutoff samples were deleted before, the rollups are recomputed up to it
+            trimmed: Optional[str] = None
+            deleted: int
+            if self.__max_age_days > 0:
+                cutoff: str = self.__get_cutoff(self.__max_age_days)
+                deleted = self.__delete_batched('TEST_ID=? AND DATETIME<?', [test_name, cutoff])
+                if deleted:
+                    deleted_samples += deleted
+                    trimmed = cutoff
+            for pattern, days in self.__device_policies.items():
+                cutoff = self.__get_cutoff(days)
+                deleted = self.__delete_batched('TEST_ID=? AND DATETIME<? AND MAC_ADDRESS GLOB ?',
+                                                [test_name, cutoff, pattern])
+                if deleted:
+                    deleted_samples += deleted
+                    trimmed = max(trimmed or cutoff, cutoff)
+            if trimmed is not None:
+                self.__refresh_rollups(test_name, trimmed)
+        if deleted_samples:
+            logger.info(f'Retention deleted {deleted_samples} samples.', module=Module.MAINTENANCE)
+        return {'deleted_samples': deleted_samples, 'deleted_tests': deleted_tests}
+
+    def __compact(self) -> int:
+        """
+        Returns the free pages to the file system while no test is running.
+        :return: the number of released pages.
+        """
+        conn: sqlite3.Connection = self.__get_conn()
+        if not self.is_incremental():
+            if not self.__conversion_hint_logged:
+                self.__conversion_hint_logged = True
+                logger.info('Incremental vacuum is not enabled for this database, freed pages are reused but the file '
+                            'doesn\'t shrink. Convert it with /convert_database_vacuum while no test is running.',
+                            module=Module.MAINTENANCE)
+            return 0
+        before: int = conn.execute('PRAGMA page_count;').fetchone()[0]
+        while not self.__stopping.is_set() and not len(self.__get_running_tests()):
+            free: int = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+            if not free:
+                break
+            # execute() only runs the first vacuum step, executescript() steps the pragma to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({min(free, self.__vacuum_pages)});')
+            time.sleep(self.__batch_sleep)
+        return max(0, before - conn.execute('PRAGMA page_count;').fetchone()[0])
+
+    def is_incremental(self) -> bool:
+        """
+        Checks whether the database uses auto_vacuum=INCREMENTAL.
+        """
+        return self.__get_conn().execute('PRAGMA auto_vacuum;').fetchone()[0] == 2
+
+    def convert_to_incremental_vacuum(self) -> Dict[str, Any]:
+        """
+        Converts a database created without auto_vacuum=INCREMENTAL with a one-off VACUUM. The VACUUM rewrites the
+        whole file, needs up to twice its size in free disk space and blocks all writers until it completes, so it
+        is refused while a test is running.
+        :return: whether the database was converted, the released pages and the duration.
+        :raise MaintenanceException: if a test or a maintenance run is in progress, or on error.
+        """
+        if len(self.__get_running_tests()):
+            raise MaintenanceException('Stop all tests before converting the database.')
+        if not self.__lock.acquire(blocking=False):
+            raise MaintenanceException('Maintenance is already running.')
+        start: float = time.monotonic()
+        try:
+            if self.is_incremental():
+                return {'converted': False, 'released_pages': 0, 'seconds': 0}
+            conn: sqlite3.Connection = self.__get_conn()
+            before: int = conn.execute('PRAGMA page_count;').fetchone()[0]
+            logger.info('Converting the database to incremental auto vacuum (one-off VACUUM)...',
+                        module=Module.MAINTENANCE)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+            conn.execute('VACUUM;')
+            released: int = max(0, before - conn.execute('PRAGMA page_count;').fetchone()[0])
+        except sqlite3.Error as e:
+            logger.error('Error converting the database to incremental auto vacuum. Trace:', e,
+                         module=Module.MAINTENANCE)
+            raise MaintenanceException('Error converting the database, see server logs.')
+        finally:
+            self.__lock.release()
+        seconds: float = round(time.monotonic() - start, 3)
+        logger.info(f'Database converted to incremental auto vacuum in {seconds}s.', module=Module.MAINTENANCE)
+        return {'converted': True, 'released_pages': released, 'seconds': seconds}
+
+    def __record_size(self) -> Dict[str, Any]:
+        """
+        Records the current database size in the history.
+        """
+        conn: sqlite3.Connection = self.__get_conn()
+        wal: str = f'{self.__db_path}-wal'
+        entry: List[Any] = [
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            os.path.getsize(self.__db_path),
+            os.path.getsize(wal) if os.path.exists(wal) else 0,
+            conn.execute('PRAGMA page_count;').fetchone()[0],
+            conn.execute('PRAGMA freelist_count;').fetchone()[0]
+        ]
+        conn.execute(self.__insert_size_query, entry)
+        conn.execute(self.__trim_history_query, [self.__HISTORY_SIZE])
+        DATABASE_BYTES.set(entry[1])
+        FREELIST_PAGES.set(entry[4])
+        return dict(zip(self.__size_columns, entry))
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Runs the maintenance: retention, compaction and statistics while idle, size recording.
+        :return: a report of the run.
+        :raise MaintenanceException: if a run is in progress or on error.
+        """
+        if not self.__lock.acquire(blocking=False):
+            raise MaintenanceException('Maintenance is already running.')
+        start: float = time.monotonic()
+        try:
+            report: Dict[str, Any] = self.apply_retention()
+            report['idle'] = not len(self.__get_running_tests())
+            report['released_pages'] = 0
+            if report['idle']:
+                report['released_pages'] = self.__compact()
+                conn: sqlite3.Connection = self.__get_conn()
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE);').fetchall()
+                conn.execute(f'PRAGMA analysis_limit={self.__ANALYSIS_LIMIT};').fetchall()
+                conn.execute('ANALYZE;')
+            report['size'] = self.__record_size()
+        except (sqlite3.Error, OSError) as e:
+            logger.error('Error during database maintenance. Trace:', e, module=Module.MAINTENANCE)
+            raise MaintenanceException('Error during database maintenance, see server logs.')
+        finally:
+            self.__lock.release()
+        report['seconds'] = round(time.monotonic() - start, 3)
+        MAINTENANCE_SECONDS.observe(report['seconds'])
+        logger.info(f'Maintenance completed in {report["seconds"]}s (released pages: {report["released_pages"]}, '
+                    f'file size: {report["size"]["file_bytes"]} bytes).', module=Module.MAINTENANCE)
+        return report
+
+    def get_size_history(self, start: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the recorded database sizes, oldest first.
+        :param start: (Optional) first sample time (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :raise sqlite3.Error: on error.
+        """
+        rows = self.__get_conn().execute(
+            'SELECT * FROM DatabaseSize WHERE SAMPLED_AT>=? ORDER BY ROWID;', [start or '']
+        ).fetchall()
+        return [dict(zip(self.__size_columns, row)) for row in rows]
+
+    def __maintenance_thread(self) -> None:
+        while not self.__stopping.wait(self.__interval):
+            try:
+                self.run()
+            except MaintenanceException:
+                pass  # logged, retried on the next interval
+
+    def start(self, running_tests: Callable[[], Collection[str]]) -> None:
+        """
+        Starts the periodic maintenance (unless the interval is 0).
+        :param running_tests: returns the names of the running tests, maintenance is idle while it is empty.
+        """
+        self.__running_tests = running_tests
+        if self.__interval <= 0 or self.__thread is not None:
+            return
+        self.__thread = threading.Thread(target=self.__maintenance_thread, name='db-maintenance', daemon=True)
+        self.__thread.start()
+        logger.info(f'Database maintenance scheduled every {self.__interval}s.', module=Module.MAINTENANCE)
+
+    def stop(self) -> None:
+        """
+        Stops the periodic maintenance, a running batch completes first.
+        """
+        self.__stopping.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __init__(
+            self,
+            db_path: str,
+            interval: float = 3600,
+            max_age_days: float = 0,
+            device_policies: Optional[Dict[str, float]] = None,
+            test_policies: Optional[Dict[str, float]] = None,
+            batch_size: int = 1000,
+            batch_sleep: float = 0.05,
+            vacuum_pages: int = 1024,
+            rollup_resolutions: Optional[List[int]] = None
+    ):
+        """
+        Constructor.
+        :param db_path: the live database.
+        :param interval: seconds between the maintenance runs, 0 only runs on demand.
+        :param max_age_days: samples older than this are deleted, 0 keeps all.
+        :param device_policies: MAC address glob patterns and the days their samples are kept.
+        :param test_policies: test name glob patterns and the days after their last sample the tests are kept.
+        :param batch_size: rows deleted per transaction.
+        :param batch_sleep: seconds between the delete batches and vacuum steps.
+        :param vacuum_pages: pages released per incremental vacuum step.
+        :param rollup_resolutions: the rollup resolutions (see RollupRepository) recomputed after retention.
+        """
+        self.__db_path: str = db_path
+        self.__interval: float = interval
+        self.__max_age_days: float = max_age_days
+        self.__device_policies: Dict[str, float] = device_policies or {}
+        self.__test_policies: Dict[str, float] = test_policies or {}
+        self.__batch_size: int = max(1, batch_size)
+        self.__batch_sleep: float = max(0.0, batch_sleep)
+        self.__vacuum_pages: int = max(1, vacuum_pages)
+        self.__rollup_resolutions: List[int] = rollup_resolutions or []
+        self.__conn: Optional[sqlite3.Connection] = None
+        self.__running_tests: Optional[Callable[[], Collection[str]]] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__stopping: threading.Event = threading.Event()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__conversion_hint_logged: bool = False
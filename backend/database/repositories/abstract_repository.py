@@ -1,10 +1,23 @@
 import sqlite3
+import threading
 from typing import List
 
 from exception.Exceptions import InvalidDataException
 from log_handler.log_handler import Module, log as logger
 
 
+class LockingConnection(sqlite3.Connection):
+    """
+    Connection shared by the request and test threads (sqlite3.connect(..., factory=LockingConnection)).
+    A commit or rollback applies to everything executed on the connection, so every write transaction
+    holds the lock from its first statement to its commit or rollback.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock: threading.RLock = threading.RLock()
+
+
 class AbstractRepository:
     """
     Abstract repo containing common operation queries.
@@ -36,10 +49,11 @@ class AbstractRepository:
         :raise InvalidDataException: if the data provided is formatted incorrectly.
         """
         try:
-            cursor: sqlite3.Cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            self.conn.commit()
-            cursor.close()
+            with self.lock:
+                cursor: sqlite3.Cursor = self.conn.cursor()
+                cursor.execute(query, params)
+                self.conn.commit()
+                cursor.close()
         except Exception as e:
             logger.error(f'Error executing commit/update query \"{query}\" with params \"{params}\". Trace:',
                          e, module=Module.DB)
@@ -53,10 +67,11 @@ class AbstractRepository:
         :raise InvalidDataException: on error.
         """
         try:
-            cursor: sqlite3.Cursor = self.conn.cursor()
-            cursor.execute(query)
-            self.conn.commit()
-            cursor.close()
+            with self.lock:
+                cursor: sqlite3.Cursor = self.conn.cursor()
+                cursor.execute(query)
+                self.conn.commit()
+                cursor.close()
         except Exception as e:
             logger.error(f'Error executing simple query \"{query}\". Trace:', e, module=Module.DB)
             raise InvalidDataException()
@@ -64,6 +79,7 @@ class AbstractRepository:
     def __init__(self, conn: sqlite3.Connection):
         """
         Constructor.
-        :param conn: Database connection object.
+        :param conn: Database connection object, a LockingConnection when shared by several threads.
         """
         self.conn = conn
+        self.lock: threading.RLock = getattr(conn, 'lock', None) or threading.RLock()
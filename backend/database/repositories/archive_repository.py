@@ -0,0 +1,300 @@
+import hashlib
+import importlib.util
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from database.repositories.abstract_repository import AbstractRepository
+from exception.Exceptions import InvalidDataException, ArchiveNotAvailableException
+from log_handler.log_handler import Module, log as logger
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+class ArchiveRepository(AbstractRepository):
+    """
+    Columnar archive tier for completed tests.
+    Each archived test is stored as one compressed Parquet file with float32 channels and recorded in the
+    ArchivedTest catalogue. Pruned tests are removed from the Data table and served from their archive file.
+    Requires the optional pyarrow package.
+    """
+
+    CHANNELS: List[str] = [f'DATA_{i}' for i in range(64)] + ['TEMPERATURE', 'HUMIDITY']
+    create_table_query: str = ('CREATE TABLE IF NOT EXISTS ArchivedTest ('
+                               'TEST_ID TEXT PRIMARY KEY,'
+                               'FILE_PATH TEXT NOT NULL,'
+                               'SAMPLES INTEGER NOT NULL,'
+                               'SUBSTANCES TEXT NOT NULL,'
+                               'FIRST_DATETIME DATE,'
+                               'LAST_DATETIME DATE,'
+                               'ARCHIVED_AT DATE NOT NULL,'
+                               'PRUNED BOOLEAN NOT NULL);')
+    __channel_columns: str = ','.join([f'CAST({channel} AS REAL)' for channel in CHANNELS])
+    __select_test_query: str = (f'SELECT ID, MAC_ADDRESS, SUBSTANCE_ID, DATETIME, {__channel_columns} '
+                                'FROM Data WHERE TEST_ID=? ORDER BY DATETIME ASC;')
+    __prune_test_query: str = 'DELETE FROM Data WHERE TEST_ID=? AND ID<=?;'
+    __upsert_catalogue_query: str = ('INSERT OR REPLACE INTO ArchivedTest VALUES (?, ?, ?, ?, ?, ?, ?, ?);')
+    __select_catalogue_query: str = 'SELECT * FROM ArchivedTest ORDER BY ARCHIVED_AT DESC;'
+    __select_entry_query: str = 'SELECT * FROM ArchivedTest WHERE TEST_ID=?;'
+    __select_pruned_query: str = 'SELECT * FROM ArchivedTest WHERE PRUNED=1 ORDER BY TEST_ID DESC;'
+    __restore_row_query: str = f'INSERT OR IGNORE INTO Data VALUES (?, ?, ?, ?, ?, {",".join("?" for _ in CHANNELS)});'
+    __catalogue_columns: List[str] = ['test_name', 'file_path', 'samples', 'substances', 'first_datetime',
+                                      'last_datetime', 'archived_at', 'pruned']
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Checks whether the optional pyarrow dependency is installed.
+        """
+        return importlib.util.find_spec('pyarrow') is not None
+
+    @staticmethod
+    def __get_file_name(test_name: str) -> str:
+        """
+        Get a file system safe, unique file name for a test.
+        """
+        digest: str = hashlib.sha1(test_name.encode('utf-8')).hexdigest()[:10]
+        return f'{re.sub(r"[^A-Za-z0-9_-]", "_", test_name)[:64]}-{digest}.parquet'
+
+    def __to_entry(self, row: Tuple) -> Dict[str, Any]:
+        entry: Dict[str, Any] = dict(zip(self.__catalogue_columns, row))
+        entry['substances'] = entry['substances'].split(';') if len(entry['substances']) else []
+        entry['pruned'] = bool(entry['pruned'])
+        return entry
+
+    def __read_table(self, entry: Dict[str, Any], columns: Optional[List[str]] = None) -> 'pa.Table':
+        if not self.is_available():
+            logger.error(f'Archived test \"{entry["test_name"]}\" can\'t be read, pyarrow is not installed.',
+                         module=Module.ARCHIVE)
+            raise ArchiveNotAvailableException()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            table: pa.Table = pq.read_table(entry['file_path'], columns=columns)
+            if 'DATETIME' in table.column_names:
+                # parquet has no second resolution, timestamps are stored as milliseconds
+                table = table.set_column(table.column_names.index('DATETIME'), 'DATETIME',
+                                         table['DATETIME'].cast(pa.timestamp('s')))
+            return table
+        except Exception as e:
+            logger.error(f'Error reading archive of test \"{entry["test_name"]}\". Trace:', e, module=Module.ARCHIVE)
+            raise InvalidDataException()
+
+    def __build_table(self, test_name: str, rows: List[Tuple]) -> 'pa.Table':
+        """
+        Converts Data rows (ID, MAC_ADDRESS, SUBSTANCE_ID, DATETIME, channels...) to an Arrow table.
+        """
+        import pyarrow as pa
+
+        values: np.ndarray = np.array([row[4:] for row in rows], dtype=np.float32).reshape(-1, len(self.CHANNELS))
+        arrays: List[pa.Array] = [
+            pa.array([row[0] for row in rows], type=pa.int64()),
+            pa.array([test_name] * len(rows), type=pa.string()).dictionary_encode(),
+            pa.array([row[1] for row in rows], type=pa.string()).dictionary_encode(),
+            pa.array([row[2] for row in rows], type=pa.string()).dictionary_encode(),
+            pa.array(np.array([row[3] for row in rows], dtype='datetime64[s]')),
+        ]
+        arrays.extend([pa.array(values[:, i]) for i in range(len(self.CHANNELS))])
+        return pa.Table.from_arrays(
+            arrays,
+            names=['ID', 'TEST_ID', 'MAC_ADDRESS', 'SUBSTANCE_ID', 'DATETIME', *self.CHANNELS]
+        )
+
+    def archive_test(self, test_name: str, prune: bool = False) -> Dict[str, Any]:
+        """
+        Writes the data of a test to its archive file and records it in the catalogue.
+        If the test was archived and pruned before, the new rows are appended to the existing archive.
+        :param test_name: the test name.
+        :param prune: whether to delete the archived rows from the Data table (always done for pruned tests).
+        :return: the catalogue entry.
+        :raise ArchiveNotAvailableException: if pyarrow is not installed.
+        :raise InvalidDataException: if the test has no data or on error.
+        """
+        if not self.is_available():
+            raise ArchiveNotAvailableException()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_test_query, [test_name])
+        rows: List[Tuple] = cursor.fetchall()
+        cursor.close()
+        previous: Optional[Dict[str, Any]] = self.get_entry(test_name)
+        if not len(rows) and (previous is None or not previous['pruned']):
+            raise InvalidDataException()
+        try:
+            table: pa.Table = self.__build_table(test_name, rows)
+            if previous is not None and previous['pruned']:
+                table = pa.concat_tables([self.__read_table(previous), table])
+            os.makedirs(self.__archive_dir, exist_ok=True)
+            file_path: str = os.path.join(self.__archive_dir, self.__get_file_name(test_name))
+            pq.write_table(table, file_path + '.tmp', compression=self.__compression)
+            os.replace(file_path + '.tmp', file_path)
+            timestamps: np.ndarray = table['DATETIME'].to_numpy()
+            pruned: bool = prune or (previous is not None and previous['pruned'])
+            entry: List[Any] = [
+                test_name,
+                file_path,
+                table.num_rows,
+                ';'.join(sorted(set(table['SUBSTANCE_ID'].to_pylist()))),
+                str(timestamps.min()).replace('T', ' ') if len(timestamps) else None,
+                str(timestamps.max()).replace('T', ' ') if len(timestamps) else None,
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                pruned
+            ]
+            with self.lock:
+                try:
+                    cursor = self.conn.cursor()
+                    cursor.execute(self.__upsert_catalogue_query, entry)
+                    if pruned and len(rows):
+                        cursor.execute(self.__prune_test_query, [test_name, max(row[0] for row in rows)])
+                    self.conn.commit()
+                    cursor.close()
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    raise
+        except (ArchiveNotAvailableException, InvalidDataException):
+            raise
+        except Exception as e:
+            logger.error(f'Error archiving test \"{test_name}\". Trace:', e, module=Module.ARCHIVE)
+            raise InvalidDataException()
+        logger.info(f'Archived {table.num_rows} samples of test \"{test_name}\"' +
+                    (' and pruned them from the database.' if entry[-1] else '.'), module=Module.ARCHIVE)
+        return self.__to_entry(tuple(entry))
+
+    def get_catalogue(self) -> List[Dict[str, Any]]:
+        """
+        Get all archived tests, newest first.
+        """
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_catalogue_query, [])
+        rows = cursor.fetchall()
+        cursor.close()
+        return [self.__to_entry(row) for row in rows]
+
+    def get_entry(self, test_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the catalogue entry of a test.
+        :return: the entry, or None if the test is not archived.
+        """
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_entry_query, [test_name])
+        row = cursor.fetchone()
+        cursor.close()
+        return self.__to_entry(row) if row is not None else None
+
+    def get_pruned_entries(self, test_name: Optional[str] = None, substance_id: Optional[str] = None) \
+            -> List[Dict[str, Any]]:
+        """
+        Get the catalogue entries of the tests that are only available in the archive.
+        :param test_name: (Optional) filter by test name.
+        :param substance_id: (Optional) only tests that contain the substance.
+        """
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_pruned_query, [])
+        rows = cursor.fetchall()
+        cursor.close()
+        entries: List[Dict[str, Any]] = [self.__to_entry(row) for row in rows]
+        return [
+            entry for entry in entries
+            if (test_name is None or entry['test_name'] == test_name)
+            and (substance_id is None or substance_id in entry['substances'])
+        ]
+
+    def get_rows(self, test_name: Optional[str] = None, substance_id: Optional[str] = None) -> List[Tuple]:
+        """
+        Get the archived samples of pruned tests in the Data row format
+        (ID, TEST_ID, MAC_ADDRESS, SUBSTANCE_ID, DATETIME, DATA_0..63, TEMPERATURE, HUMIDITY).
+        Values are returned as strings of their float32 representation.
+        :param test_name: (Optional) filter by test name.
+        :param substance_id: (Optional) filter by substance id.
+        :return: the rows ordered by test name (descending) and date.
+        """
+        rows: List[Tuple] = []
+        for entry in self.get_pruned_entries(test_name, substance_id):
+            table: pa.Table = self.__read_table(entry)
+            substances: np.ndarray = np.array(table['SUBSTANCE_ID'].to_pylist(), dtype=object)
+            mask: np.ndarray = np.ones(table.num_rows, dtype=bool) if substance_id is None \
+                else substances == substance_id
+            substances = substances[mask]
+            ids: np.ndarray = table['ID'].to_numpy()[mask]
+            macs: np.ndarray = np.array(table['MAC_ADDRESS'].to_pylist(), dtype=object)[mask]
+            timestamps: np.ndarray = np.char.replace(table['DATETIME'].to_numpy()[mask].astype(str), 'T', ' ')
+            values: np.ndarray = np.column_stack(
+                [table[channel].to_numpy()[mask].astype(str) for channel in self.CHANNELS]
+            ) if mask.any() else np.empty((0, len(self.CHANNELS)), dtype=str)
+            for i in range(len(ids)):
+                rows.append((int(ids[i]), entry['test_name'], macs[i], substances[i], str(timestamps[i]),
+                             *values[i].tolist()))
+        return rows
+
+    def restore_pruned_rows(self, conn: sqlite3.Connection) -> int:
+        """
+        Writes the archived samples of all pruned tests into the Data table of another database, e.g. a snapshot
+        sent to the ML backend, so it contains every test. Commits on the given connection.
+        :param conn: the connection of the target database (not the live database).
+        :return: the number of restored samples.
+        :raise ArchiveNotAvailableException: if tests were pruned and pyarrow is not installed.
+        :raise InvalidDataException: if an archive can't be read.
+        """
+        restored: int = 0
+        for entry in self.get_pruned_entries():
+            rows: List[Tuple] = self.get_rows(test_name=entry['test_name'])
+            conn.executemany(self.__restore_row_query, rows)
+            conn.commit()
+            restored += len(rows)
+        return restored
+
+    def get_channels(
+            self,
+            test_name: Optional[str],
+            substance_id: Optional[str],
+            start: Optional[str],
+            end: Optional[str],
+            channels: List[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the given channels of the archived samples of pruned tests (see DataRepository.query_channels).
+        :return: the timestamps (seconds) and a (samples x channels) value matrix.
+        """
+        all_timestamps: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+        all_values: List[np.ndarray] = [np.empty((0, len(channels)), dtype=np.float64)]
+        for entry in self.get_pruned_entries(test_name, substance_id):
+            table: pa.Table = self.__read_table(entry, columns=['SUBSTANCE_ID', 'DATETIME', *channels])
+            timestamps: np.ndarray = table['DATETIME'].to_numpy().astype('datetime64[s]')
+            mask: np.ndarray = np.ones(table.num_rows, dtype=bool)
+            if substance_id is not None:
+                mask &= np.array(table['SUBSTANCE_ID'].to_pylist(), dtype=object) == substance_id
+            if start is not None:
+                mask &= timestamps >= np.datetime64(start.replace(' ', 'T'))
+            if end is not None:
+                mask &= timestamps <= np.datetime64(end.replace(' ', 'T'))
+            all_timestamps.append(timestamps[mask].astype(np.int64))
+            all_values.append(np.column_stack(
+                [table[channel].to_numpy().astype(np.float64)[mask] for channel in channels]
+            ).reshape(-1, len(channels)))
+        return np.concatenate(all_timestamps), np.concatenate(all_values)
+
+    def get_last_id(self, test_name: str) -> Optional[int]:
+        """
+        Get the id of the latest archived sample of a pruned test.
+        """
+        entries: List[Dict[str, Any]] = self.get_pruned_entries(test_name)
+        if not len(entries):
+            return None
+        ids: np.ndarray = self.__read_table(entries[0], columns=['ID'])['ID'].to_numpy()
+        return int(ids.max()) if len(ids) else None
+
+    def __init__(self, conn: sqlite3.Connection, archive_dir: str, compression: str = 'zstd'):
+        """
+        Constructor.
+        :param conn: DB connection object.
+        :param archive_dir: the directory the archive files are written to.
+        :param compression: the Parquet compression codec.
+        """
+        super().__init__(conn)
+        self.conn: sqlite3.Connection = conn
+        self.__archive_dir: str = archive_dir
+        self.__compression: str = compression
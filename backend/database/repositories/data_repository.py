@@ -1,20 +1,37 @@
 import sqlite3
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple, Any, Dict, Iterator, TYPE_CHECKING
+
+import numpy as np
 
 from database.repositories.abstract_repository import AbstractRepository
+from database.repositories.archive_repository import ArchiveRepository
+from database.repositories.rollup_repository import RollupRepository
+from exception.Exceptions import InvalidDataException
+from log_handler.log_handler import Module, log as logger
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 
 class DataRepository(AbstractRepository):
     """
     Handles data db operations.
+    Reads transparently include the tests that were archived and pruned from the Data table (see ArchiveRepository).
     """
 
+    CHANNELS: List[str] = [f'DATA_{i}' for i in range(64)] + ['TEMPERATURE', 'HUMIDITY']
+    COLUMNS: List[str] = ['ID', 'TEST_ID', 'MAC_ADDRESS', 'SUBSTANCE_ID', 'DATETIME', *CHANNELS]
+
     __data_placeholder_template: str = ','.join('?' for _ in range(64))
     __data_insert_query: str = f'INSERT INTO Data VALUES (NULL, ?, ?, ?, ?, {__data_placeholder_template}, ?, ?)'
     __select_test_names_query: str = 'SELECT DISTINCT TEST_ID FROM Data;'
     __select_by_test_name_query: str = 'SELECT * FROM Data WHERE TEST_ID=? ORDER BY DATETIME ASC;'
     __select_by_substance_query: str = 'SELECT * FROM Data WHERE SUBSTANCE_ID=? ORDER BY TEST_ID DESC, DATETIME ASC;'
+    __select_last_id_by_test_name_query: str = 'SELECT ID FROM Data WHERE TEST_ID=? ORDER BY DATETIME DESC LIMIT 1;'
+    __gap_insert_query: str = 'INSERT INTO DataGap VALUES (NULL, ?, ?, ?, ?, ?);'
+    __select_gaps_by_test_name_query: str = ('SELECT GAP_START, GAP_END, MAC_ADDRESS, REASON FROM DataGap '
+                                             'WHERE TEST_ID=? ORDER BY GAP_START ASC;')
     __select_by_test_and_substance_query: str = ('SELECT * FROM Data WHERE TEST_ID=? AND SUBSTANCE_ID=? '
                                                  'ORDER BY DATETIME ASC;')
 
@@ -29,7 +46,7 @@ class DataRepository(AbstractRepository):
             humidity: str
     ) -> None:
         """
-        Persists test data.
+        Persists test data and updates the rollups within the same transaction.
         :param test_name: The test name.
         :param mac_address: The device's unique mac address (distinguish between different SmellInspector devices).
         :param substance_id: The substance id of the substance being tested.
@@ -39,11 +56,64 @@ class DataRepository(AbstractRepository):
         :param humidity: The measured humidity.
         :raise InvalidDataException: if the data provided is formatted incorrectly.
         """
-        test_date: str = test_date.strftime('%Y-%m-%d %H:%M:%S')  # ISO 8601 for sqlite sorting
-        values = [test_name, mac_address, substance_id, test_date]
+        values = [test_name, mac_address, substance_id, test_date.strftime('%Y-%m-%d %H:%M:%S')]  # ISO 8601
         values.extend(data)
         values.extend([temperature, humidity])
-        self.execute_commit_update_query(self.__data_insert_query, values)
+        if self.__rollup_repository is None:
+            self.execute_commit_update_query(self.__data_insert_query, values)
+            return
+        with self.lock:
+            try:
+                cursor: sqlite3.Cursor = self.conn.cursor()
+                cursor.execute(self.__data_insert_query, values)
+                cursor.close()
+                self.__rollup_repository.add_sample(test_name, substance_id, test_date,
+                                                    [*data, temperature, humidity])
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                logger.error(f'Error persisting data of test \"{test_name}\". Trace:', e, module=Module.DB)
+                raise InvalidDataException()
+
+    def persist_gap(
+            self,
+            test_name: str,
+            mac_address: str,
+            gap_start: datetime,
+            gap_end: datetime,
+            reason: str
+    ) -> None:
+        """
+        Records a period in which a test collected no data (e.g. while the device was reconnecting).
+        :param test_name: The test name.
+        :param mac_address: The device's mac address.
+        :param gap_start: The time the connection was lost.
+        :param gap_end: The time the connection was restored (or given up).
+        :param reason: Why the gap occurred.
+        :raise InvalidDataException: on error.
+        """
+        self.execute_commit_update_query(self.__gap_insert_query, [
+            test_name,
+            mac_address,
+            gap_start.strftime('%Y-%m-%d %H:%M:%S'),
+            gap_end.strftime('%Y-%m-%d %H:%M:%S'),
+            reason
+        ])
+
+    def get_gaps_by_test_name(self, test_name: str) -> List[Dict[str, str]]:
+        """
+        Gets the recorded data gaps of a test.
+        :param test_name: The test name.
+        :return: The gaps with their start, end, device mac address and reason.
+        :raise InvalidDataException: on error.
+        """
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_gaps_by_test_name_query, [test_name])
+        gaps = cursor.fetchall()
+        cursor.close()
+        return [
+            {'start': start, 'end': end, 'mac_address': mac_address, 'reason': reason}
+            for start, end, mac_address, reason in gaps
+        ]
 
     def get_by_test_name_and_substance(self, test_name: str, substance_id: str) -> List[List[str]]:
         """
@@ -56,7 +126,7 @@ class DataRepository(AbstractRepository):
                                                           [test_name, substance_id])
         data = cursor.fetchall()
         cursor.close()
-        return data
+        return self.__get_archived_rows(test_name, substance_id) + data
 
     def get_by_substance_id(self, substance_id: str) -> List[List[str]]:
         """
@@ -68,6 +138,12 @@ class DataRepository(AbstractRepository):
         cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_by_substance_query, [substance_id])
         data = cursor.fetchall()
         cursor.close()
+        archived: List[Tuple] = self.__get_archived_rows(substance_id=substance_id)
+        if not len(archived):
+            return data
+        data = archived + data
+        data.sort(key=lambda row: row[4])
+        data.sort(key=lambda row: row[1], reverse=True)
         return data
 
     def get_by_test_name(self, test_name: str) -> List[List[str]]:
@@ -79,7 +155,133 @@ class DataRepository(AbstractRepository):
         cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_by_test_name_query, [test_name])
         data = cursor.fetchall()
         cursor.close()
-        return data
+        return self.__get_archived_rows(test_name) + data
+
+    def iterate_by_test_name(self, test_name: str, conn: Optional[sqlite3.Connection] = None) -> Iterator[Tuple]:
+        """
+        Streams the data samples of a test (Data table layout, see COLUMNS) without loading them into memory.
+        :param test_name: The test name.
+        :param conn: (Optional) the connection to read from, e.g. a snapshot, default: the repository's connection.
+        :return: an iterator over the samples.
+        """
+        yield from self.__get_archived_rows(test_name)
+        cursor: sqlite3.Cursor = (conn or self.conn).execute(self.__select_by_test_name_query, [test_name])
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def get_last_id_by_test_name(self, test_name: str) -> int | None:
+        """
+        Gets the id of the latest sample of a test. Used to detect new data for running tests.
+        :param test_name: The test name.
+        :return: The id of the latest sample, or None if the test has no data.
+        """
+        cursor: sqlite3.Cursor = self.execute_fetch_query(self.__select_last_id_by_test_name_query, [test_name])
+        result = cursor.fetchone()
+        cursor.close()
+        if result is not None:
+            return result[0]
+        if self.__archive_repository is None:
+            return None
+        return self.__archive_repository.get_last_id(test_name)
+
+    def __get_archived_rows(self, test_name: Optional[str] = None, substance_id: Optional[str] = None) \
+            -> List[Tuple]:
+        if self.__archive_repository is None:
+            return []
+        return self.__archive_repository.get_rows(test_name, substance_id)
+
+    def __build_projection_query(
+            self,
+            test_name: Optional[str],
+            substance_id: Optional[str],
+            start: Optional[str],
+            end: Optional[str],
+            channels: List[str]
+    ) -> Tuple[str, List[Any]]:
+        """
+        Builds a query selecting only the timestamps and the given channels as numbers.
+        :return: the query and its parameters.
+        :raise ValueError: if a channel is unknown or neither test nor substance are given.
+        """
+        unknown: List[str] = [channel for channel in channels if channel not in self.CHANNELS]
+        if len(unknown):
+            raise ValueError(f'Unknown channels: {unknown}')
+        if test_name is None and substance_id is None:
+            raise ValueError('Either a test name or a substance id is required.')
+        conditions: List[str] = []
+        params: List[Any] = []
+        for condition, param in [('TEST_ID=?', test_name), ('SUBSTANCE_ID=?', substance_id),
+                                 ('DATETIME>=?', start), ('DATETIME<=?', end)]:
+            if param is not None:
+                conditions.append(condition)
+                params.append(param)
+        columns: str = ''.join([f', CAST({channel} AS REAL)' for channel in channels])
+        query: str = (f"SELECT CAST(strftime('%s', DATETIME) AS INTEGER){columns} FROM Data "
+                      f"WHERE {' AND '.join(conditions)} ORDER BY DATETIME ASC;")
+        return query, params
+
+    def query_channels(
+            self,
+            test_name: Optional[str] = None,
+            substance_id: Optional[str] = None,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            channels: Optional[List[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gets only the requested channels of the samples matching the filters.
+        Time ranges are resolved through the (TEST_ID, DATETIME) and (SUBSTANCE_ID, DATETIME) indices.
+        :param test_name: (Optional) the test name.
+        :param substance_id: (Optional) the substance id, at least one of test name and substance id is required.
+        :param start: (Optional) range start (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :param end: (Optional) range end (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :param channels: (Optional) the channels to select (see CHANNELS), default: all.
+        :return: the timestamps (seconds since epoch, naive as stored) and a (samples x channels) value matrix.
+        :raise ValueError: if the filters or channels are invalid.
+        :raise InvalidDataException: if the stored data can't be read.
+        """
+        channels = channels or self.CHANNELS
+        query, params = self.__build_projection_query(test_name, substance_id, start, end, channels)
+        cursor: sqlite3.Cursor = self.execute_fetch_query(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        table: np.ndarray = np.array(rows, dtype=np.float64).reshape(-1, len(channels) + 1)
+        timestamps: np.ndarray = table[:, 0].astype(np.int64)
+        values: np.ndarray = table[:, 1:]
+        if self.__archive_repository is None:
+            return timestamps, values
+        archived_timestamps, archived_values = self.__archive_repository.get_channels(
+            test_name, substance_id, start, end, channels
+        )
+        if not len(archived_timestamps):
+            return timestamps, values
+        timestamps = np.concatenate([archived_timestamps, timestamps])
+        values = np.concatenate([archived_values, values])
+        order: np.ndarray = np.argsort(timestamps, kind='stable')
+        return timestamps[order], values[order]
+
+    def query_record_batch(
+            self,
+            test_name: Optional[str] = None,
+            substance_id: Optional[str] = None,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            channels: Optional[List[str]] = None
+    ) -> 'pa.RecordBatch':
+        """
+        Same as query_channels, but returns an Arrow record batch with a "DATETIME" column and one
+        float32 column per channel. Requires the optional pyarrow package.
+        :raise ImportError: if pyarrow is not installed.
+        """
+        import pyarrow as pa
+
+        channels = channels or self.CHANNELS
+        timestamps, values = self.query_channels(test_name, substance_id, start, end, channels)
+        arrays: List[pa.Array] = [pa.array(timestamps.astype('datetime64[s]'))]
+        arrays.extend([pa.array(values[:, i].astype(np.float32)) for i in range(len(channels))])
+        return pa.RecordBatch.from_arrays(arrays, names=['DATETIME', *channels])
 
     def get_test_names(self) -> List[str]:
         """
@@ -89,12 +291,24 @@ class DataRepository(AbstractRepository):
         cursor: sqlite3.Cursor = self.conn.cursor()
         results: List[str] = cursor.execute(self.__select_test_names_query).fetchall()
         cursor.close()
-        return results
+        if self.__archive_repository is None:
+            return results
+        archived: List[Tuple[str]] = [(entry['test_name'],) for entry in self.__archive_repository.get_pruned_entries()]
+        return results + [name for name in archived if name not in results]
 
-    def __init__(self, conn: sqlite3.Connection):
+    def __init__(
+            self,
+            conn: sqlite3.Connection,
+            rollup_repository: Optional[RollupRepository] = None,
+            archive_repository: Optional[ArchiveRepository] = None
+    ):
         """
         Constructor.
         :param conn: DB connection object.
+        :param rollup_repository: (Optional) the rollups to update on insert.
+        :param archive_repository: (Optional) the archive to read pruned tests from.
         """
         super().__init__(conn)
         self.conn: sqlite3.Connection = conn
+        self.__rollup_repository: Optional[RollupRepository] = rollup_repository
+        self.__archive_repository: Optional[ArchiveRepository] = archive_repository
@@ -0,0 +1,226 @@
+import math
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+from database.repositories.abstract_repository import AbstractRepository
+from exception.Exceptions import InvalidDataException
+from log_handler.log_handler import Module, log as logger
+
+
+class RollupRepository(AbstractRepository):
+    """
+    Maintains per-test, per-substance min/mean/max aggregates of the data channels
+    for multiple time resolutions (e.g. 1 and 10 minutes).
+    Means are stored as sums and divided by the sample count on read.
+    """
+
+    CHANNELS: List[str] = [f'DATA_{i}' for i in range(64)] + ['TEMPERATURE', 'HUMIDITY']
+    __KEY_COLUMNS: str = 'TEST_ID, SUBSTANCE_ID, RESOLUTION, BUCKET_START'
+    __aggregate_headers: str = ','.join([
+        f'{channel}_MIN REAL NOT NULL,{channel}_SUM REAL NOT NULL,{channel}_MAX REAL NOT NULL'
+        for channel in CHANNELS
+    ])
+    create_table_query: str = ('CREATE TABLE IF NOT EXISTS DataRollup ('
+                               'TEST_ID TEXT NOT NULL,'
+                               'SUBSTANCE_ID TEXT NOT NULL,'
+                               'RESOLUTION INTEGER NOT NULL,'
+                               'BUCKET_START DATE NOT NULL,'
+                               'SAMPLES INTEGER NOT NULL,'
+                               f'{__aggregate_headers},'
+                               f'PRIMARY KEY ({__KEY_COLUMNS}));')
+    __value_placeholders: str = ','.join('?, ?, ?' for _ in CHANNELS)
+    __upsert_query: str = (f'INSERT INTO DataRollup VALUES (?, ?, ?, ?, 1, {__value_placeholders}) '
+                           f'ON CONFLICT({__KEY_COLUMNS}) DO UPDATE SET SAMPLES=SAMPLES + 1, ' +
+                           ', '.join([
+                               f'{c}_MIN=min({c}_MIN, excluded.{c}_MIN), '
+                               f'{c}_SUM={c}_SUM + excluded.{c}_SUM, '
+                               f'{c}_MAX=max({c}_MAX, excluded.{c}_MAX)'
+                               for c in CHANNELS
+                           ]) + ';')
+    __bucket_expression: str = "datetime((CAST(strftime('%s', DATETIME) AS INTEGER) / {0}) * {0}, 'unixepoch')"
+    # ROLLUP_VALUE (see to_value) skips the same samples as add_sample, LIMIT -1 keeps SQLite from flattening the
+    # subquery, which would call it again for every aggregate and the filter
+    __rebuild_query: str = ('INSERT INTO DataRollup SELECT TEST_ID, SUBSTANCE_ID, {0}, ' + __bucket_expression +
+                            ', COUNT(*), ' +
+                            ', '.join([f'MIN({c}), SUM({c}), MAX({c})' for c in CHANNELS]) +
+                            ' FROM (SELECT TEST_ID, SUBSTANCE_ID, DATETIME, ' +
+                            ', '.join([f'ROLLUP_VALUE({c}) AS {c}' for c in CHANNELS]) +
+                            ' FROM Data {1} LIMIT -1) WHERE ' +
+                            ' AND '.join([f'{c} IS NOT NULL' for c in CHANNELS]) +
+                            ' GROUP BY TEST_ID, SUBSTANCE_ID, ' + __bucket_expression + ';')
+    __count_query: str = 'SELECT COUNT(*) FROM DataRollup;'
+
+    @staticmethod
+    def to_value(value: Any) -> Optional[float]:
+        """
+        Converts a stored channel value for the rollups (also registered as the SQL function ROLLUP_VALUE).
+        :param value: the stored value.
+        :return: the value, or None if it is not a finite number.
+        """
+        try:
+            number: float = float(value)
+        except (TypeError, ValueError):
+            return None
+        return number if math.isfinite(number) else None
+
+    @classmethod
+    def register_functions(cls, conn: sqlite3.Connection) -> None:
+        """
+        Registers the SQL functions used by the rebuild queries on a connection.
+        :param conn: the connection.
+        """
+        conn.create_function('ROLLUP_VALUE', 1, cls.to_value, deterministic=True)
+
+    @classmethod
+    def get_rebuild_query(cls, resolution: int, condition: str = '') -> str:
+        """
+        Get the query inserting the rollups of the matching Data rows (requires register_functions).
+        :param resolution: the bucket size in seconds.
+        :param condition: (Optional) a WHERE clause selecting the Data rows.
+        :return: the query.
+        """
+        return cls.__rebuild_query.format(int(resolution), condition)
+
+    @staticmethod
+    def get_bucket_start(timestamp: datetime, resolution: int) -> str:
+        """
+        Get the start of the bucket a timestamp belongs to.
+        :param timestamp: the timestamp.
+        :param resolution: the bucket size in seconds (must divide a day).
+        :return: the bucket start (format: %Y-%m-%d %H:%M:%S).
+        """
+        seconds_of_day: int = timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+        bucket_start: datetime = timestamp - timedelta(
+            seconds=seconds_of_day % resolution,
+            microseconds=timestamp.microsecond
+        )
+        return bucket_start.strftime('%Y-%m-%d %H:%M:%S')
+
+    def add_sample(
+            self,
+            test_name: str,
+            substance_id: str,
+            timestamp: datetime,
+            values: List[str]
+    ) -> None:
+        """
+        Adds a sample to the rollups of all resolutions. Does not commit, the caller commits
+        together with the raw sample while holding the connection lock.
+        Samples with a value that is not a finite number are left out of the rollups (the raw sample is still
+        stored): the buckets keep one sample count for all channels, so a single skipped channel would skew its mean.
+        rebuild skips the same samples.
+        :param test_name: the test name.
+        :param substance_id: the substance id.
+        :param timestamp: the time the sample was taken.
+        :param values: the 64 data values, temperature and humidity.
+        :raise InvalidDataException: if the values are invalid.
+        """
+        numbers: List[Optional[float]] = [self.to_value(value) for value in values]
+        if None in numbers:
+            logger.debug(f'Sample of test \"{test_name}\" has non-numeric values, not added to the rollups.',
+                         module=Module.DB)
+            return
+        aggregates: List[float] = [number for number in numbers for _ in range(3)]
+        try:
+            cursor: sqlite3.Cursor = self.conn.cursor()
+            for resolution in self.__resolutions:
+                cursor.execute(self.__upsert_query, [
+                    test_name, substance_id, resolution, self.get_bucket_start(timestamp, resolution), *aggregates
+                ])
+            cursor.close()
+        except Exception as e:
+            logger.error(f'Error updating rollups of test \"{test_name}\". Trace:', e, module=Module.DB)
+            raise InvalidDataException()
+
+    def rebuild(self, test_name: Optional[str] = None) -> None:
+        """
+        Re-computes the rollups from the raw data.
+        :param test_name: (Optional) only rebuild the given test, default: all tests.
+        :raise InvalidDataException: on error.
+        """
+        with self.lock:
+            try:
+                cursor: sqlite3.Cursor = self.conn.cursor()
+                if test_name is None:
+                    # rollups of tests pruned from the Data table (see ArchiveRepository) are kept
+                    cursor.execute('DELETE FROM DataRollup WHERE TEST_ID IN (SELECT DISTINCT TEST_ID FROM Data);')
+                else:
+                    cursor.execute('DELETE FROM DataRollup WHERE TEST_ID=?;', [test_name])
+                for resolution in self.__resolutions:
+                    if test_name is None:
+                        cursor.execute(self.get_rebuild_query(resolution))
+                    else:
+                        cursor.execute(self.get_rebuild_query(resolution, 'WHERE TEST_ID=?'), [test_name])
+                self.conn.commit()
+                cursor.close()
+            except Exception as e:
+                self.conn.rollback()
+                logger.error('Error rebuilding data rollups. Trace:', e, module=Module.DB)
+                raise InvalidDataException()
+        logger.info('Rebuilt data rollups' + (f' of test \"{test_name}\".' if test_name else '.'), module=Module.DB)
+
+    def is_empty(self) -> bool:
+        """
+        Checks whether no rollups exist yet (e.g. database created before rollups were introduced).
+        """
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        count: int = cursor.execute(self.__count_query).fetchone()[0]
+        cursor.close()
+        return count == 0
+
+    def get_rollups(
+            self,
+            resolution: int,
+            test_name: Optional[str] = None,
+            substance_id: Optional[str] = None,
+            start: Optional[str] = None,
+            end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the aggregated data.
+        :param resolution: the bucket size in seconds.
+        :param test_name: (Optional) filter by test name.
+        :param substance_id: (Optional) filter by substance id.
+        :param start: (Optional) first bucket start (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :param end: (Optional) last bucket start (inclusive, format: %Y-%m-%d %H:%M:%S).
+        :return: a list of buckets with min/mean/max per channel.
+        :raise InvalidDataException: on error.
+        """
+        conditions: List[str] = ['RESOLUTION=?']
+        params: List[Any] = [resolution]
+        for condition, param in [('TEST_ID=?', test_name), ('SUBSTANCE_ID=?', substance_id),
+                                 ('BUCKET_START>=?', start), ('BUCKET_START<=?', end)]:
+            if param is not None:
+                conditions.append(condition)
+                params.append(param)
+        query: str = f'SELECT * FROM DataRollup WHERE {" AND ".join(conditions)} ORDER BY TEST_ID, BUCKET_START;'
+        cursor: sqlite3.Cursor = self.execute_fetch_query(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        results: List[Dict[str, Any]] = []
+        for row in rows:
+            test_id, substance, _, bucket_start, samples = row[:5]
+            channels: Dict[str, Dict[str, float]] = {}
+            for i, channel in enumerate(self.CHANNELS):
+                minimum, total, maximum = row[5 + 3 * i: 8 + 3 * i]
+                channels[channel] = {'min': minimum, 'mean': total / samples, 'max': maximum}
+            results.append({
+                'test_name': test_id,
+                'substance_id': substance,
+                'bucket_start': bucket_start,
+                'samples': samples,
+                'channels': channels
+            })
+        return results
+
+    def __init__(self, conn: sqlite3.Connection, resolutions: List[int]):
+        """
+        Constructor.
+        :param conn: DB connection object.
+        :param resolutions: the bucket sizes in seconds.
+        """
+        super().__init__(conn)
+        self.conn: sqlite3.Connection = conn
+        self.__resolutions: List[int] = resolutions
+        self.register_functions(conn)
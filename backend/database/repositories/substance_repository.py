@@ -1,6 +1,7 @@
 import sqlite3
+import threading
 from sqlite3 import Cursor
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Set, Optional
 
 from database.repositories.abstract_repository import AbstractRepository, logger
 from exception.Exceptions import InvalidDataException
@@ -10,16 +11,42 @@ from log_handler.log_handler import Module
 class SubstanceRepository(AbstractRepository):
     """
     Handles substances in the database.
+    Lookups are served from an in-memory cache, which is invalidated whenever a substance is added,
+    updated or deleted.
     """
 
     __add_substance_query: str = 'INSERT INTO Substance VALUES (NULL, ?, ?);'
-    __get_substance_by_id_query: str = 'SELECT * FROM Substance WHERE ID=?;'
     __update_substance_query: str = 'UPDATE Substance SET SUBSTANCE_NAME=?, QUANTITY=? WHERE ID=?;'
     __check_datapoint_for_substance_exists: str = 'SELECT * FROM Data WHERE ID=? LIMIT 1;'
-    __check_substance_exists_query: str = 'SELECT * FROM Substance WHERE SUBSTANCE_NAME=? AND QUANTITY=?'
     __delete_substance_query: str = 'DELETE FROM Substance WHERE ID=?;'
     __fetch_substances_query: str = 'SELECT * FROM Substance;'
 
+    @staticmethod
+    def __normalise_id(substance_id: str | int) -> Optional[int]:
+        try:
+            return int(str(substance_id).strip())
+        except ValueError:
+            return None
+
+    def __get_cache(self) -> Tuple[Dict[int, Tuple[str, str]], Set[Tuple[str, str]]]:
+        """
+        Get the cached substances, loading them from the database if the cache was invalidated.
+        :return: the id to (name, quantity) mapping and the set of existing (name, quantity) pairs.
+        """
+        with self.__cache_lock:
+            if self.__substances_by_id is None:
+                substances: List[List[str]] = self.get_substances()
+                self.__substances_by_id = {
+                    int(substance_id): (name, quantity) for substance_id, name, quantity in substances
+                }
+                self.__name_quantity_pairs = {(name, quantity) for _, name, quantity in substances}
+            return self.__substances_by_id, self.__name_quantity_pairs
+
+    def __invalidate_cache(self) -> None:
+        with self.__cache_lock:
+            self.__substances_by_id = None
+            self.__name_quantity_pairs = None
+
     def __check_substance_name_and_quantity_exist(self, substance_name: str, quantity: str) -> bool:
         """
         Checks whether a given substance name and quantity already exist.
@@ -27,11 +54,8 @@ class SubstanceRepository(AbstractRepository):
         :param quantity: The quantity.
         :return: True if a substance with the given name and quantity exist, False otherwise.
         """
-        substance_name = substance_name.lower()
-        quantity = quantity.lower()
-        results: Cursor = self.execute_fetch_query(self.__check_substance_exists_query, [substance_name, quantity])
-        result_set: List[List[str]] = results.fetchall()
-        return result_set is not None and len(result_set)
+        _, name_quantity_pairs = self.__get_cache()
+        return (substance_name.lower(), quantity.lower()) in name_quantity_pairs
 
     def get_substance_by_id(self, substance_id: str) -> Tuple[str, str]:
         """
@@ -41,12 +65,11 @@ class SubstanceRepository(AbstractRepository):
         :raises InvalidDataException: If the substance does not exist.
         """
         try:
-            result: Cursor = self.execute_fetch_query(self.__get_substance_by_id_query, [substance_id])
-            result_set: List[List[str]] = result.fetchall()
-            if result_set is None or not len(result_set):
+            substances_by_id, _ = self.__get_cache()
+            substance: Optional[Tuple[str, str]] = substances_by_id.get(self.__normalise_id(substance_id))
+            if substance is None:
                 raise InvalidDataException('Substance does not exist.')
-            _, substance_name, quantity = result_set[0]
-            return substance_name, quantity
+            return substance
         except InvalidDataException:
             raise
         except Exception as e:
@@ -75,6 +98,7 @@ class SubstanceRepository(AbstractRepository):
             if self.__check_substance_name_and_quantity_exist(substance_name, quantity):
                 raise InvalidDataException('Substance with given name and quantity already exists.')
             self.execute_commit_update_query(self.__add_substance_query, [substance_name, quantity])
+            self.__invalidate_cache()
             logger.info(f'Created new substance with name \"{substance_name}\" '
                         f'and quantity \"{quantity}\"', module=Module.DB)
         except InvalidDataException:
@@ -96,14 +120,11 @@ class SubstanceRepository(AbstractRepository):
             substance, _ = self.get_substance_by_id(substance_id)
             if substance == 'air':
                 raise InvalidDataException('Cannot update the default "air" substance.')
-            result: Cursor = self.execute_fetch_query(self.__get_substance_by_id_query, [substance_id])
-            result_set: List[List[str]] = result.fetchall()
-            if result_set is None or not len(result_set):
-                raise InvalidDataException(f'No substance found for given ID \"{substance_id}\"')
             if self.__check_substance_name_and_quantity_exist(substance_name, quantity):
                 raise InvalidDataException('Substance with given name and quantity already exist.')
             self.execute_commit_update_query(self.__update_substance_query,
                                              [substance_name.lower(), quantity.lower(), substance_id])
+            self.__invalidate_cache()
             logger.info(f'Updated substance with id \"{substance_id}\". Name set to \"{substance_name}\" '
                         f'and quantity set to \"{quantity}\".', module=Module.DB)
         except InvalidDataException:
@@ -127,6 +148,7 @@ class SubstanceRepository(AbstractRepository):
             result_set: List[List[str]] = result.fetchall()
             if result_set is None or not len(result_set):
                 self.execute_commit_update_query(self.__delete_substance_query, [substance_id])
+                self.__invalidate_cache()
                 logger.info(f'Deleted substance with id \"{substance_id}\"', module=Module.DB)
                 return
             raise InvalidDataException(f'No substance found for given ID \"{substance_id}\"')
@@ -158,3 +180,6 @@ class SubstanceRepository(AbstractRepository):
         """
         super().__init__(conn)
         self.conn: sqlite3.Connection = conn
+        self.__substances_by_id: Optional[Dict[int, Tuple[str, str]]] = None
+        self.__name_quantity_pairs: Optional[Set[Tuple[str, str]]] = None
+        self.__cache_lock: threading.Lock = threading.Lock()
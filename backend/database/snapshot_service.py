@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from exception.Exceptions import SnapshotException
+from log_handler.log_handler import Module, log as logger
+from metrics.metrics import metrics, Histogram
+
+SNAPSHOT_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_db_snapshot_seconds', 'Time to copy the database with the online backup API.'
+)
+
+
+class SnapshotService:
+    """
+    Creates consistent copies of the live database with the SQLite online backup API (ML sync and backups)
+    and consistent read-only views (CSV exports).
+
+    In WAL mode the copy is made in steps of a few pages from a dedicated connection that keeps one read
+    transaction open for the whole backup, so the copy shows the database as of the start of the snapshot while
+    the test threads keep committing between the steps. In rollback journal mode an open read transaction would
+    block the writers, so the copy is made in a single step instead.
+    """
+
+    def __is_wal(self, conn: sqlite3.Connection) -> bool:
+        return conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+
+    def __pause(self, *_) -> None:
+        if self.__sleep > 0:
+            time.sleep(self.__sleep)
+
+    def __copy(self, target: str) -> None:
+        """
+        Copies the database to the target file, written to a temporary file first.
+        :param target: the target file.
+        :raise SnapshotException: if the copy fails.
+        """
+        start: float = time.monotonic()
+        temp_target: str = f'{target}.part'
+        source: sqlite3.Connection = sqlite3.connect(self.__db_path)
+        destination: sqlite3.Connection = sqlite3.connect(temp_target)
+        try:
+            if self.__is_wal(source):
+                source.execute('BEGIN')
+                source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                # sqlite3's sleep argument only applies to busy steps, the progress callback paces every step
+                source.backup(destination, pages=self.__pages, progress=self.__pause)
+                source.rollback()
+            else:
+                source.backup(destination)
+            # Self-contained file without -wal/-shm companions
+            destination.execute('PRAGMA journal_mode=DELETE')
+            destination.close()
+            os.replace(temp_target, target)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f'Error creating database snapshot \"{target}\". Trace:', e, module=Module.DB)
+            destination.close()
+            if os.path.exists(temp_target):
+                os.remove(temp_target)
+            raise SnapshotException()
+        finally:
+            source.close()
+        SNAPSHOT_SECONDS.observe(time.monotonic() - start)
+        logger.debug(f'Snapshot \"{target}\" created in {time.monotonic() - start:.2f}s.', module=Module.DB)
+
+    @staticmethod
+    def __new_filename(directory: str, prefix: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'{prefix}-{datetime.now().strftime("%Y%m%d-%H%M%S")}-'
+                                       f'{uuid.uuid4().hex[:8]}.db')
+
+    def create_snapshot(self, target: Optional[str] = None) -> str:
+        """
+        Creates a consistent copy of the database. The caller removes the file when done.
+        :param target: (Optional) the snapshot file, default: a new file in the snapshot directory.
+        :return: the path of the snapshot.
+        :raise SnapshotException: if the snapshot can't be created.
+        """
+        if target is None:
+            target = self.__new_filename(self.__snapshot_dir, 'snapshot')
+        self.__copy(target)
+        return target
+
+    def create_backup(self) -> str:
+        """
+        Creates a backup in the backup directory and removes the backups beyond the retention.
+        :return: the path of the backup.
+        :raise SnapshotException: if the backup can't be created.
+        """
+        target: str = self.__new_filename(self.__backup_dir, 'backup')
+        self.__copy(target)
+        logger.info(f'Database backed up to \"{target}\".', module=Module.DB)
+        if self.__backup_retention > 0:
+            for backup in self.get_backups()[self.__backup_retention:]:
+                try:
+                    os.remove(backup)
+                except OSError as e:
+                    logger.error(f'Error removing old backup \"{backup}\". Trace:', e, module=Module.DB)
+        return target
+
+    def get_backups(self) -> List[str]:
+        """
+        Get the backups, newest first.
+        """
+        if not os.path.isdir(self.__backup_dir):
+            return []
+        return sorted(
+            [os.path.join(self.__backup_dir, name) for name in os.listdir(self.__backup_dir)
+             if name.startswith('backup-') and name.endswith('.db')],
+            reverse=True
+        )
+
+    @contextmanager
+    def read_snapshot(self) -> Iterator[sqlite3.Connection]:
+        """
+        Opens a read-only connection to a consistent state of the database, for long reads such as exports.
+        In WAL mode the connection holds a read transaction on the live database, otherwise it reads a copy.
+        :raise SnapshotException: if the snapshot can't be opened.
+        """
+        copy: Optional[str] = None
+        try:
+            conn: sqlite3.Connection = sqlite3.connect(f'file:{self.__db_path}?mode=ro', uri=True)
+            if not self.__is_wal(conn):
+                conn.close()
+                copy = self.create_snapshot()
+                conn = sqlite3.connect(f'file:{copy}?mode=ro', uri=True)
+            conn.execute('BEGIN')
+        except sqlite3.Error as e:
+            logger.error('Error opening database snapshot. Trace:', e, module=Module.DB)
+            raise SnapshotException()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            if copy is not None:
+                os.remove(copy)
+
+    def __init__(
+            self,
+            db_path: str,
+            snapshot_dir: str,
+            backup_dir: str,
+            backup_retention: int = 7,
+            pages: int = 1024,
+            sleep: float = 0.005
+    ):
+        """
+        Constructor.
+        :param db_path: the live database.
+        :param snapshot_dir: the directory of temporary snapshots (ML sync).
+        :param backup_dir: the backup directory.
+        :param backup_retention: number of kept backups, 0 keeps all.
+        :param pages: pages copied per backup step.
+        :param sleep: seconds between the backup steps.
+        """
+        self.__db_path: str = db_path
+        self.__snapshot_dir: str = snapshot_dir
+        self.__backup_dir: str = backup_dir
+        self.__backup_retention: int = backup_retention
+        self.__pages: int = max(1, pages)
+        self.__sleep: float = max(0.0, sleep)
@@ -28,3 +28,15 @@ class DBInitialisationException(Exception):
 
 class InvalidDataException(Exception):
     pass
+
+
+class ArchiveNotAvailableException(Exception):
+    pass
+
+
+class SnapshotException(Exception):
+    pass
+
+
+class MaintenanceException(Exception):
+    pass
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# Shared by the backend and the ML service, the copies must stay identical (see backend/test/shared_modules_test.py)
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Callable, Iterator, Sequence
+
+# Latency buckets in seconds, from sub-millisecond database writes to multi-second HTTP retries
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    Base class of the metrics, a value per combination of label values.
+    """
+
+    metric_type: str = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name: str = name
+        self.description: str = description
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self._lock: threading.Lock = threading.Lock()
+
+    def _key(self, label_values: Sequence[str]) -> Tuple[str, ...]:
+        if len(label_values) != len(self.labels):
+            raise ValueError(f'Metric {self.name} expects labels {self.labels}, got {tuple(label_values)}.')
+        return tuple(str(value) for value in label_values)
+
+    def _label_string(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs: List[Tuple[str, str]] = list(zip(self.labels, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not len(pairs):
+            return ''
+        return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        lines: List[str] = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} {self.metric_type}'
+        ]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value, e.g. the number of frames read.
+    """
+
+    metric_type: str = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        key: Tuple[str, ...] = self._key(label_values)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values: List[Tuple[Tuple[str, ...], float]] = sorted(self.__values.items())
+        return [f'{self.name}{self._label_string(key)} {_format_value(value)}' for key, value in values]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, e.g. a queue depth. Can also be read from a callback on every scrape.
+    """
+
+    metric_type: str = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+        self.__function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *label_values: str) -> None:
+        key: Tuple[str, ...] = self._key(label_values)
+        with self._lock:
+            self.__values[key] = value
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        key: Tuple[str, ...] = self._key(label_values)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Reads the (unlabelled) value from the given function on every scrape.
+        """
+        self.__function = function
+
+    def _samples(self) -> List[str]:
+        if self.__function is not None:
+            try:
+                return [f'{self.name} {_format_value(self.__function())}']
+            except Exception:
+                return []
+        with self._lock:
+            values: List[Tuple[Tuple[str, ...], float]] = sorted(self.__values.items())
+        return [f'{self.name}{self._label_string(key)} {_format_value(value)}' for key, value in values]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (e.g. latencies in seconds) in cumulative buckets.
+    """
+
+    metric_type: str = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.__buckets: List[float] = sorted(buckets)
+        # Per label values: bucket counts (non-cumulative, last one is +Inf), sum
+        self.__values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        key: Tuple[str, ...] = self._key(label_values)
+        index: int = bisect.bisect_left(self.__buckets, value)
+        with self._lock:
+            counts, total = self.__values.setdefault(key, ([0] * (len(self.__buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """
+        Observes the duration of the with-block in seconds.
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self.__values.items())
+        lines: List[str] = []
+        for key, (counts, total) in values:
+            cumulative: int = 0
+            for bound, count in zip(self.__buckets + [math.inf], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_string(key, ("le", _format_value(bound)))} '
+                             f'{cumulative}')
+            lines.append(f'{self.name}_sum{self._label_string(key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{self._label_string(key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    (Singleton) Holds the service's metrics and renders them in the Prometheus text format for /metrics.
+    """
+
+    def __register(self, metric: _Metric) -> _Metric:
+        with self.__lock:
+            if metric.name in self.__metrics:
+                existing: _Metric = self.__metrics[metric.name]
+                if type(existing) is not type(metric):
+                    raise ValueError(f'Metric {metric.name} is already registered as {existing.metric_type}.')
+                return existing
+            self.__metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self.__register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.__register(Gauge(name, description, labels))
+
+    def histogram(
+            self,
+            name: str,
+            description: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.__register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        """
+        Renders all metrics.
+        :return: the metrics in the Prometheus text exposition format.
+        """
+        with self.__lock:
+            metrics: List[_Metric] = list(self.__metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def __init__(self):
+        self.__metrics: Dict[str, _Metric] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+
+metrics: MetricsRegistry = MetricsRegistry()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# Shared by the backend and the ML service, the copies must stay identical (see backend/test/shared_modules_test.py)
+import itertools
+import os
+import random
+import statistics
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterator, Deque, Tuple
+
+import config
+
+TRACE_HEADER: str = 'X-Trace-Id'
+
+
+class Trace:
+    """
+    The spans of a single frame. Span offsets are relative to the ingest timestamp (time.monotonic()),
+    so durations of different processes are comparable while offsets are only meaningful within one process.
+    """
+
+    __slots__ = ('trace_id', 'device', 'ingest', 'wall_time', 'spans', 'sampled')
+
+    def __init__(self, trace_id: str, device: str, ingest: float, sampled: bool):
+        self.trace_id: str = trace_id
+        self.device: str = device
+        self.ingest: float = ingest
+        self.wall_time: datetime = datetime.now()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.sampled: bool = sampled
+
+    def add_span(self, stage: str, start: float, end: float) -> None:
+        """
+        Records a stage.
+        :param stage: the stage name.
+        :param start: time.monotonic() at the start of the stage.
+        :param end: time.monotonic() at the end of the stage.
+        """
+        if self.sampled:
+            self.spans.append((stage, start - self.ingest, end - start))
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """
+        Records the duration of the with-block as a stage.
+        """
+        if not self.sampled:
+            yield
+            return
+        start: float = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(stage, start, time.monotonic())
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans: List[Tuple[str, float, float]] = list(self.spans)
+        return {
+            'trace_id': self.trace_id,
+            'device': self.device,
+            'time': self.wall_time.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'total_ms': round(max([offset + duration for _, offset, duration in spans], default=0) * 1000, 3),
+            'spans': [
+                {'stage': stage, 'offset_ms': round(offset * 1000, 3), 'duration_ms': round(duration * 1000, 3)}
+                for stage, offset, duration in spans
+            ]
+        }
+
+
+class Tracer:
+    """
+    Per-frame span tracing. Finished traces are kept in a ring buffer that is dumped by the debug endpoint.
+    Trace IDs are propagated to the other service with the X-Trace-Id header.
+    """
+
+    def start(self, device: str = '', ingest: Optional[float] = None, trace_id: Optional[str] = None) -> Trace:
+        """
+        Starts a trace. Unsampled traces record nothing.
+        :param device: the device (MAC address) the frame belongs to.
+        :param ingest: (Optional) time.monotonic() at which the frame was received, default: now.
+        :param trace_id: (Optional) the ID of a trace started by the other service.
+        :return: the trace.
+        """
+        if trace_id is None:
+            sampled: bool = self.__sample_rate >= 1 or random.random() < self.__sample_rate
+            trace_id = f'{self.__prefix}-{next(self.__counter):x}'
+        else:
+            sampled = self.__sample_rate > 0
+        return Trace(trace_id, device, time.monotonic() if ingest is None else ingest, sampled)
+
+    def finish(self, trace: Trace) -> None:
+        """
+        Adds the trace to the ring buffer. Spans recorded later (e.g. by a background request) are still added.
+        """
+        if trace.sampled and self.__buffer.maxlen:
+            self.__buffer.append(trace)
+
+    def get_traces(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the most recent traces.
+        :param limit: (Optional) the maximum number of traces.
+        :return: the traces, newest first.
+        """
+        traces: List[Trace] = list(self.__buffer)
+        traces.reverse()
+        if limit is not None:
+            traces = traces[:max(0, limit)]
+        return [trace.to_dict() for trace in traces]
+
+    def get_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarises the stage durations of the buffered traces.
+        :return: count, p50, p95, p99 and max duration in milliseconds per stage.
+        """
+        durations: Dict[str, List[float]] = {}
+        for trace in list(self.__buffer):
+            for stage, _, duration in list(trace.spans):
+                durations.setdefault(stage, []).append(duration * 1000)
+        summary: Dict[str, Dict[str, float]] = {}
+        for stage, values in durations.items():
+            values.sort()
+            quantiles: List[float] = statistics.quantiles(values, n=100, method='inclusive') \
+                if len(values) > 1 else values * 99
+            summary[stage] = {
+                'count': len(values),
+                'p50_ms': round(quantiles[49], 3),
+                'p95_ms': round(quantiles[94], 3),
+                'p99_ms': round(quantiles[98], 3),
+                'max_ms': round(values[-1], 3)
+            }
+        return summary
+
+    def __init__(self, buffer_size: int, sample_rate: float):
+        """
+        Constructor.
+        :param buffer_size: the number of kept traces, 0 disables tracing.
+        :param sample_rate: the fraction of frames that are traced (0-1).
+        """
+        self.__buffer: Deque[Trace] = deque(maxlen=max(0, buffer_size))
+        self.__sample_rate: float = sample_rate if buffer_size > 0 else 0
+        self.__prefix: str = os.urandom(3).hex()
+        self.__counter: Iterator[int] = itertools.count()
+
+
+tracer: Tracer = Tracer(buffer_size=config.TRACE_BUFFER_SIZE, sample_rate=config.TRACE_SAMPLE_RATE)
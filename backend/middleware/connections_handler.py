@@ -1,13 +1,28 @@
-import json
-import sys
-from typing import Dict, Tuple, List
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Dict, Tuple, List, Optional, Any, Set
 
 from flask_socketio import SocketIO
+
+import config
+
+from analytics.downsampler import Downsampler
+from csv_handler.csv_handler import CSVHandler
 from database.db_handler import DatabaseHandler
+from database.repositories.data_repository import DataRepository
 from exception.Exceptions import DriverNotInstalledException, InvalidDataException, PortNotUsedException, \
-    DeviceNotFoundException, InfoFetchException, DeviceNotConnectedException
+    DeviceNotFoundException, InfoFetchException, DeviceNotConnectedException, ArchiveNotAvailableException, \
+    SnapshotException, MaintenanceException
 from log_handler.log_handler import Module, log as logger
+from middleware.data_emitter import DataEmitter
+from middleware.device_registry import DeviceRegistry
 from middleware.serial_db_test_handler import TestHandler
+from ml_helper import ml_helper
+from responses.response_layer import dumps
+from serial_com.port_discovery import port_discovery
 from serial_com.serial_com_handler import SerialComHandler
 
 
@@ -16,7 +31,8 @@ class MiddlewareConnectionHandler:
     Handles all connected serial devices.
     """
 
-    __device_not_connected_error: Tuple[str, int] = json.dumps({'error': 'Device is not connected!'}), 400
+    __device_not_connected_error: Tuple[str, int] = dumps({'error': 'Device is not connected!'}), 400
+    __REGISTRATION_GRACE_SECONDS: float = 3
 
     def __get_substance_by_id(self, substance_id: str) -> Tuple[str, str]:
         """
@@ -32,14 +48,15 @@ class MiddlewareConnectionHandler:
         except InvalidDataException as e:
             raise InvalidDataException(str(e))
 
-    def __check_device_busy(self, device_nickname: str) -> bool:
+    def __get_data_emitter(self, socketio: SocketIO) -> DataEmitter:
         """
-        Checks whether the device with the given nickname is already running a test.
+        Get the data emitter shared by all tests, created on first use.
+        :param socketio: socketio instance.
+        :return: the data emitter.
         """
-        for _, test_data in self.__test_threads.items():
-            if test_data['device_nickname'] == device_nickname:
-                return True
-        return False
+        if self.__data_emitter is None:
+            self.__data_emitter = DataEmitter(socketio)
+        return self.__data_emitter
 
     def __start_test(
             self,
@@ -57,18 +74,20 @@ class MiddlewareConnectionHandler:
         :return:
         """
         try:
-            if self.__check_device_busy(device_nickname):
+            if self.__registry.is_busy(device_nickname):
                 logger.error(f'Attempted to start a test using device \"{device_nickname}\" '
                              f'but it is already running one.', module=Module.MIDDLE)
                 return False
-            mac_address = self.__connected_devices[device_nickname].get_device_info()[1]
+            device: SerialComHandler = self.__registry.get_device(device_nickname)
+            mac_address = device.get_device_info()[1]
             test_obj: TestHandler = TestHandler(
-                serial_com=self.__connected_devices[device_nickname],
+                serial_com=device,
                 database=self.__database,
                 test_name=test_name,
                 mac_address=mac_address,
                 data_acquisition_enabled=data_acquisition_enabled,
-                socketio=socketio
+                data_emitter=self.__get_data_emitter(socketio),
+                on_reconnect=lambda port: self.__on_device_reconnected(device_nickname, mac_address, port)
             )
             test_obj.start_test()
             test_data: Dict = {
@@ -76,13 +95,26 @@ class MiddlewareConnectionHandler:
                 'start_time': test_obj.get_test_start_time(),
                 'test_obj': test_obj
             }
-            self.__test_threads[test_name] = test_data
+            self.__registry.add_test(test_name, test_data)
             return True
         except Exception as e:
             logger.error(f'Error starting test \"{test_name}\" for device \"{device_nickname}\". Trace:',
                          e, module=Module.MIDDLE)
             return False
 
+    def __on_device_reconnected(self, device_nickname: str, mac_address: str, port: str) -> None:
+        """
+        Updates the device's port after a running test reconnected it.
+        :param device_nickname: nickname of the device.
+        :param mac_address: MAC address of the device.
+        :param port: the port the device was found on.
+        """
+        try:
+            self.__registry.update_device_port(device_nickname, mac_address, port)
+        except DeviceNotFoundException as e:
+            logger.error(f'Error updating port of device \"{device_nickname}\". Trace:', e, module=Module.MIDDLE)
+        port_discovery.notify()
+
     def __stop_test(self, test_name: str, device_nickname: str) -> bool:
         """
         Stops a running test.
@@ -91,15 +123,25 @@ class MiddlewareConnectionHandler:
         :return:
         """
         try:
-            test_obj: TestHandler = self.__test_threads[test_name]['test_obj']
+            test_obj: TestHandler = self.__registry.get_test(test_name)['test_obj']
             test_obj.stop_test()
-            del self.__test_threads[test_name]
+            self.__registry.remove_test(test_name)
+            if config.ARCHIVE_ON_STOP:
+                threading.Thread(target=self.__archive_stopped_test, args=(test_name,), daemon=True).start()
             return True
         except Exception as e:
             logger.error(f'Error stopping test \"{test_name}\" for device \"{device_nickname}\". Trace:',
                          e, module=Module.MIDDLE)
             return False
 
+    def __archive_stopped_test(self, test_name: str) -> None:
+        try:
+            self.__database.ArchiveRepository.archive_test(test_name, prune=config.ARCHIVE_PRUNE)
+        except ArchiveNotAvailableException:
+            logger.warning('ARCHIVE_ON_STOP is enabled, but pyarrow is not installed.', module=Module.MIDDLE)
+        except InvalidDataException:
+            logger.warning(f'Test \"{test_name}\" was not archived.', module=Module.MIDDLE)
+
     @staticmethod
     def get_serial_ports() -> Tuple[str, int]:
         """
@@ -107,26 +149,22 @@ class MiddlewareConnectionHandler:
         :return: a list of free serial COM ports as a json list and a http response code.
         """
         try:
-            if sys.platform.startswith("win"):
-                from serial_com.win32_serial import win32api as serial_com
-            else:
-                from serial_com.posix_serial import posix_serial_api as serial_com
-            ports: List[str] = serial_com.find_com_ports_by_driver()
-            return json.dumps({
+            ports: List[str] = port_discovery.get_ports()
+            return dumps({
                 'ports': ports
             }), 200
         except DriverNotInstalledException:
-            return json.dumps({'error': 'No devices found. Please check installation guide.'}), 400
+            return dumps({'error': 'No devices found. Please check installation guide.'}), 400
         except Exception as e:
             logger.error('Error fetching serial ports. Trace:', e, module=Module.MIDDLE)
-            return json.dumps({'error': 'Error fetching devices. Try again.'}), 400
+            return dumps({'error': 'Error fetching devices. Try again.'}), 400
 
     def get_substances(self) -> Tuple[str, int]:
         """
         Get a list of all available substances.
         :return: a list of all available substances as json and a http response code.
         """
-        return json.dumps(self.__database.SubstanceRepository.get_substances()), 200
+        return dumps(self.__database.SubstanceRepository.get_substances()), 200
 
     def add_substance(self, substance_name: str, quantity: str) -> Tuple[str, int]:
         """
@@ -137,9 +175,9 @@ class MiddlewareConnectionHandler:
         """
         try:
             self.__database.SubstanceRepository.add_substance(substance_name, quantity)
-            return json.dumps({'success': True}), 200
+            return dumps({'success': True}), 200
         except Exception as e:
-            return json.dumps({'error': str(e)}), 400
+            return dumps({'error': str(e)}), 400
 
     def update_substance(self, substance_id: str, substance_name: str, quantity: str) -> Tuple[str, int]:
         """
@@ -151,9 +189,9 @@ class MiddlewareConnectionHandler:
         """
         try:
             self.__database.SubstanceRepository.update_substance(substance_id, substance_name, quantity)
-            return json.dumps({'success': True}), 200
+            return dumps({'success': True}), 200
         except Exception as e:
-            return json.dumps({'error': str(e)}), 400
+            return dumps({'error': str(e)}), 400
 
     def delete_substance(self, substance_id: str) -> Tuple[str, int]:
         """
@@ -163,16 +201,16 @@ class MiddlewareConnectionHandler:
         """
         try:
             self.__database.SubstanceRepository.delete_substance(substance_id)
-            return json.dumps({'success': True}), 200
+            return dumps({'success': True}), 200
         except Exception as e:
-            return json.dumps({'error': str(e)}), 400
+            return dumps({'error': str(e)}), 400
 
     def get_all_devices(self) -> Tuple[str, int]:
         """
         Return a list of all devices.
         :return: a list of all devices, regardless of state, in json format and a http response code.
         """
-        return json.dumps(self.__database.DeviceRepository.get_all_devices()), 200
+        return dumps(self.__registry.get_all_devices()), 200
 
     def get_connected_devices(self) -> Tuple[str, int]:
         """
@@ -180,9 +218,9 @@ class MiddlewareConnectionHandler:
         :return: a list of all connected devices in json format and a http response code.
         """
         try:
-            return json.dumps(self.__database.DeviceRepository.get_connected_devices()), 200
+            return dumps(self.__registry.get_connected_devices()), 200
         except InvalidDataException:
-            return json.dumps({'error': 'Error fetching devices.'}), 400
+            return dumps({'error': 'Error fetching devices.'}), 400
 
     def get_disconnected_devices(self) -> Tuple[str, int]:
         """
@@ -190,9 +228,9 @@ class MiddlewareConnectionHandler:
         :return: a list of all disconnected devices in json format and a http response code.
         """
         try:
-            return json.dumps(self.__database.DeviceRepository.get_disconnected_devices()), 200
+            return dumps(self.__registry.get_disconnected_devices()), 200
         except InvalidDataException:
-            return json.dumps({'error': 'Error fetching devices.'}), 400
+            return dumps({'error': 'Error fetching devices.'}), 400
 
     def get_free_devices(self) -> Tuple[str, int]:
         """
@@ -200,16 +238,196 @@ class MiddlewareConnectionHandler:
         :return: a list of devices not currently running tests.
         """
         try:
-            free_devices: List[List[str]] = []
-            devices: List[List[str]] = self.__database.DeviceRepository.get_connected_devices()
-            for i, device in enumerate(devices):
-                _, nickname, _, _, _, _, _ = device
-                if self.__check_device_busy(nickname):
-                    continue
-                free_devices.append(devices[i])
-            return json.dumps(free_devices), 200
+            return dumps(self.__registry.get_free_devices()), 200
         except Exception as e:
-            return json.dumps({'error': str(e)}), 400
+            return dumps({'error': str(e)}), 400
+
+    def get_downsampled_test_data(
+            self,
+            test_name: str,
+            width: int,
+            start: str = None,
+            end: str = None,
+            method: str = 'minmax',
+            channels: List[str] = None
+    ) -> Tuple[str, int]:
+        """
+        Get the data of a test downsampled to the given chart width.
+        :param test_name: the test name.
+        :param width: the chart width in pixels.
+        :param start: (Optional) range start (format: %Y-%m-%d %H:%M:%S).
+        :param end: (Optional) range end (format: %Y-%m-%d %H:%M:%S).
+        :param method: (Optional) "minmax" (default) or "lttb".
+        :param channels: (Optional) the channels to return, default: all.
+        :return: the downsampled data as json and a http response code.
+        """
+        try:
+            return dumps(self.__downsampler.get_downsampled(
+                test_name=test_name,
+                width=int(width),
+                start=start,
+                end=end,
+                method=method,
+                channels=channels
+            )), 200
+        except ValueError as e:
+            return dumps({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f'Error downsampling data of test "{test_name}". Trace:', e, module=Module.MIDDLE)
+            return dumps({'error': 'Error fetching test data.'}), 400
+
+    def get_data_rollups(
+            self,
+            resolution: int,
+            test_name: str = None,
+            substance_id: str = None,
+            start: str = None,
+            end: str = None
+    ) -> Tuple[str, int]:
+        """
+        Get the precomputed min/mean/max aggregates of the collected data.
+        :param resolution: the bucket size in seconds (see config.ROLLUP_RESOLUTIONS).
+        :param test_name: (Optional) filter by test name.
+        :param substance_id: (Optional) filter by substance id.
+        :param start: (Optional) first bucket start (format: %Y-%m-%d %H:%M:%S).
+        :param end: (Optional) last bucket start (format: %Y-%m-%d %H:%M:%S).
+        :return: the aggregated buckets as json and a http response code.
+        """
+        try:
+            resolution = int(resolution)
+            if resolution not in config.ROLLUP_RESOLUTIONS:
+                return dumps({'error': f'Unknown resolution. Available: {config.ROLLUP_RESOLUTIONS}'}), 400
+            return dumps(self.__database.RollupRepository.get_rollups(
+                resolution,
+                test_name=test_name,
+                substance_id=substance_id,
+                start=start,
+                end=end
+            )), 200
+        except ValueError:
+            return dumps({'error': 'Resolution must be an integer.'}), 400
+        except InvalidDataException:
+            return dumps({'error': 'Error fetching data rollups.'}), 400
+
+    def archive_test(self, test_name: str, prune: bool = None) -> Tuple[str, int]:
+        """
+        Archive a stopped test to the Parquet archive.
+        :param test_name: the test name.
+        :param prune: (Optional) whether to delete the test from the database, default: config.ARCHIVE_PRUNE.
+        :return: the catalogue entry as json and a http response code.
+        """
+        if self.__registry.get_test(test_name) is not None:
+            return dumps({'error': 'Test is still running!'}), 400
+        try:
+            return dumps(self.__database.ArchiveRepository.archive_test(
+                test_name,
+                prune=config.ARCHIVE_PRUNE if prune is None else config.parse_boolean(prune)
+            )), 200
+        except ArchiveNotAvailableException:
+            return dumps({'error': 'Archiving requires pyarrow to be installed.'}), 400
+        except InvalidDataException:
+            return dumps({'error': f'Error archiving test \"{test_name}\", see server logs.'}), 400
+
+    def get_archived_tests(self) -> Tuple[str, int]:
+        """
+        Get the catalogue of archived tests.
+        :return: the catalogue as json and a http response code.
+        """
+        try:
+            return dumps(self.__database.ArchiveRepository.get_catalogue()), 200
+        except InvalidDataException:
+            return dumps({'error': 'Error fetching archived tests.'}), 400
+
+    def get_test_gaps(self, test_name: str) -> Tuple[str, int]:
+        """
+        Get the periods in which a test collected no data because its device was reconnecting.
+        :param test_name: test name.
+        :return: the gaps as json and a http response code.
+        """
+        try:
+            return dumps(self.__database.DataRepository.get_gaps_by_test_name(test_name)), 200
+        except InvalidDataException:
+            return dumps({'error': 'Error fetching test gaps.'}), 400
+
+    def export_test_csv(self, test_name: str, filename: str) -> Tuple[str, int]:
+        """
+        Exports the data of a test to a CSV file. Reads from a consistent snapshot, so running tests can be exported.
+        Tests pruned to the Parquet archive are read from their archive file.
+        :param test_name: test name.
+        :param filename: the CSV file to write.
+        :return: the filename (an error as json on failure) and a http response code.
+        """
+        if test_name not in [row[0] for row in self.__database.DataRepository.get_test_names()]:
+            return dumps({'error': f'Test "{test_name}" not found.'}), 400
+        try:
+            with self.__database.SnapshotService.read_snapshot() as conn:
+                CSVHandler().export(
+                    DataRepository.COLUMNS,
+                    self.__database.DataRepository.iterate_by_test_name(test_name, conn),
+                    filename
+                )
+            return filename, 200
+        except ArchiveNotAvailableException:
+            return dumps({'error': f'Test "{test_name}" is archived, exporting it requires pyarrow.'}), 400
+        except (SnapshotException, InvalidDataException, sqlite3.Error, OSError) as e:
+            logger.error(f'Error exporting test "{test_name}". Trace:', e, module=Module.MIDDLE)
+            return dumps({'error': f'Error exporting test "{test_name}", see server logs.'}), 400
+
+    def create_backup(self) -> Tuple[str, int]:
+        """
+        Backs up the database with the online backup API, consistent while tests are running.
+        :return: the backup file and size as json and a http response code.
+        """
+        try:
+            backup: str = self.__database.SnapshotService.create_backup()
+            return dumps({'backup': backup, 'size': os.path.getsize(backup)}), 200
+        except SnapshotException:
+            return dumps({'error': 'Error creating backup, see server logs.'}), 400
+
+    def get_backups(self) -> Tuple[str, int]:
+        """
+        Get the database backups, newest first.
+        :return: the backup files and sizes as json and a http response code.
+        """
+        backups: List[Dict[str, Any]] = []
+        for backup in self.__database.SnapshotService.get_backups():
+            try:
+                backups.append({'backup': backup, 'size': os.path.getsize(backup)})
+            except OSError:
+                continue  # removed in the meantime
+        return dumps(backups), 200
+
+    def run_maintenance(self) -> Tuple[str, int]:
+        """
+        Runs the database maintenance now (retention, compaction and statistics while no test is running).
+        :return: the maintenance report as json and a http response code.
+        """
+        try:
+            return dumps(self.__database.MaintenanceService.run()), 200
+        except MaintenanceException as e:
+            return dumps({'error': str(e)}), 400
+
+    def convert_database_vacuum(self) -> Tuple[str, int]:
+        """
+        Converts an existing database to incremental auto vacuum (one-off VACUUM, refused while tests are running).
+        :return: the conversion report as json and a http response code.
+        """
+        try:
+            return dumps(self.__database.MaintenanceService.convert_to_incremental_vacuum()), 200
+        except MaintenanceException as e:
+            return dumps({'error': str(e)}), 400
+
+    def get_database_size_history(self, start: str = None) -> Tuple[str, int]:
+        """
+        Get the database sizes recorded by the maintenance runs.
+        :param start: (Optional) first sample time (format: %Y-%m-%d %H:%M:%S).
+        :return: the size history as json and a http response code.
+        """
+        try:
+            return dumps(self.__database.MaintenanceService.get_size_history(start)), 200
+        except sqlite3.Error as e:
+            logger.error('Error fetching database size history. Trace:', e, module=Module.MIDDLE)
+            return dumps({'error': 'Error fetching database size history.'}), 400
 
     def update_test_substance(self, test_name: str, substance_id: str) -> Tuple[str, int]:
         """
@@ -218,15 +436,16 @@ class MiddlewareConnectionHandler:
         :param substance_id: the id of the new substance.
         :return: json response message and http status code.
         """
-        if test_name not in self.__test_threads:
-            return json.dumps({'error': 'Device is not currently running a test.'}), 400
+        test_data: Optional[Dict] = self.__registry.get_test(test_name)
+        if test_data is None:
+            return dumps({'error': 'Device is not currently running a test.'}), 400
         try:
             substance_name, quantity = self.__get_substance_by_id(substance_id)
         except InvalidDataException as e:
-            return json.dumps({'error': str(e)}), 400
-        test_obj: TestHandler = self.__test_threads[test_name]['test_obj']
+            return dumps({'error': str(e)}), 400
+        test_obj: TestHandler = test_data['test_obj']
         test_obj.update_substance_id(substance_id)
-        return json.dumps({
+        return dumps({
             'substance_id': test_obj.get_substance_id(),
             'substance': substance_name,
             'quantity': quantity,
@@ -239,15 +458,16 @@ class MiddlewareConnectionHandler:
         :param test_name: the test name.
         :return: the substance and a http response code.
         """
-        if test_name not in self.__test_threads:
-            return json.dumps({'error': 'Device is not currently running a test.'}), 400
-        test_obj: TestHandler = self.__test_threads[test_name]['test_obj']
+        test_data: Optional[Dict] = self.__registry.get_test(test_name)
+        if test_data is None:
+            return dumps({'error': 'Device is not currently running a test.'}), 400
+        test_obj: TestHandler = test_data['test_obj']
         substance_id: str = test_obj.get_substance_id()
         try:
             substance_name, quantity = self.__get_substance_by_id(substance_id)
         except InvalidDataException as e:
-            return json.dumps({'error': str(e)}), 400
-        return json.dumps({
+            return dumps({'error': str(e)}), 400
+        return dumps({
             'substance_id': substance_id,
             'substance': substance_name,
             'quantity': quantity,
@@ -269,21 +489,22 @@ class MiddlewareConnectionHandler:
         :param socketio: socketio instance.
         :return: The updated test message as json and a http response code.
         """
-        if device_nickname not in self.__connected_devices:
+        if not self.__registry.is_connected(device_nickname):
             return self.__device_not_connected_error
-        if test_name in self.__test_threads:
-            if device_nickname != self.__test_threads[test_name]['device_nickname']:
-                return json.dumps({'error': 'Wrong device name supplied!'}), 400
+        test_data: Optional[Dict] = self.__registry.get_test(test_name)
+        if test_data is not None:
+            if device_nickname != test_data['device_nickname']:
+                return dumps({'error': 'Wrong device name supplied!'}), 400
             if not self.__stop_test(test_name, device_nickname):
-                return json.dumps({'error': 'Error stopping test, see server logs!'}), 400
-            return json.dumps({'info': f'Test \"{test_name}\" was stopped!'}), 200
+                return dumps({'error': 'Error stopping test, see server logs!'}), 400
+            return dumps({'info': f'Test \"{test_name}\" was stopped!'}), 200
         if not len(test_name):
-            return json.dumps({'error': 'Test name cannot be empty!'}), 400
+            return dumps({'error': 'Test name cannot be empty!'}), 400
         if test_name in self.__database.DataRepository.get_test_names():
-            return json.dumps({'error': 'Test name was already used! Pick a new one!'}), 400
+            return dumps({'error': 'Test name was already used! Pick a new one!'}), 400
         if not self.__start_test(test_name, device_nickname, data_acquisition_enabled, socketio):
-            return json.dumps({'error': 'Error starting test, see server logs!'}), 400
-        return json.dumps({'info': f'Test \"{test_name}\" started!'}), 200
+            return dumps({'error': 'Error starting test, see server logs!'}), 400
+        return dumps({'info': f'Test \"{test_name}\" started!'}), 200
 
     def get_active_tests(self) -> Tuple[str, int]:
         """
@@ -292,15 +513,67 @@ class MiddlewareConnectionHandler:
         """
         js_data = []
         try:
-            for test_name, test_data in self.__test_threads.items():
+            for test_name, test_data in self.__registry.get_tests().items():
                 js_data.append({
                     'test_name': test_name,
                     'device_nickname': test_data['device_nickname']
                 })
-            return json.dumps(js_data), 200
+            return dumps(js_data), 200
         except Exception as e:
             logger.error('Error serialising test data. Trace:', e, module=Module.MIDDLE)
-            return json.dumps({'error': 'Error occurred fetching data. See server logs.'}), 400
+            return dumps({'error': 'Error occurred fetching data. See server logs.'}), 400
+
+    def __connect_device(
+            self,
+            device_nickname: str,
+            com_port: str = None,
+            deadline: Optional[float] = None,
+            fallback: bool = True,
+            abandoned: Optional[threading.Event] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        Opens the port, runs the GET_INFO handshake and registers the device.
+        :param device_nickname: nickname for the device.
+        :param com_port: (Optional) Port the device is connected to.
+        :param deadline: (Optional) time.monotonic() value after which the handshake is aborted.
+        :param fallback: (Optional) whether to use the first free port if com_port fails.
+        :param abandoned: (Optional) set once the caller stopped waiting, the device is not registered anymore.
+        :return: the response message and a http response code.
+        """
+        device: Optional[SerialComHandler] = None
+        try:
+            device = SerialComHandler(serial_port=com_port, deadline=deadline, fallback=fallback)
+            software_version, mac_address = device.get_device_info(deadline=deadline)[:2]
+            port: str = device.get_port_name()
+            with self.__registration_lock:
+                if abandoned is not None and abandoned.is_set():
+                    raise DeviceNotConnectedException()
+                self.__registry.register_device(
+                    device_nickname=device_nickname,
+                    device=device,
+                    mac_address=mac_address,
+                    software_version=software_version,
+                    port=port
+                )
+            port_discovery.notify()
+            return {'info': 'Device registered successfully.', 'details': device.get_device_info()}, 200
+        except DriverNotInstalledException:
+            return {'error': 'Error registering device. Serial COM error.'}, 400
+        except InvalidDataException:
+            self.__shutdown_quietly(device)
+            return {'error': 'Error registering device. DB Error occurred.'}, 400
+        except (DeviceNotConnectedException, InfoFetchException):
+            self.__shutdown_quietly(device)
+            return {'error': 'Error registering device. Handshake failed or timed out.'}, 400
+
+    @staticmethod
+    def __shutdown_quietly(device: Optional[SerialComHandler]) -> None:
+        if device is None:
+            return
+        try:
+            device.shutdown()
+        except Exception as e:
+            logger.error('Error closing device after failed registration. Trace:', e, module=Module.MIDDLE)
 
     def register_device(
             self,
@@ -313,28 +586,99 @@ class MiddlewareConnectionHandler:
         :param com_port: (Optional) Port the device is connected to.
         :return: a json response and http response code.
         """
-        if device_nickname in self.__connected_devices.keys():
-            return json.dumps({'error': f'Device with name \"{device_nickname}\" already exists.'}), 400
-        if com_port is not None:
-            for _, device in self.__connected_devices.items():
-                if device.get_port_name() == com_port:
-                    return json.dumps({'error': f'Port \"{com_port}\" is already connected.'}), 400
+        if self.__registry.is_connected(device_nickname):
+            return dumps({'error': f'Device with name \"{device_nickname}\" already exists.'}), 400
+        if com_port is not None and self.__registry.get_nickname_by_port(com_port) is not None:
+            return dumps({'error': f'Port \"{com_port}\" is already connected.'}), 400
+        message, code = self.__connect_device(device_nickname, com_port)
+        return dumps(message), code
+
+    def __plan_registrations(self, devices: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Validates a bulk registration and assigns free ports to the devices without one.
+        :param devices: the devices to register ("device_nickname" and optional "com_port").
+        :return: one result per device, with an "error" for the devices that can't be registered.
+        """
         try:
-            device: SerialComHandler = SerialComHandler(serial_port=com_port)
-            software_version, mac_address = device.get_device_info()[:2]
-            port: str = device.get_port_name()
-            self.__database.DeviceRepository.persist_device(
-                device_name=device_nickname,
-                software_version=software_version,
-                mac_address=mac_address,
-                socket=port
-            )
-            self.__connected_devices[device_nickname] = device
-            return json.dumps({'info': 'Device registered successfully.', 'details': device.get_device_info()}), 200
+            free_ports: List[str] = port_discovery.get_ports()
         except DriverNotInstalledException:
-            return json.dumps({'error': 'Error registering device. Serial COM error.'}), 400
-        except InvalidDataException:
-            return json.dumps({'error': 'Error registering device. DB Error occurred.'}), 400
+            free_ports = []
+        requested_ports: Set[str] = {device.get('com_port') for device in devices if device.get('com_port')}
+        free_ports = [port for port in free_ports if port not in requested_ports]
+        nicknames: Set[str] = set()
+        ports: Set[str] = set()
+        plan: List[Dict[str, Any]] = []
+        for device in devices:
+            nickname: Optional[str] = device.get('device_nickname')
+            port: Optional[str] = device.get('com_port')
+            entry: Dict[str, Any] = {'device_nickname': nickname, 'com_port': port}
+            plan.append(entry)
+            if not nickname:
+                entry['error'] = 'Missing data. Required: "device_nickname"'
+            elif nickname in nicknames or self.__registry.is_connected(nickname):
+                entry['error'] = f'Device with name \"{nickname}\" already exists.'
+            elif port is not None and (port in ports or self.__registry.get_nickname_by_port(port) is not None):
+                entry['error'] = f'Port \"{port}\" is already connected.'
+            elif port is None and not len(free_ports):
+                entry['error'] = 'No free port left for the device.'
+            if 'error' in entry:
+                entry['status'] = 400
+                continue
+            if port is None:
+                entry['com_port'] = free_ports.pop(0)
+            nicknames.add(nickname)
+            ports.add(entry['com_port'])
+        return plan
+
+    def register_devices(self, devices: List[Dict[str, str]], timeout: float = None) -> Tuple[str, int]:
+        """
+        Registers multiple SmellInspector devices concurrently.
+        Devices without a "com_port" are assigned one of the free ports.
+        :param devices: the devices to register, each with a "device_nickname" and an optional "com_port".
+        :param timeout: (Optional) handshake timeout per device in seconds, default: config.REGISTRATION_TIMEOUT.
+        :return: a json list with one result per device and a http response code (200 if any device was registered).
+        """
+        try:
+            timeout = config.REGISTRATION_TIMEOUT if timeout is None else float(timeout)
+        except (TypeError, ValueError):
+            return dumps({'error': 'Timeout must be a number.'}), 400
+        if not isinstance(devices, list) or not len(devices):
+            return dumps({'error': 'No devices provided.'}), 400
+        for device in devices:
+            if not isinstance(device, dict) or not all(
+                    isinstance(device.get(key), (str, type(None))) for key in ('device_nickname', 'com_port')):
+                return dumps({'error': 'Each device must be an object with a "device_nickname" and an optional '
+                                       '"com_port" string.'}), 400
+        plan: List[Dict[str, Any]] = self.__plan_registrations(devices)
+        pending: List[Dict[str, Any]] = [entry for entry in plan if 'error' not in entry]
+        if len(pending):
+            deadline: float = time.monotonic() + timeout
+            abandoned: threading.Event = threading.Event()
+            executor: ThreadPoolExecutor = ThreadPoolExecutor(
+                max_workers=max(1, min(config.REGISTRATION_WORKERS, len(pending)))
+            )
+            futures: Dict[Future, Dict[str, Any]] = {
+                executor.submit(self.__connect_device, entry['device_nickname'], entry['com_port'],
+                                deadline, False, abandoned): entry
+                for entry in pending
+            }
+            # the handshake honours the deadline, the grace period covers the last blocking read
+            done, _ = wait(futures.keys(), timeout=timeout + self.__REGISTRATION_GRACE_SECONDS)
+            # handshakes still running close their port instead of registering the device
+            with self.__registration_lock:
+                abandoned.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            for future, entry in futures.items():
+                if future not in done and not self.__registry.is_connected(entry['device_nickname']):
+                    entry.update({'status': 400, 'error': 'Handshake timed out, the device was not registered.'})
+                    continue
+                # registered before the deadline, only the cached device info is left to fetch
+                message, code = future.result()
+                entry.update(message)
+                entry['status'] = code
+        logger.info(f'Registered {len([e for e in plan if e["status"] == 200])}/{len(plan)} devices.',
+                    module=Module.MIDDLE)
+        return dumps(plan), 200 if any(entry['status'] == 200 for entry in plan) else 400
 
     def de_register_device(
             self,
@@ -345,28 +689,48 @@ class MiddlewareConnectionHandler:
         :param device_nickname: the device name.
         :return: a json string and http response code.
         """
-        if device_nickname not in self.__connected_devices:
+        if not self.__registry.is_connected(device_nickname):
             return self.__device_not_connected_error
-        if self.__check_device_busy(device_nickname):
-            return json.dumps({'error': 'Device busy! Stop test and re-attempt disconnecting.'}), 400
+        if self.__registry.is_busy(device_nickname):
+            return dumps({'error': 'Device busy! Stop test and re-attempt disconnecting.'}), 400
         try:
-            device: SerialComHandler = self.__connected_devices[device_nickname]
+            device: SerialComHandler = self.__registry.get_device(device_nickname)
             _, mac_address = device.get_device_info()[:2]
             device.shutdown()
-            self.__database.DeviceRepository.update_device_state_by_mac_address(mac_address, False, '')
-            del self.__connected_devices[device_nickname]
-            return json.dumps({'info': f'Device with name \"{device_nickname}\" was de-registered.'}), 200
+            self.__registry.de_register_device(device_nickname, mac_address)
+            port_discovery.notify()
+            return dumps({'info': f'Device with name \"{device_nickname}\" was de-registered.'}), 200
         except PortNotUsedException:
-            return json.dumps({'error': f'No ports found for device \"{device_nickname}\".'}), 400
+            return dumps({'error': f'No ports found for device \"{device_nickname}\".'}), 400
         except DeviceNotFoundException | InfoFetchException | DeviceNotConnectedException:
-            return json.dumps({'error': f"Device with name \"{device_nickname}\" couldn't be found."}), 400
+            return dumps({'error': f"Device with name \"{device_nickname}\" couldn't be found."}), 400
+
+    def shutdown(self) -> None:
+        """
+        Stops all running tests and the maintenance and releases the connected devices (called when the server stops).
+        """
+        self.__database.MaintenanceService.stop()
+        for test_name, test_data in self.__registry.get_tests().items():
+            logger.info(f'Stopping test \"{test_name}\" before shutdown...', module=Module.MIDDLE)
+            self.__stop_test(test_name, test_data['device_nickname'])
+        for row in self.__registry.get_connected_devices():
+            device_nickname, mac_address = row[1], row[2]
+            self.__shutdown_quietly(self.__registry.get_device(device_nickname))
+            try:
+                self.__registry.de_register_device(device_nickname, mac_address)
+            except DeviceNotFoundException as e:
+                logger.error(f'Error releasing device \"{device_nickname}\". Trace:', e, module=Module.MIDDLE)
 
     def __init__(self):
         try:
             logger.info('Middleware boot-up...', module=Module.MIDDLE)
             self.__database: DatabaseHandler = DatabaseHandler()
-            self.__connected_devices: Dict[str, SerialComHandler] = {}
-            self.__test_threads: Dict[str, Dict] = {}
+            ml_helper.set_database(self.__database)
+            self.__registry: DeviceRegistry = DeviceRegistry(self.__database.DeviceRepository)
+            self.__data_emitter: Optional[DataEmitter] = None
+            self.__registration_lock: threading.Lock = threading.Lock()
+            self.__downsampler: Downsampler = Downsampler(self.__database.DataRepository)
+            self.__database.MaintenanceService.start(lambda: list(self.__registry.get_tests()))
             logger.info('Middleware booted.', module=Module.MIDDLE)
         except Exception as e:
             logger.error('Error during boot. Terminating. Trace:', e, module=Module.MIDDLE)
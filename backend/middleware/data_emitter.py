@@ -0,0 +1,172 @@
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from flask_socketio import SocketIO
+
+import config
+from log_handler.log_handler import Module, log as logger
+from metrics.metrics import metrics, Histogram
+
+EMIT_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_socketio_emit_seconds', 'Latency of socketio data emits.', ['event']
+)
+
+
+class DataEmitter:
+    """
+    Emits collected frames to the socketio clients.
+
+    Modes (see config):
+    - EMIT_INTERVAL = 0: every frame is emitted immediately as a "data_collected" event (legacy format).
+    - EMIT_INTERVAL > 0: frames are coalesced per test and emitted as one "data_batch" event per interval.
+      With EMIT_BINARY, the batch carries the channels as packed little-endian float32 values.
+    - EMIT_ROOMS: events are only sent to the clients that subscribed to the test ("subscribe_test").
+    """
+
+    LEGACY_EVENT: str = 'data_collected'
+    BATCH_EVENT: str = 'data_batch'
+    # 64 sensor channels + temperature + humidity
+    FRAME_VALUES: int = 66
+
+    @staticmethod
+    def __to_legacy_payload(test_name: str, frame: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            'test name': test_name,
+            'mac address': frame['mac_address'],
+            'substance': frame['substance'],
+            'start time': frame['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+            'data': ';'.join(frame['data']),
+            'temperature': frame['temperature'],
+            'humidity': frame['humidity']
+        }
+
+    def __to_batch_payload(self, test_name: str, frames: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Builds a coalesced payload for the given frames.
+        :param test_name: the test the frames belong to.
+        :param frames: the buffered frames.
+        :return: the batch payload.
+        """
+        payload: Dict[str, Any] = {
+            'test_name': test_name,
+            'mac_address': frames[-1]['mac_address'],
+            'substance': frames[-1]['substance'],
+            'count': len(frames),
+            'timestamps': [frame['timestamp'].strftime('%Y-%m-%d %H:%M:%S') for frame in frames],
+        }
+        values: List[List[float]] = [
+            [float(value) for value in frame['data']] + [float(frame['temperature']), float(frame['humidity'])]
+            for frame in frames
+        ]
+        if self.__binary:
+            flat: List[float] = [value for frame_values in values for value in frame_values]
+            payload['values_per_frame'] = self.FRAME_VALUES
+            payload['frames'] = struct.pack(f'<{len(flat)}f', *flat)
+        else:
+            payload['frames'] = values
+        return payload
+
+    def __emit(self, event: str, payload: Dict[str, Any], test_name: str) -> None:
+        with EMIT_SECONDS.time(event):
+            if self.__rooms:
+                self.__socketio.emit(event, payload, to=test_name)
+                return
+            self.__socketio.emit(event, payload)
+
+    def __flush_test(self, test_name: str, frames: List[Dict[str, Any]]) -> None:
+        if not len(frames):
+            return
+        try:
+            self.__emit(self.BATCH_EVENT, self.__to_batch_payload(test_name, frames), test_name)
+        except Exception as e:
+            logger.error(f'Error emitting {len(frames)} frames of test \"{test_name}\". Trace:', e,
+                         module=Module.EMITTER)
+
+    def flush(self) -> None:
+        """
+        Emits all buffered frames.
+        :return:
+        """
+        with self.__lock:
+            buffers: Dict[str, List[Dict[str, Any]]] = self.__buffers
+            self.__buffers = {}
+        for test_name, frames in buffers.items():
+            self.__flush_test(test_name, frames)
+
+    def __flush_thread(self) -> None:
+        while True:
+            time.sleep(self.__interval)
+            self.flush()
+
+    def publish(
+            self,
+            test_name: str,
+            mac_address: str,
+            substance_id: str,
+            timestamp: datetime,
+            data: List[str],
+            temperature: str,
+            humidity: str
+    ) -> None:
+        """
+        Publishes a collected frame to the socketio clients.
+        :param test_name: the test name.
+        :param mac_address: the device's MAC address.
+        :param substance_id: the substance being tested.
+        :param timestamp: the time the frame was collected.
+        :param data: the 64 sensor values.
+        :param temperature: the measured temperature.
+        :param humidity: the measured humidity.
+        :return:
+        """
+        frame: Dict[str, Any] = {
+            'mac_address': mac_address,
+            'substance': substance_id,
+            'timestamp': timestamp,
+            'data': data,
+            'temperature': temperature,
+            'humidity': humidity
+        }
+        if self.__interval <= 0:
+            self.__emit(self.LEGACY_EVENT, self.__to_legacy_payload(test_name, frame), test_name)
+            return
+        with self.__lock:
+            self.__buffers.setdefault(test_name, []).append(frame)
+
+    def close_test(self, test_name: str) -> None:
+        """
+        Emits the remaining buffered frames of a stopped test.
+        :param test_name: the test name.
+        :return:
+        """
+        with self.__lock:
+            frames: List[Dict[str, Any]] = self.__buffers.pop(test_name, [])
+        self.__flush_test(test_name, frames)
+
+    def __init__(
+            self,
+            socketio: SocketIO,
+            interval: Optional[float] = None,
+            rooms: Optional[bool] = None,
+            binary: Optional[bool] = None
+    ):
+        """
+        Constructor.
+        :param socketio: the flask socketio context.
+        :param interval: (Optional) emit interval in seconds, default: config.EMIT_INTERVAL.
+        :param rooms: (Optional) whether to emit to per-test rooms only, default: config.EMIT_ROOMS.
+        :param binary: (Optional) whether to send packed float32 frames, default: config.EMIT_BINARY.
+        """
+        self.__socketio: SocketIO = socketio
+        self.__interval: float = config.EMIT_INTERVAL if interval is None else interval
+        self.__rooms: bool = config.EMIT_ROOMS if rooms is None else rooms
+        self.__binary: bool = config.EMIT_BINARY if binary is None else binary
+        self.__buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        if self.__interval > 0:
+            threading.Thread(target=self.__flush_thread, daemon=True).start()
+        logger.info(f'Data emitter started (interval: {self.__interval}s, rooms: {self.__rooms}, '
+                    f'binary: {self.__binary}).', module=Module.EMITTER)
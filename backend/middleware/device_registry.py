@@ -0,0 +1,182 @@
+import threading
+from typing import Dict, List, Optional, Any
+
+from database.repositories.device_repository import DeviceRepository
+from exception.Exceptions import DeviceNotFoundException
+from log_handler.log_handler import Module, log as logger
+from serial_com.serial_com_handler import SerialComHandler
+
+
+class DeviceRegistry:
+    """
+    In-memory registry of the known devices, the connected serial handlers and the running tests.
+
+    Keeps a copy of the Device table rows (updated through the registry on every device mutation) and
+    nickname, port and MAC address indexes, so the device endpoints polled by the UI don't query the database.
+    """
+
+    # Device row layout: ID, DEVICE_NAME, MAC_ADDRESS, SOFTWARE_VERSION, FAN_STATE, SOCKET, CONNECTED
+    __MAC_COLUMN: int = 2
+    __CONNECTED_COLUMN: int = 6
+
+    def __refresh_row(self, mac_address: str) -> None:
+        """
+        Re-reads a single device row after it was written.
+        """
+        try:
+            self.__rows[mac_address] = self.__device_repository.get_device_by_mac_address(mac_address)
+        except DeviceNotFoundException:
+            self.__rows.pop(mac_address, None)
+
+    def register_device(
+            self,
+            device_nickname: str,
+            device: SerialComHandler,
+            mac_address: str,
+            software_version: str,
+            port: str
+    ) -> None:
+        """
+        Persists a connected device and adds it to the indexes.
+        :param device_nickname: the device's nickname.
+        :param device: the serial handler of the device.
+        :param mac_address: the device's MAC address.
+        :param software_version: the device's software version.
+        :param port: the port the device is connected to.
+        :raise InvalidDataException: if the device can't be persisted.
+        """
+        with self.__lock:
+            self.__device_repository.persist_device(
+                device_name=device_nickname,
+                software_version=software_version,
+                mac_address=mac_address,
+                socket=port
+            )
+            self.__refresh_row(mac_address)
+            self.__devices[device_nickname] = device
+            self.__nickname_by_port[port] = device_nickname
+            self.__nickname_by_mac[mac_address] = device_nickname
+        logger.debug(f'Registered device \"{device_nickname}\" ({mac_address}) on port \"{port}\".',
+                     module=Module.MIDDLE)
+
+    def de_register_device(self, device_nickname: str, mac_address: str) -> None:
+        """
+        Marks a device as disconnected and removes it from the indexes.
+        :param device_nickname: the device's nickname.
+        :param mac_address: the device's MAC address.
+        :raise DeviceNotFoundException: if the device state can't be updated.
+        """
+        with self.__lock:
+            self.__device_repository.update_device_state_by_mac_address(mac_address, False, '')
+            self.__refresh_row(mac_address)
+            self.__devices.pop(device_nickname, None)
+            self.__nickname_by_mac.pop(mac_address, None)
+            for port in [p for p, nickname in self.__nickname_by_port.items() if nickname == device_nickname]:
+                del self.__nickname_by_port[port]
+
+    def update_device_port(self, device_nickname: str, mac_address: str, port: str) -> None:
+        """
+        Records that a connected device re-appeared on another port (e.g. after a reconnect).
+        :param device_nickname: the device's nickname.
+        :param mac_address: the device's MAC address.
+        :param port: the new port.
+        :raise DeviceNotFoundException: if the device state can't be updated.
+        """
+        with self.__lock:
+            self.__device_repository.update_device_state_by_mac_address(mac_address, True, port)
+            self.__refresh_row(mac_address)
+            for old_port in [p for p, nickname in self.__nickname_by_port.items() if nickname == device_nickname]:
+                del self.__nickname_by_port[old_port]
+            self.__nickname_by_port[port] = device_nickname
+
+    def get_device(self, device_nickname: str) -> Optional[SerialComHandler]:
+        return self.__devices.get(device_nickname)
+
+    def is_connected(self, device_nickname: str) -> bool:
+        return device_nickname in self.__devices
+
+    def get_nickname_by_port(self, port: str) -> Optional[str]:
+        return self.__nickname_by_port.get(port)
+
+    def get_nickname_by_mac(self, mac_address: str) -> Optional[str]:
+        return self.__nickname_by_mac.get(mac_address)
+
+    def add_test(self, test_name: str, test_data: Dict[str, Any]) -> None:
+        """
+        Adds a running test.
+        :param test_name: the test name.
+        :param test_data: the test's device_nickname, start_time and test_obj.
+        """
+        with self.__lock:
+            self.__tests[test_name] = test_data
+            self.__test_by_nickname[test_data['device_nickname']] = test_name
+
+    def remove_test(self, test_name: str) -> None:
+        with self.__lock:
+            test_data: Optional[Dict[str, Any]] = self.__tests.pop(test_name, None)
+            if test_data is not None:
+                self.__test_by_nickname.pop(test_data['device_nickname'], None)
+
+    def get_test(self, test_name: str) -> Optional[Dict[str, Any]]:
+        return self.__tests.get(test_name)
+
+    def get_tests(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get a snapshot of the running tests.
+        :return: a dict of test names to test data.
+        """
+        with self.__lock:
+            return dict(self.__tests)
+
+    def is_busy(self, device_nickname: str) -> bool:
+        """
+        Checks whether the device with the given nickname is running a test.
+        """
+        return device_nickname in self.__test_by_nickname
+
+    def __get_rows(self, connected: Optional[bool] = None) -> List[List]:
+        with self.__lock:
+            rows: List[List] = sorted(self.__rows.values(), key=lambda row: row[0])
+        if connected is None:
+            return rows
+        return [row for row in rows if bool(row[self.__CONNECTED_COLUMN]) == connected]
+
+    def get_all_devices(self) -> List[List]:
+        """
+        Get all known devices (Device table rows).
+        """
+        return self.__get_rows()
+
+    def get_connected_devices(self) -> List[List]:
+        """
+        Get all connected devices (Device table rows).
+        """
+        return self.__get_rows(connected=True)
+
+    def get_disconnected_devices(self) -> List[List]:
+        """
+        Get all disconnected devices (Device table rows).
+        """
+        return self.__get_rows(connected=False)
+
+    def get_free_devices(self) -> List[List]:
+        """
+        Get the connected devices not running a test (Device table rows).
+        """
+        return [row for row in self.__get_rows(connected=True) if not self.is_busy(row[1])]
+
+    def __init__(self, device_repository: DeviceRepository):
+        """
+        Constructor.
+        :param device_repository: the device repository, the registry loads and writes through.
+        """
+        self.__device_repository: DeviceRepository = device_repository
+        self.__lock: threading.RLock = threading.RLock()
+        self.__rows: Dict[str, List] = {
+            row[self.__MAC_COLUMN]: row for row in device_repository.get_all_devices()
+        }
+        self.__devices: Dict[str, SerialComHandler] = {}
+        self.__nickname_by_port: Dict[str, str] = {}
+        self.__nickname_by_mac: Dict[str, str] = {}
+        self.__tests: Dict[str, Dict[str, Any]] = {}
+        self.__test_by_nickname: Dict[str, str] = {}
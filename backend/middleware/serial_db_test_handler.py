@@ -1,14 +1,33 @@
 import threading
+import time
 from datetime import datetime
-from typing import List, Tuple, Optional
-from flask_socketio import SocketIO
+from typing import List, Tuple, Optional, Callable
 
+import config
 from database.db_handler import DatabaseHandler
+from exception.Exceptions import DeviceNotFoundException
 from log_handler.log_handler import Module, log as logger
+from metrics.metrics import metrics, Counter, Histogram
+from metrics.tracing import tracer, Trace
+from middleware.data_emitter import DataEmitter
 from serial_com.serial_com_handler import SerialComHandler
 from ml_helper import ml_helper
 
 
+FRAMES_READ: Counter = metrics.counter(
+    'smellinspector_serial_frames_total', 'Serial frames read per device.', ['device']
+)
+FRAME_PARSE_FAILURES: Counter = metrics.counter(
+    'smellinspector_serial_frame_parse_failures_total', 'Serial lines that are not valid data frames.', ['device']
+)
+RECONNECTS: Counter = metrics.counter(
+    'smellinspector_serial_reconnects_total', 'Reconnects after a lost serial connection.', ['device', 'result']
+)
+PERSIST_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_persist_data_seconds', 'Latency of persisting a frame (data and rollups).'
+)
+
+
 class TestHandler:
     """
     Handles an ongoing test for a given SmellInspector device.
@@ -27,23 +46,94 @@ class TestHandler:
         _, data, temperature, humidity = data[0], data[1:65], data[-2], data[-1]
         return data, temperature, humidity
 
+    def __record_gap(self, gap_start: datetime, reason: str) -> None:
+        try:
+            self.__database.DataRepository.persist_gap(
+                self.__test_name,
+                self.__mac_address,
+                gap_start,
+                datetime.now(),
+                reason
+            )
+        except Exception as e:
+            logger.error('Error recording data gap. Trace:', e, module=Module.TEST)
+
+    def __reconnect(self) -> bool:
+        """
+        Searches for the device until it is found again, the test is stopped or RECONNECT_TIMEOUT is reached.
+        The period without data is recorded as a data gap.
+        :return: True if the device was reconnected, False otherwise.
+        """
+        gap_start: datetime = datetime.now()
+        give_up_at: Optional[float] = None
+        if config.RECONNECT_TIMEOUT > 0:
+            give_up_at = time.monotonic() + config.RECONNECT_TIMEOUT
+        logger.warning(f'Test \"{self.__test_name}\" lost the connection to device \"{self.__mac_address}\". '
+                       'Reconnecting...', module=Module.TEST)
+        while self.__running:
+            try:
+                port: str = self.__serial_com.reconnect(mac_address=self.__mac_address, deadline=give_up_at)
+                self.__serial_com.flush()
+                self.__record_gap(gap_start, 'reconnected')
+                RECONNECTS.inc(self.__mac_address, 'success')
+                if self.__on_reconnect is not None:
+                    self.__on_reconnect(port)
+                logger.info(f'Test \"{self.__test_name}\" resumed on port \"{port}\".', module=Module.TEST)
+                return True
+            except DeviceNotFoundException:
+                pass
+            except Exception as e:
+                logger.error('Error reconnecting device. Trace:', e, module=Module.TEST)
+            if give_up_at is not None and time.monotonic() > give_up_at:
+                logger.error(f'Device \"{self.__mac_address}\" was not found within {config.RECONNECT_TIMEOUT}s.',
+                             module=Module.TEST)
+                break
+            time.sleep(config.RECONNECT_INTERVAL)
+        self.__record_gap(gap_start, 'stopped' if not self.__running else 'reconnect timeout')
+        RECONNECTS.inc(self.__mac_address, 'failure')
+        return False
+
     def __serial_to_db_thread(self):
         """
         Reads serial data and writes it to the database.
-        Also emits a socketio event for the frontend.
+        Also publishes the data to the frontend through the data emitter.
+        If the connection is lost, the device is searched for again (see __reconnect) and the test resumes.
         """
         errors: int = 0
         self.__serial_com.flush()
         while self.__running:
             try:
                 data = self.__serial_com.read()
-                data = self.__split_data(data)
+                if data is None and self.__running and not self.__serial_com.is_connected():
+                    if not config.RECONNECT_ENABLED or not self.__reconnect():
+                        logger.error(f'Serial connection lost. Terminating test \"{self.__test_name}\"...',
+                                     module=Module.TEST)
+                        self.__running = False
+                    continue
+                trace: Trace = tracer.start(self.__mac_address, ingest=self.__serial_com.get_last_read_time())
+                with trace.span('parse'):
+                    data = self.__split_data(data)
                 if data is None:
+                    FRAME_PARSE_FAILURES.inc(self.__mac_address)
                     continue
+                FRAMES_READ.inc(self.__mac_address)
                 data, temperature, humidity = data
                 now = datetime.now()
                 if self.__data_acquisition_enabled:
-                    self.__database.DataRepository.persist_data(
+                    with PERSIST_SECONDS.time(), trace.span('persist'):
+                        self.__database.DataRepository.persist_data(
+                            self.__test_name,
+                            self.__mac_address,
+                            self.__substance_id,
+                            now,
+                            data,
+                            temperature,
+                            humidity
+                        )
+                    with trace.span('ml_enqueue'):
+                        ml_helper.send_new_data(data=data, substance_id=self.__substance_id, trace=trace)
+                with trace.span('emit'):
+                    self.__data_emitter.publish(
                         self.__test_name,
                         self.__mac_address,
                         self.__substance_id,
@@ -52,18 +142,8 @@ class TestHandler:
                         temperature,
                         humidity
                     )
-                    ml_helper.send_new_data(data=data, substance_id=self.__substance_id)
-                json_data = {
-                    'test name': self.__test_name,
-                    'mac address': self.__mac_address,
-                    'substance': self.__substance_id,
-                    'start time': now.strftime('%Y-%m-%d %H:%M:%S'),
-                    'data': ';'.join(data),
-                    'temperature': temperature,
-                    'humidity': humidity
-                }
-                self.__socketio.emit('data_collected', json_data)
-                logger.debug('Cached data:', json_data, module=Module.TEST)
+                tracer.finish(trace)
+                errors = 0
             except Exception as e:
                 logger.error('Error during data collection. Trace:', e, module=Module.TEST)
                 errors += 1
@@ -71,7 +151,6 @@ class TestHandler:
                     logger.error('Error during 3 executions. Terminating...', module=Module.TEST)
                     self.__running = False
 
-
     def update_substance_id(self, substance_id: str) -> None:
         """
         Updates the substance currently being tested.
@@ -115,6 +194,7 @@ class TestHandler:
             return
         self.__running = False
         self.__test_thread.join()
+        self.__data_emitter.close_test(self.__test_name)
         logger.info(f'Stopped test \"{self.__test_name}\"', module=Module.TEST)
 
     def start_test(self):
@@ -139,7 +219,8 @@ class TestHandler:
             test_name: str,
             mac_address: str,
             data_acquisition_enabled: bool,
-            socketio: SocketIO
+            data_emitter: DataEmitter,
+            on_reconnect: Optional[Callable[[str], None]] = None
     ):
         """
         Constructor.
@@ -148,7 +229,8 @@ class TestHandler:
         :param test_name: the name of the test.
         :param mac_address: the MAC address of the device.
         :param data_acquisition_enabled: whether the test data should be saved to the database.
-        :param socketio: the flask socketio context.
+        :param data_emitter: emits the collected data to the frontend.
+        :param on_reconnect: (Optional) called with the new port after the device was reconnected.
         """
         self.__data_acquisition_enabled = data_acquisition_enabled
         self.__running = False
@@ -160,4 +242,5 @@ class TestHandler:
         self.__mac_address: str = mac_address
         self.__substance_start_time: Optional[datetime] = None
         self.__test_start_time: Optional[datetime] = None
-        self.__socketio: SocketIO = socketio
+        self.__data_emitter: DataEmitter = data_emitter
+        self.__on_reconnect: Optional[Callable[[str], None]] = on_reconnect
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
-import base64
 import os.path
+import sqlite3
 import threading
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import requests
 
 import config
 from database.db_handler import DatabaseHandler
+from exception.Exceptions import SnapshotException, ArchiveNotAvailableException, InvalidDataException
 from log_handler.log_handler import log as logger, Module
+from metrics.metrics import metrics, Counter, Gauge, Histogram
+from metrics.tracing import Trace, TRACE_HEADER
+
+PENDING_REQUESTS: Gauge = metrics.gauge(
+    'smellinspector_ml_helper_pending_requests', 'Requests to the ML backend waiting to be delivered.'
+)
+RETRIES: Counter = metrics.counter(
+    'smellinspector_ml_helper_retries_total', 'Failed requests to the ML backend that are retried.', ['endpoint']
+)
+REQUEST_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_ml_helper_request_seconds', 'Time until a request was accepted by the ML backend.', ['endpoint']
+)
 
 
 class MLHelper:
@@ -17,14 +30,54 @@ class MLHelper:
     Sends data to the ML backend on start and gathering new data.
     """
 
-    def _send_request_until_received(self, payload: Dict, url: str) -> None:
+    def _send_request_until_received(
+            self,
+            payload: Optional[Dict],
+            url: str,
+            trace: Optional[Trace] = None,
+            file_path: Optional[str] = None
+    ) -> None:
+        endpoint: str = url[len(config.ML_BACKEND_URL):]
+        start: float = time.monotonic()
+        PENDING_REQUESTS.inc()
+        with self._delivered:
+            self._pending += 1
+        try:
+            with REQUEST_SECONDS.time(endpoint):
+                headers: Optional[Dict[str, str]] = None if trace is None else {TRACE_HEADER: trace.trace_id}
+                self.__send_request_until_received(payload, url, endpoint, headers, file_path)
+        finally:
+            PENDING_REQUESTS.dec()
+            with self._delivered:
+                self._pending -= 1
+                self._delivered.notify_all()
+            if trace is not None:
+                trace.add_span('ml_post', start, time.monotonic())
+
+    def __send_request_until_received(
+            self,
+            payload: Dict,
+            url: str,
+            endpoint: str,
+            headers: Optional[Dict[str, str]] = None,
+            file_path: Optional[str] = None
+    ) -> None:
         while True:
             try:
-                r = requests.post(url, json=payload)
+                if file_path is None:
+                    r = requests.post(url, json=payload, headers=headers)
+                else:
+                    # Streamed from disk, the file is never held in memory
+                    with open(file_path, 'rb') as f:
+                        r = requests.post(
+                            url, data=f, headers={**(headers or {}), 'Content-Type': 'application/octet-stream'}
+                        )
                 if r.status_code < 300:
                     logger.debug('Received response from ML backend:', r.text, module=Module.ML_HELPER)
                     break
+                RETRIES.inc(endpoint)
             except Exception as e:
+                RETRIES.inc(endpoint)
                 logger.error('Error sending request to ML backend. Trace:', e, module=Module.ML_HELPER)
                 time.sleep(1)
                 if not self._locked:
@@ -33,16 +86,32 @@ class MLHelper:
                         self._send_initial_data()
 
     def _send_test_data(self, url: str) -> None:
+        """
+        Sends a consistent snapshot of the database (not the live file, which the tests are writing to).
+        The samples of tests pruned to the Parquet archive are written back into the snapshot.
+        """
         try:
-            with open(config.DB_PATH, 'rb') as f:
-                data = f.read()
-            payload = {
-                'data': base64.b64encode(data).decode('utf-8')
-            }
-            self._send_request_until_received(payload, url=url)
-        except Exception as e:
-            logger.error('Error reading db file. Sending no data message. Trace:', e, module=Module.ML_HELPER)
+            snapshot: str = self._database.SnapshotService.create_snapshot()
+        except SnapshotException:
+            logger.error('Error creating db snapshot. Sending no data message.', module=Module.ML_HELPER)
             return self._send_no_data_found(url=url)
+        try:
+            self.__restore_archived_tests(snapshot)
+            self._send_request_until_received(None, url=url, file_path=snapshot)
+        finally:
+            os.remove(snapshot)
+
+    def __restore_archived_tests(self, snapshot: str) -> None:
+        conn: sqlite3.Connection = sqlite3.connect(snapshot)
+        try:
+            restored: int = self._database.ArchiveRepository.restore_pruned_rows(conn)
+            if restored:
+                logger.info(f'Added {restored} archived samples to the snapshot.', module=Module.ML_HELPER)
+        except (ArchiveNotAvailableException, InvalidDataException, sqlite3.Error) as e:
+            logger.error('Archived tests can\'t be added to the snapshot (is pyarrow installed?), the ML backend '
+                         'is trained without them. Trace:', e, module=Module.ML_HELPER)
+        finally:
+            conn.close()
 
     def _send_no_data_found(self, url: str) -> None:
         payload = {
@@ -68,11 +137,12 @@ class MLHelper:
             self._locked = False
             self._error_count = 0
 
-    def send_new_data(self, data: List[str], substance_id: str) -> None:
+    def send_new_data(self, data: List[str], substance_id: str, trace: Optional[Trace] = None) -> None:
         """
         Sends new data to the ML backend.
         :param data: The new data (64 string values)
         :param substance_id: The substance ID (str)
+        :param trace: (Optional) the frame's trace, its ID is sent to the ML backend and the delivery is recorded.
         :return:
         """
         try:
@@ -83,18 +153,43 @@ class MLHelper:
                 'substance': substance,
                 'quantity': quantity
             }
-            threading.Thread(target=self._send_request_until_received, args=(payload, url), daemon=True).start()
+            threading.Thread(
+                target=self._send_request_until_received,
+                args=(payload, url, trace),
+                daemon=True
+            ).start()
         except Exception as e:
             logger.error('Error sending new data. Trace:', e, module=Module.ML_HELPER)
 
+    def flush(self, timeout: float) -> bool:
+        """
+        Waits until the pending requests were accepted by the ML backend.
+        :param timeout: maximum time to wait in seconds.
+        :return: True if no requests are pending, False on timeout.
+        """
+        with self._delivered:
+            return self._delivered.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def set_database(self, database: DatabaseHandler) -> None:
+        """
+        Uses the database handler of the middleware, whose substance cache is invalidated on every change.
+        :param database: the DatabaseHandler of the middleware.
+        """
+        self._database = database
+
     def init(self):
+        if self._database is None:
+            logger.error('No database set, call set_database before init.', module=Module.ML_HELPER)
+            return
         logger.info('Initializing ML Helper...', module=Module.ML_HELPER)
         threading.Thread(target=self._send_initial_data, daemon=True).start()
 
     def __init__(self):
-        self._database: DatabaseHandler = DatabaseHandler()
+        self._database: Optional[DatabaseHandler] = None
         self._error_count = 0
         self._locked = False
+        self._pending: int = 0
+        self._delivered: threading.Condition = threading.Condition()
 
 
 ml_helper: MLHelper = MLHelper()
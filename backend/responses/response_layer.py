@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+HTTP response layer shared by the backend and the ML service (identical copies, see
+backend/test/shared_modules_test.py).
+
+- dumps() and the Flask JSON provider (jsonify) use orjson when it is installed, the standard library otherwise.
+- Responses above a size threshold are compressed with brotli (when installed and accepted) or gzip.
+- GET responses carry an ETag, clients sending it back in If-None-Match get an empty 304 response.
+"""
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from flask import Flask, Response, request
+from flask.json.provider import DefaultJSONProvider
+
+import config
+
+try:
+    import orjson
+
+    _ORJSON_OPTIONS: int = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES: tuple = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialises an object to JSON, with orjson when installed.
+    :param obj: the object to serialise.
+    :return: the JSON string.
+    :raise TypeError: if the object is not serialisable.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode('utf-8')
+        except TypeError:
+            pass  # e.g. datetimes, left to the standard library for the same output
+    return json.dumps(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson when installed. Indented output (debug mode) and types orjson
+    doesn't handle natively fall back to Flask's default provider.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or 'indent' in kwargs:
+            return super().dumps(obj, **kwargs)
+        option: int = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if kwargs.get('sort_keys', self.sort_keys) else 0)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+
+class ResponseLayer:
+    """
+    Adds ETags to GET responses and compresses large responses (registered as an after_request hook).
+
+    The ETag is computed from the uncompressed body and suffixed with the content encoding, so every
+    representation has its own tag while the 304 check happens before anything is compressed.
+    """
+
+    def __get_encoding(self, response: Response, size: int) -> Optional[str]:
+        """
+        Chooses the content encoding for a response.
+        :return: 'br', 'gzip' or None if the response is sent as is.
+        """
+        if not self.__compression or size < self.__min_size or 'Content-Encoding' in response.headers:
+            return None
+        if not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+            return None
+        response.vary.add('Accept-Encoding')
+        if brotli is not None and request.accept_encodings['br']:
+            return 'br'
+        if request.accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def process(self, response: Response) -> Response:
+        """
+        Checks If-None-Match and compresses the response.
+        :param response: the response of the view.
+        :return: the processed response.
+        """
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        data: bytes = response.get_data()
+        encoding: Optional[str] = self.__get_encoding(response, len(data))
+        if (self.__etags and request.method in ('GET', 'HEAD') and response.status_code == 200
+                and 'ETag' not in response.headers):
+            digest: str = hashlib.blake2b(data, digest_size=16).hexdigest()
+            response.set_etag(digest if encoding is None else f'{digest}-{encoding}')
+            if 'Cache-Control' not in response.headers:
+                response.headers['Cache-Control'] = 'no-cache'
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=self.__level))
+        elif encoding == 'gzip':
+            response.set_data(gzip.compress(data, compresslevel=self.__level, mtime=0))
+        else:
+            return response
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Installs the JSON provider and the after_request hook.
+        :param app: the Flask app.
+        """
+        app.json = FastJSONProvider(app)
+        app.after_request(self.process)
+
+    def __init__(self, compression: bool = True, min_size: int = 1024, level: int = 6, etags: bool = True):
+        """
+        Constructor.
+        :param compression: whether responses are compressed.
+        :param min_size: minimum body size in bytes for compression.
+        :param level: gzip compression level (1-9), also used as brotli quality.
+        :param etags: whether GET responses carry ETags.
+        """
+        self.__compression: bool = compression
+        self.__min_size: int = max(0, min_size)
+        self.__level: int = min(max(1, level), 9)
+        self.__etags: bool = etags
+
+
+response_layer: ResponseLayer = ResponseLayer(
+    compression=config.RESPONSE_COMPRESSION,
+    min_size=config.RESPONSE_COMPRESSION_MIN_SIZE,
+    level=config.RESPONSE_COMPRESSION_LEVEL,
+    etags=config.RESPONSE_ETAGS
+)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional, Callable
+
+import config
+from exception.Exceptions import DriverNotInstalledException
+from log_handler.log_handler import Module, log as logger
+
+if sys.platform.startswith("win"):
+    from serial_com.win32_serial import win32api as serial_com
+else:
+    from serial_com.posix_serial import posix_serial_api as serial_com
+
+
+class PortDiscovery:
+    """
+    (Singleton) Caches the CP210x candidate ports.
+
+    The candidate list is refreshed when it is older than PORT_DISCOVERY_TTL. On Linux, /dev is watched
+    with inotify, so the list is only re-enumerated when device nodes appear or disappear. Otherwise a
+    polling thread (PORT_DISCOVERY_POLL_INTERVAL) detects changes. Changes of the free ports are pushed to
+    the registered listener (the "ports_changed" socketio event).
+    """
+
+    # inotify event masks, see inotify(7)
+    __IN_CREATE: int = 0x100
+    __IN_DELETE: int = 0x200
+    __IN_MOVED_FROM: int = 0x40
+    __IN_MOVED_TO: int = 0x80
+    __EVENT_HEADER: struct.Struct = struct.Struct('iIII')
+    __SERIAL_PREFIXES: tuple = ('tty', 'cu.', 'serial', 'rfcomm')
+    # udev needs a moment to populate the device attributes after the node is created
+    __SETTLE_SECONDS: float = 0.5
+
+    def __refresh(self) -> List[str]:
+        candidates: List[str] = serial_com.list_candidate_ports()
+        with self.__lock:
+            changed: bool = candidates != self.__candidates
+            self.__candidates = candidates
+            self.__refreshed_at = time.monotonic()
+        if changed:
+            logger.info('Serial port candidates changed:', candidates, module=Module.DISCOVERY)
+        return candidates
+
+    def __get_candidates(self) -> List[str]:
+        with self.__lock:
+            candidates: Optional[List[str]] = self.__candidates
+            expired: bool = not self.__watching and time.monotonic() - self.__refreshed_at > self.__ttl
+        if candidates is None or expired:
+            return self.__refresh()
+        return candidates
+
+    def get_ports(self) -> List[str]:
+        """
+        Get the unused SmellInspector ports.
+        :return: the free ports.
+        :raise DriverNotInstalledException: if no free ports are found.
+        """
+        ports: List[str] = [port for port in self.__get_candidates() if not serial_com.check_port_is_used(port)]
+        if not len(ports):
+            raise DriverNotInstalledException()
+        return ports
+
+    def notify(self) -> None:
+        """
+        Pushes the free ports to the listener if they changed since the last push,
+        e.g. after a port was allocated or released.
+        """
+        if self.__listener is None:
+            return
+        try:
+            ports: List[str] = self.get_ports()
+        except DriverNotInstalledException:
+            ports = []
+        with self.__lock:
+            if ports == self.__last_pushed:
+                return
+            self.__last_pushed = ports
+        try:
+            self.__listener(ports)
+        except Exception as e:
+            logger.error('Error pushing port changes. Trace:', e, module=Module.DISCOVERY)
+
+    def invalidate(self) -> None:
+        """
+        Re-enumerates the candidates immediately, e.g. after virtual (simulated) ports were added or removed.
+        """
+        self.__refresh()
+        self.notify()
+
+    def __open_inotify(self) -> Optional[int]:
+        """
+        Watches /dev for created and removed device nodes.
+        :return: the inotify file descriptor, or None if inotify is not available.
+        """
+        if not sys.platform.startswith('linux') or not os.path.isdir('/dev'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd: int = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            mask: int = self.__IN_CREATE | self.__IN_DELETE | self.__IN_MOVED_FROM | self.__IN_MOVED_TO
+            if libc.inotify_add_watch(fd, b'/dev', mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+            return fd
+        except Exception as e:
+            logger.warning('inotify is not available, falling back to polling. Trace:', e, module=Module.DISCOVERY)
+            return None
+
+    def __is_serial_event(self, buffer: bytes) -> bool:
+        offset: int = 0
+        while offset + self.__EVENT_HEADER.size <= len(buffer):
+            _, _, _, length = self.__EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.__EVENT_HEADER.size
+            name: str = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if name.startswith(self.__SERIAL_PREFIXES):
+                return True
+        return False
+
+    def __watch_thread(self, fd: int) -> None:
+        while True:
+            try:
+                # Wait with select, so the read doesn't block the event loop of cooperative servers (gevent)
+                select.select([fd], [], [])
+                buffer: bytes = os.read(fd, 4096)
+                if not self.__is_serial_event(buffer):
+                    continue
+                time.sleep(self.__SETTLE_SECONDS)
+                self.__refresh()
+                self.notify()
+            except Exception as e:
+                logger.error('Error watching /dev, falling back to polling. Trace:', e, module=Module.DISCOVERY)
+                with self.__lock:
+                    self.__watching = False
+                self.__poll_thread()
+                return
+
+    def __poll_thread(self) -> None:
+        if self.__poll_interval <= 0:
+            return
+        while True:
+            time.sleep(self.__poll_interval)
+            try:
+                self.__refresh()
+                self.notify()
+            except Exception as e:
+                logger.error('Error polling serial ports. Trace:', e, module=Module.DISCOVERY)
+
+    def start(self, listener: Callable[[List[str]], None]) -> None:
+        """
+        Starts watching for port changes.
+        :param listener: called with the free ports whenever they change.
+        """
+        if self.__started:
+            return
+        self.__started = True
+        self.__listener = listener
+        fd: Optional[int] = self.__open_inotify() if config.PORT_DISCOVERY_WATCH else None
+        if fd is not None:
+            with self.__lock:
+                self.__watching = True
+            threading.Thread(target=self.__watch_thread, args=(fd,), daemon=True).start()
+            logger.info('Watching /dev for serial port changes.', module=Module.DISCOVERY)
+        else:
+            threading.Thread(target=self.__poll_thread, daemon=True).start()
+        self.__refresh()
+
+    def __init__(self, ttl: float, poll_interval: float):
+        """
+        Constructor.
+        :param ttl: the maximum age of the cached candidates in seconds, if /dev is not watched.
+        :param poll_interval: the interval in seconds of the polling thread used instead of inotify, 0 disables it.
+        """
+        self.__ttl: float = ttl
+        self.__poll_interval: float = poll_interval
+        self.__candidates: Optional[List[str]] = None
+        self.__refreshed_at: float = 0
+        self.__watching: bool = False
+        self.__started: bool = False
+        self.__listener: Optional[Callable[[List[str]], None]] = None
+        self.__last_pushed: Optional[List[str]] = None
+        self.__lock: threading.Lock = threading.Lock()
+
+
+port_discovery: PortDiscovery = PortDiscovery(
+    ttl=config.PORT_DISCOVERY_TTL,
+    poll_interval=config.PORT_DISCOVERY_POLL_INTERVAL
+)
@@ -19,16 +19,13 @@ class PosixSerialAPI:
     # Silicon Labs USB Vendor ID
     SILABS_VID = 0x10C4
 
-    def find_com_ports_by_driver(self, driver_name: str = "CP210x") -> List[str]:
+    def list_candidate_ports(self, driver_name: str = "CP210x") -> List[str]:
         """
-        Get serial ports backed by the CP210x driver on macOS/Linux.
+        Enumerate all serial ports backed by the CP210x driver on macOS/Linux, including the ones in use.
 
         :param driver_name: (Optional) Name hint for the driver (default: "CP210x").
         :return: list of device paths (e.g., '/dev/cu.SLAB_USBtoUART', '/dev/ttyUSB0', ...)
-        :raise DriverNotInstalledException: if no matching ports are found.
         """
-        logger.info(f'Querying POSIX serial ports for driver "{driver_name}"...', module=Module.POSIX)
-
         matches: List[str] = []
         try:
             for p in list_ports.comports():
@@ -48,18 +45,26 @@ class PosixSerialAPI:
                 )
 
                 if is_silabs_vid or looks_like_cp210x:
-                    dev = str(p.device)
-                    if dev in self.__used_ports:
-                        logger.info(f'Skipping port "{dev}" because it is already being used.', module=Module.POSIX)
-                        continue
-                    logger.info(
-                        f'Device found: "{dev}" (vid={p.vid}, pid={p.pid}, mfg="{p.manufacturer}", desc="{p.description}")',
-                        module=Module.POSIX)
-                    matches.append(dev)
-
-            logger.debug('Found ports:', matches, module=Module.POSIX)
+                    logger.debug(
+                        f'Device found: "{p.device}" (vid={p.vid}, pid={p.pid}, mfg="{p.manufacturer}", '
+                        f'desc="{p.description}")', module=Module.POSIX)
+                    matches.append(str(p.device))
         except Exception as e:
             logger.error('Unable to query POSIX serial ports. Trace:', e, module=Module.POSIX)
+        matches.extend(port for port in self.__virtual_ports if port not in matches)
+        return matches
+
+    def find_com_ports_by_driver(self, driver_name: str = "CP210x") -> List[str]:
+        """
+        Get the unused serial ports backed by the CP210x driver on macOS/Linux.
+
+        :param driver_name: (Optional) Name hint for the driver (default: "CP210x").
+        :return: list of device paths (e.g., '/dev/cu.SLAB_USBtoUART', '/dev/ttyUSB0', ...)
+        :raise DriverNotInstalledException: if no matching ports are found.
+        """
+        logger.info(f'Querying POSIX serial ports for driver "{driver_name}"...', module=Module.POSIX)
+        matches: List[str] = [port for port in self.list_candidate_ports(driver_name) if port not in self.__used_ports]
+        logger.debug('Found ports:', matches, module=Module.POSIX)
         if matches:
             return matches
         raise DriverNotInstalledException()
@@ -88,6 +93,22 @@ class PosixSerialAPI:
         self.__used_ports.remove(port)
         logger.info(f'Deallocated port "{port}".', module=Module.POSIX)
 
+    def register_virtual_port(self, port: str) -> None:
+        """
+        Adds a port that is discovered like a CP210x port (e.g. a pseudo-terminal of the device simulator).
+        :param port: the port.
+        """
+        if port not in self.__virtual_ports:
+            self.__virtual_ports.append(port)
+
+    def unregister_virtual_port(self, port: str) -> None:
+        """
+        Removes a virtual port from the discovered ports.
+        :param port: the port.
+        """
+        if port in self.__virtual_ports:
+            self.__virtual_ports.remove(port)
+
     def check_port_is_used(self, port: str) -> bool:
         """
         Checks if the given port is already being used.
@@ -98,6 +119,7 @@ class PosixSerialAPI:
 
     def __init__(self):
         self.__used_ports: List[str] = []
+        self.__virtual_ports: List[str] = []
 
 
 posix_serial_api: PosixSerialAPI = PosixSerialAPI()
@@ -1,11 +1,12 @@
 import sys
-from typing import Tuple, List
+import time
+from typing import Tuple, List, Optional
 
 import serial
 import serial.tools.list_ports
 
 from exception.Exceptions import DriverNotInstalledException, DeviceNotConnectedException, PortInUseException, \
-    PortNotUsedException, InfoFetchException
+    PortNotUsedException, InfoFetchException, DeviceNotFoundException
 from log_handler.log_handler import Module, log as logger
 if sys.platform.startswith("win"):
     from serial_com.win32_serial import win32api as serial_com
@@ -31,14 +32,16 @@ class SerialComHandler:
         return ports[0]
 
     @staticmethod
-    def __open_serial_connection(serial_port: str) -> serial.Serial:
+    def __open_serial_connection(serial_port: str, deadline: Optional[float] = None) -> serial.Serial:
         """
         Try to open a channel to the provided serial port.
         :param serial_port: the serial port to open.
+        :param deadline: (Optional) time.monotonic() value after which the handshake is aborted.
         :return: the open serial connection.
         :raise DeviceNotConnectedException: if the device is not connected.
         :raise PortInUseException: if the device is already connected.
         """
+        _port: Optional[serial.Serial] = None
         try:
             if serial_com.check_port_is_used(port=serial_port):
                 raise PortInUseException()
@@ -47,30 +50,47 @@ class SerialComHandler:
             )
             # Retry 3 times
             for i in range(3):
+                if deadline is not None:
+                    remaining: float = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    _port.timeout = min(2.0, remaining)
                 if len(_port.readline()):
+                    _port.timeout = 2
                     serial_com.allocate_port(port=serial_port)
                     return _port
                 logger.error(f'Port \"{serial_port}\" connection failed, retrying {i + 1}/3...', module=Module.SERIAL)
             raise DriverNotInstalledException()
         except Exception:
             logger.error(f'Unable to connect to serial port \"{serial_port}\".', module=Module.SERIAL)
+            if _port is not None and not serial_com.check_port_is_used(port=serial_port):
+                _port.close()
             raise DeviceNotConnectedException()
 
-    def __get_serial_port(self, serial_port=None) -> serial.Serial:
+    def __get_serial_port(
+            self,
+            serial_port=None,
+            deadline: Optional[float] = None,
+            fallback: bool = True
+    ) -> serial.Serial:
         """
         Get the serial port used for communicating with the SmellInspector.
         :param serial_port: (Optional) The serial port to open.
+        :param deadline: (Optional) time.monotonic() value after which the handshake is aborted.
+        :param fallback: (Optional) whether to use the first free port if the provided one fails, default: True.
         :return: The serial port object.
         :raise DriverNotInstalledException: if the com port is not found.
+        :raise DeviceNotConnectedException: if the provided port fails and fallback is disabled.
         """
         if serial_port is not None:
             logger.info(f'Serial port \"{serial_port}\" was provided. Testing connection...')
             try:
-                return self.__open_serial_connection(serial_port=serial_port)
+                return self.__open_serial_connection(serial_port=serial_port, deadline=deadline)
             except DeviceNotConnectedException:
-                pass
+                if not fallback:
+                    raise
         serial_port: str = self.__get_com_port()
-        return self.__open_serial_connection(serial_port=serial_port)
+        return self.__open_serial_connection(serial_port=serial_port, deadline=deadline)
 
     def write(self, command: str) -> Tuple[bool, str]:
         """
@@ -110,30 +130,50 @@ class SerialComHandler:
             logger.error('Attempted to flush serial com, but was apparently not connected.', module=Module.SERIAL)
             logger.error('Ignored error trace:', e, module=Module.SERIAL)
 
-    def read(self, lock_bypass: bool = False) -> str | None:
+    def read(self, lock_bypass: bool = False, deadline: Optional[float] = None) -> str | None:
         """
         Return next line of serial data.
         :param lock_bypass: bypasses thread lock for reading during command execution.
+        :param deadline: (Optional) time.monotonic() value after which None is returned.
         :return: the next line of serial data.
         """
         while self.__connected:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
             if self.__lock and not lock_bypass:
                 continue
             try:
                 data = self.__port.readline()
+                self.__last_read_at = time.monotonic()
                 data = data.decode('ascii').strip()
 
                 if not len(data):
                     continue
                 logger.debug(f'[{self.__port.port}] Read data: \"{data}\".', module=Module.SERIAL)
                 return data
+            except serial.SerialException as e:
+                logger.error('Serial connection lost. Trace:', e, module=Module.SERIAL)
+                self.__connected = False
             except Exception as e:
                 logger.error('Error reading data. Trace:', e, module=Module.SERIAL)
         return None
 
-    def get_device_info(self) -> List[str]:
+    def get_last_read_time(self) -> float:
+        """
+        Gets the time.monotonic() value at which the last line was received (the ingest time of a frame).
+        """
+        return self.__last_read_at
+
+    def is_connected(self) -> bool:
+        """
+        Checks whether the serial connection is open. False after shutdown or a lost connection.
+        """
+        return self.__connected
+
+    def get_device_info(self, deadline: Optional[float] = None) -> List[str]:
         """
         Execute the GET_INFO and return its output.
+        :param deadline: (Optional) time.monotonic() value after which the command is aborted.
         :return: The device info.
         :raise InfoFetchException: if the output is invalid.
         :raise DeviceNotConnectedException: if an error occurs during the read process.
@@ -144,7 +184,7 @@ class SerialComHandler:
         self.__port.write(bytes('GET_INFO\n', 'ascii'))
         try:
             for _ in range(5):
-                data: str = self.read(lock_bypass=True)
+                data: str = self.read(lock_bypass=True, deadline=deadline)
                 data: List[str] = data.split(';')
                 if len(data) > 10:
                     continue
@@ -154,6 +194,7 @@ class SerialComHandler:
             self.__lock = False
             raise InfoFetchException()
         except Exception as e:
+            self.__lock = False
             logger.error('Error fetching device data. Trace:', e, module=Module.SERIAL)
             raise DeviceNotConnectedException()
 
@@ -167,6 +208,61 @@ class SerialComHandler:
             return str(self.__port.port)
         raise PortNotUsedException()
 
+    def __release_port(self) -> None:
+        """
+        Closes the port and releases its allocation, ignoring errors of already lost connections.
+        """
+        self.__connected = False
+        name: str = self.get_port_name()
+        if serial_com.check_port_is_used(name):
+            serial_com.deallocate_port(name)
+        try:
+            self.__port.close()
+        except Exception as e:
+            logger.debug(f'Ignored error closing port \"{name}\". Trace:', e, module=Module.SERIAL)
+
+    def reconnect(self, mac_address: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """
+        Re-opens the connection to the same device after it was lost (e.g. USB glitch or re-enumeration).
+        The free ports are re-scanned and only a device reporting the expected MAC address is accepted.
+        :param mac_address: (Optional) the MAC address of the device, default: the one of the last handshake.
+        :param deadline: (Optional) time.monotonic() value after which the search is aborted.
+        :return: the port the device was found on.
+        :raise DeviceNotFoundException: if the device was not found on any free port or its MAC address is unknown.
+        """
+        metadata: List[str] = self.__device_metadata
+        if mac_address is None and len(metadata) > 1:
+            mac_address = metadata[1]
+        self.__release_port()
+        if not mac_address:
+            # any device on a free port would be accepted, e.g. one about to be registered for another test
+            logger.error('Can\'t reconnect a device without a known MAC address.', module=Module.SERIAL)
+            raise DeviceNotFoundException()
+        try:
+            candidates: List[str] = serial_com.find_com_ports_by_driver()
+        except DriverNotInstalledException:
+            raise DeviceNotFoundException()
+        for candidate in candidates:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            try:
+                self.__port = self.__open_serial_connection(serial_port=candidate, deadline=deadline)
+            except DeviceNotConnectedException:
+                continue
+            self.__connected = True
+            self.__device_metadata = []
+            try:
+                info: List[str] = self.get_device_info(deadline=deadline)
+                if len(info) > 1 and info[1] == mac_address:
+                    logger.info(f'Reconnected device \"{mac_address}\" on port \"{candidate}\".',
+                                module=Module.SERIAL)
+                    return candidate
+            except (DeviceNotConnectedException, InfoFetchException, serial.SerialException):
+                pass
+            self.__release_port()
+            self.__device_metadata = metadata
+        raise DeviceNotFoundException()
+
     def shutdown(self) -> None:
         """
         Shuts down the current connection (for instance on device disconnect).
@@ -176,23 +272,28 @@ class SerialComHandler:
         if self.__port is None:
             logger.error('Port was already closed.', module=Module.SERIAL)
             raise PortNotUsedException()
-        self.__connected: bool = False
         name: str = self.get_port_name()
-        serial_com.deallocate_port(name)
-        self.__port.close()
+        self.__release_port()
         logger.info(f'Closed serial port \"{name}\".', module=Module.SERIAL)
 
-    def __init__(self, serial_port: str = None):
+    def __init__(self, serial_port: str = None, deadline: Optional[float] = None, fallback: bool = True):
         """
         Constructor.
         :param serial_port: (Optional) the serial port to open for multi-device support.
+        :param deadline: (Optional) time.monotonic() value after which the connection handshake is aborted.
+        :param fallback: (Optional) whether to use the first free port if the provided one fails, default: True.
         """
         try:
             logger.info('Opening Serial Connection...', module=Module.SERIAL)
-            self.__port: serial.Serial = self.__get_serial_port(serial_port=serial_port)
+            self.__port: serial.Serial = self.__get_serial_port(
+                serial_port=serial_port,
+                deadline=deadline,
+                fallback=fallback
+            )
             self.__connected: bool = True
             self.__lock: bool = False
             self.__device_metadata: List[str] = []
+            self.__last_read_at: float = time.monotonic()
             logger.info('Serial connection established.', module=Module.SERIAL)
         except DriverNotInstalledException:
             logger.error('Driver not installed. Terminating...', module=Module.SERIAL)
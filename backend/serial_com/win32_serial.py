@@ -11,17 +11,15 @@ class Win32API:
     (Singleton) Handles win32 api functionality for querying com ports.
     """
 
-    def find_com_ports_by_driver(self, driver_name: str = "CP210x") -> List[str]:
+    def list_candidate_ports(self, driver_name: str = "CP210x") -> List[str]:
         """
-        Get com ports used for the SmellInspector(s) from win32 api.
+        Get all com ports used for SmellInspectors from win32 api, including the ones in use.
         :param driver_name: (Optional) Name of the driver used for the serial device, default: "CP210x".
-        :return: the COM ports currently available.
-        :raise DriverNotInstalledException: if no COM ports are found.
+        :return: the COM ports of the driver.
         """
         pythoncom.CoInitialize()
         com_ports = []
         try:
-            logger.info(f'Querying Win32 api for driver \"{driver_name}\"...', module=Module.WIN32)
             wmi = win32com.client.GetObject("winmgmts:")
             query = "SELECT * FROM Win32_SerialPort"
             serial_ports = wmi.ExecQuery(query)
@@ -29,16 +27,24 @@ class Win32API:
             for serial_port in serial_ports:
                 if driver_name.lower() in serial_port.Name.lower():
                     com = str(serial_port.DeviceID)
-                    if com in self.__used_ports:
-                        logger.info(f'Skipping port \"{com}\" because it is already being used.', module=Module.WIN32)
-                        continue
-                    logger.info(f'Device found: \"{com}\"', module=Module.WIN32)
+                    logger.debug(f'Device found: \"{com}\"', module=Module.WIN32)
                     com_ports.append(com)
-            logger.debug('Found ports:', com_ports, module=Module.WIN32)
         except Exception as e:
             logger.error('Unable to query win32 api. Trace:', e, module=Module.WIN32)
         finally:
             pythoncom.CoUninitialize()
+        return com_ports
+
+    def find_com_ports_by_driver(self, driver_name: str = "CP210x") -> List[str]:
+        """
+        Get unused com ports used for the SmellInspector(s) from win32 api.
+        :param driver_name: (Optional) Name of the driver used for the serial device, default: "CP210x".
+        :return: the COM ports currently available.
+        :raise DriverNotInstalledException: if no COM ports are found.
+        """
+        logger.info(f'Querying Win32 api for driver \"{driver_name}\"...', module=Module.WIN32)
+        com_ports = [com for com in self.list_candidate_ports(driver_name) if com not in self.__used_ports]
+        logger.debug('Found ports:', com_ports, module=Module.WIN32)
         if len(com_ports):
             return com_ports
 
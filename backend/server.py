@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Production entry point of the backend: python server.py
+
+SERVER_ASYNC_MODE selects the server:
+- threading: waitress with SERVER_THREADS worker threads. Socket.IO clients stay on long-polling, each waiting
+  client occupies a worker thread.
+- gevent: gevent's WSGI server with websockets and one greenlet per connection, only meant for the Socket.IO fan-out
+  to many dashboard clients. The test threads become greenlets on the same event loop, and the SQLite calls of the
+  acquisition (persisting every frame) and of the API block it while they run: the dashboards stall during long
+  queries, exports and maintenance, and many devices delay each other. Acquisition setups keep the default threading.
+
+On SIGINT/SIGTERM the server stops accepting requests, stops the running tests, waits for pending requests to
+the ML backend and flushes the logfile.
+"""
+import os
+
+import dotenv
+
+if os.path.isfile('.env'):
+    dotenv.load_dotenv()
+# gevent has to patch the standard library before any module creates threads, locks or sockets
+if (os.getenv('SERVER_ASYNC_MODE') or '').strip().lower() == 'gevent':
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import signal  # noqa: E402
+import time  # noqa: E402
+
+import config  # noqa: E402
+from app import app, middleware, socketio  # noqa: E402
+from log_handler.log_handler import log as logger, Module  # noqa: E402
+from ml_helper import ml_helper  # noqa: E402
+
+
+def shutdown() -> None:
+    """
+    Stops the running tests and waits for the pending ML backend requests.
+    """
+    start: float = time.monotonic()
+    logger.info('Shutting down...', module=Module.SERVER)
+    middleware.shutdown()
+    if not ml_helper.flush(timeout=max(0.0, config.SHUTDOWN_TIMEOUT - (time.monotonic() - start))):
+        logger.error('Requests to the ML backend are still pending, they are dropped.', module=Module.SERVER)
+    logger.info(f'Shutdown completed after {time.monotonic() - start:.1f}s.', module=Module.SERVER)
+    logger.flush(timeout=config.SHUTDOWN_TIMEOUT)
+
+
+def _raise_system_exit(*_) -> None:
+    raise SystemExit(0)
+
+
+def serve_threading() -> None:
+    """
+    Serves the app with waitress.
+    """
+    import waitress
+
+    server = waitress.create_server(
+        app,
+        host=config.SERVER_HOST,
+        port=config.SERVER_PORT,
+        threads=config.SERVER_THREADS,
+        connection_limit=config.SERVER_CONNECTION_LIMIT,
+        ident='SmellInspector Companion'
+    )
+    # waitress doesn't expose the client socket, so the Socket.IO clients must not try to upgrade to websockets
+    socketio.server.eio.allow_upgrades = False
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    signal.signal(signal.SIGINT, _raise_system_exit)
+    logger.info(f'Serving on {config.SERVER_HOST}:{config.SERVER_PORT} (threading, '
+                f'{config.SERVER_THREADS} threads).', module=Module.SERVER)
+    try:
+        server.run()
+    except SystemExit:
+        pass
+    finally:
+        shutdown()
+        server.task_dispatcher.shutdown(timeout=config.SHUTDOWN_TIMEOUT)
+        server.close()
+
+
+def serve_gevent() -> None:
+    """
+    Serves the app with gevent's WSGI server, the connections are limited by a greenlet pool.
+    """
+    import gevent
+    from gevent.event import Event
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    try:
+        from geventwebsocket.handler import WebSocketHandler
+        handler_options = {'handler_class': WebSocketHandler}
+    except ImportError:
+        # Socket.IO falls back to simple-websocket on the plain gevent handler
+        handler_options = {}
+    server = WSGIServer(
+        (config.SERVER_HOST, config.SERVER_PORT),
+        app,
+        spawn=Pool(config.SERVER_CONNECTION_LIMIT),
+        log=None,
+        **handler_options
+    )
+
+    stopping = Event()
+    gevent.signal_handler(signal.SIGTERM, stopping.set)
+    gevent.signal_handler(signal.SIGINT, stopping.set)
+    server.start()
+    logger.info(f'Serving on {config.SERVER_HOST}:{config.SERVER_PORT} (gevent, '
+                f'{config.SERVER_CONNECTION_LIMIT} connections). Database calls block the event loop, use the '
+                'threading mode for acquisition with many devices.', module=Module.SERVER)
+    stopping.wait()
+    server.close()
+    shutdown()
+    server.stop(timeout=1)
+
+
+if __name__ == '__main__':
+    if config.SERVER_ASYNC_MODE == 'gevent':
+        serve_gevent()
+    else:
+        serve_threading()
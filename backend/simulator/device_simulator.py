@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import pty
+import random
+import selectors
+import sys
+import threading
+import time
+import tty
+from typing import List, Optional
+
+from log_handler.log_handler import Module, log as logger
+from serial_com.port_discovery import port_discovery
+from serial_com.posix_serial import posix_serial_api
+
+
+class SimulatedDevice:
+    """
+    A virtual SmellInspector on a pseudo-terminal (see specs.md).
+
+    Emits "start;{64 resistance values};temperature;humidity" frames, answers GET_INFO and applies FAN0-FAN3.
+    Disconnects close the pseudo-terminal, so the reading SerialComHandler sees a lost connection; after an
+    optional delay the device re-appears on a new pseudo-terminal with the same MAC address.
+    """
+
+    SENSOR_COUNT: int = 64
+    MALFORMED_KINDS: tuple = ('truncated', 'garbage', 'event')
+
+    def __frame(self) -> bytes:
+        fan_cooling: float = self.fan_state * 0.4
+        values: List[str] = []
+        for i in range(self.SENSOR_COUNT):
+            self.__drift[i] += self.__rng.gauss(0, self.drift)
+            value: float = self.__baselines[i] * (1 + self.__drift[i] + self.__rng.gauss(0, self.noise))
+            values.append(f'{value:.2f}')
+        temperature: float = 24.5 - fan_cooling + self.__rng.gauss(0, 0.05)
+        humidity: float = 41.0 - 3 * fan_cooling + self.__rng.gauss(0, 0.1)
+        return f'start;{";".join(values)};{temperature:.2f};{humidity:.2f}\n'.encode('ascii')
+
+    def __malformed(self, kind: str) -> bytes:
+        if kind == 'truncated':
+            frame: bytes = self.__frame()
+            return frame[:self.__rng.randint(1, len(frame) - 2)] + b'\n'
+        if kind == 'garbage':
+            return bytes(self.__rng.randint(128, 255) for _ in range(16)) + b'\n'
+        return b'event\n'
+
+    def next_output(self) -> bytes:
+        """
+        The next line written by the device: a data frame or, if injected or sampled, a malformed line.
+        """
+        self.frames_sent += 1
+        with self.__lock:
+            if self.__pending_malformed:
+                self.__pending_malformed -= 1
+                return self.__malformed(self.__rng.choice(self.MALFORMED_KINDS))
+        if self.malformed_rate and self.__rng.random() < self.malformed_rate:
+            return self.__malformed(self.__rng.choice(self.MALFORMED_KINDS))
+        return self.__frame()
+
+    def handle_command(self, command: str) -> Optional[bytes]:
+        """
+        Applies a command received from the host.
+        :param command: the command without the newline.
+        :return: the response line, if any.
+        """
+        if command == 'GET_INFO':
+            return f'{self.software_version};{self.mac_address};SmellInspector-Simulator\n'.encode('ascii')
+        if command in ('FAN0', 'FAN1', 'FAN2', 'FAN3'):
+            self.fan_state = int(command[-1])
+            logger.debug(f'[{self.mac_address}] Fan set to {self.fan_state}.', module=Module.SIMULATOR)
+        return None
+
+    def inject_malformed(self, count: int = 1) -> None:
+        """
+        Replaces the next frames with malformed lines (truncated frames, non-ASCII garbage or "event").
+        """
+        with self.__lock:
+            self.__pending_malformed += count
+
+    def disconnect(self, reconnect_after: Optional[float] = None) -> None:
+        """
+        Simulates unplugging the device.
+        :param reconnect_after: (Optional) seconds after which the device re-appears on a new port.
+        """
+        with self.__lock:
+            self.__disconnect_requested = True
+            self.reconnect_at = None if reconnect_after is None else time.monotonic() + reconnect_after
+
+    def take_disconnect_request(self) -> bool:
+        with self.__lock:
+            requested: bool = self.__disconnect_requested
+            self.__disconnect_requested = False
+            return requested
+
+    def open(self) -> None:
+        """
+        Creates the pseudo-terminal and registers its port with the POSIX serial API.
+        """
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+        self.buffer = b''
+        self.next_frame_at = time.monotonic() + self.__rng.uniform(0, self.interval)
+        posix_serial_api.register_virtual_port(self.port)
+        port_discovery.invalidate()
+        logger.info(f'Simulated device \"{self.mac_address}\" available on \"{self.port}\".', module=Module.SIMULATOR)
+
+    def close(self) -> None:
+        """
+        Closes the pseudo-terminal, the host side reads fail afterwards.
+        """
+        if self.master_fd is None:
+            return
+        posix_serial_api.unregister_virtual_port(self.port)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.master_fd = None
+        self.slave_fd = None
+        port_discovery.invalidate()
+        logger.info(f'Simulated device \"{self.mac_address}\" disconnected from \"{self.port}\".',
+                    module=Module.SIMULATOR)
+
+    def is_open(self) -> bool:
+        return self.master_fd is not None
+
+    def __init__(
+            self,
+            mac_address: str,
+            rate: float = 1 / 1.8,
+            noise: float = 0.005,
+            drift: float = 0.0001,
+            malformed_rate: float = 0,
+            software_version: str = 'SIM-1.0',
+            seed: Optional[int] = None
+    ):
+        """
+        Constructor.
+        :param mac_address: the MAC address returned by GET_INFO.
+        :param rate: (Optional) frames per second, default: one read-out every 1.8 seconds (see specs.md).
+        :param noise: (Optional) relative standard deviation of the per-frame sensor noise.
+        :param drift: (Optional) relative standard deviation of the per-frame baseline random walk.
+        :param malformed_rate: (Optional) probability of a malformed line instead of a frame.
+        :param software_version: (Optional) the software version returned by GET_INFO.
+        :param seed: (Optional) random seed for reproducible frames.
+        """
+        self.mac_address: str = mac_address
+        self.interval: float = 1 / rate
+        self.noise: float = noise
+        self.drift: float = drift
+        self.malformed_rate: float = malformed_rate
+        self.software_version: str = software_version
+        self.fan_state: int = 0
+        self.frames_sent: int = 0
+        self.port: Optional[str] = None
+        self.master_fd: Optional[int] = None
+        self.slave_fd: Optional[int] = None
+        self.buffer: bytes = b''
+        self.next_frame_at: float = 0
+        self.reconnect_at: Optional[float] = None
+        self.__rng: random.Random = random.Random(seed)
+        self.__baselines: List[float] = [self.__rng.uniform(50, 500) for _ in range(self.SENSOR_COUNT)]
+        self.__drift: List[float] = [0.0] * self.SENSOR_COUNT
+        self.__pending_malformed: int = 0
+        self.__disconnect_requested: bool = False
+        self.__lock: threading.Lock = threading.Lock()
+
+
+class DeviceSimulator:
+    """
+    Runs any number of simulated devices from a single thread (POSIX only).
+
+    Frames are scheduled per device, writes are non-blocking: if the host does not read, frames are dropped
+    once the pseudo-terminal buffer is full, as with a real device whose USB buffer overflows.
+    """
+
+    def add_device(self, mac_address: Optional[str] = None, **kwargs) -> SimulatedDevice:
+        """
+        Creates a device and opens its pseudo-terminal.
+        :param mac_address: (Optional) the MAC address, default: generated from the device index.
+        :param kwargs: see SimulatedDevice.
+        :return: the device.
+        """
+        with self.__lock:
+            index: int = len(self.__devices)
+            if mac_address is None:
+                mac_address = 'SI:MU:' + ':'.join(f'{(index >> shift) & 0xFF:02X}' for shift in (24, 16, 8, 0))
+            if 'seed' not in kwargs and self.__seed is not None:
+                kwargs['seed'] = self.__seed + index
+            device: SimulatedDevice = SimulatedDevice(mac_address=mac_address, **kwargs)
+            device.open()
+            self.__devices.append(device)
+        return device
+
+    def get_devices(self) -> List[SimulatedDevice]:
+        with self.__lock:
+            return list(self.__devices)
+
+    def get_ports(self) -> List[str]:
+        return [device.port for device in self.get_devices() if device.is_open()]
+
+    def __read_commands(self, device: SimulatedDevice) -> None:
+        try:
+            data: bytes = os.read(device.master_fd, 1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        device.buffer += data
+        while b'\n' in device.buffer:
+            line, device.buffer = device.buffer.split(b'\n', 1)
+            response: Optional[bytes] = device.handle_command(line.decode('ascii', 'replace').strip())
+            if response is not None:
+                self.__write(device, response)
+
+    @staticmethod
+    def __write(device: SimulatedDevice, line: bytes) -> None:
+        try:
+            os.write(device.master_fd, line)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            logger.debug(f'[{device.mac_address}] Write failed. Trace:', e, module=Module.SIMULATOR)
+
+    def __step(self, devices: List[SimulatedDevice], now: float) -> None:
+        for device in devices:
+            if device.take_disconnect_request():
+                device.close()
+            if not device.is_open():
+                if device.reconnect_at is not None and now >= device.reconnect_at:
+                    device.reconnect_at = None
+                    device.open()
+                continue
+            if now >= device.next_frame_at:
+                self.__write(device, device.next_output())
+                device.next_frame_at += device.interval
+                if device.next_frame_at < now:
+                    device.next_frame_at = now + device.interval
+
+    def __run(self) -> None:
+        while self.__running:
+            devices: List[SimulatedDevice] = self.get_devices()
+            now: float = time.monotonic()
+            self.__step(devices, now)
+            open_devices: List[SimulatedDevice] = [device for device in devices if device.is_open()]
+            next_at: float = min([device.next_frame_at for device in open_devices], default=now + 0.1)
+            timeout: float = min(max(0.0, next_at - time.monotonic()), 0.1)
+            selector: selectors.DefaultSelector = selectors.DefaultSelector()
+            try:
+                for device in open_devices:
+                    selector.register(device.master_fd, selectors.EVENT_READ, device)
+                for key, _ in selector.select(timeout=timeout):
+                    if key.data.is_open():
+                        self.__read_commands(key.data)
+            except (OSError, ValueError):
+                # A device was closed concurrently, the next iteration rebuilds the selector
+                pass
+            finally:
+                selector.close()
+
+    def start(self) -> None:
+        """
+        Starts emitting frames.
+        """
+        if self.__thread is not None:
+            return
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='device-simulator', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the simulator and closes all pseudo-terminals.
+        """
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        for device in self.get_devices():
+            device.close()
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Constructor.
+        :param seed: (Optional) base random seed, device i uses seed + i.
+        """
+        if sys.platform.startswith('win'):
+            raise OSError('The device simulator requires pseudo-terminals (Linux/macOS).')
+        self.__devices: List[SimulatedDevice] = []
+        self.__seed: Optional[int] = seed
+        self.__running: bool = False
+        self.__thread: Optional[threading.Thread] = None
+        self.__lock: threading.Lock = threading.Lock()
+
+
+def start_simulated_devices(count: int, **kwargs) -> DeviceSimulator:
+    """
+    Starts a simulator with the given number of devices, e.g. for SIMULATED_DEVICES.
+    :param count: the number of devices.
+    :param kwargs: see SimulatedDevice.
+    :return: the running simulator.
+    """
+    simulator: DeviceSimulator = DeviceSimulator()
+    for _ in range(count):
+        simulator.add_device(**kwargs)
+    simulator.start()
+    return simulator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Simulates SmellInspector devices on pseudo-terminals.')
+    parser.add_argument('-n', '--devices', type=int, default=1, help='number of devices')
+    parser.add_argument('--rate', type=float, default=1 / 1.8, help='frames per second per device')
+    parser.add_argument('--noise', type=float, default=0.005, help='relative sensor noise')
+    parser.add_argument('--malformed-rate', type=float, default=0, help='probability of malformed lines')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    simulator: DeviceSimulator = DeviceSimulator(seed=args.seed)
+    for _ in range(args.devices):
+        simulator.add_device(rate=args.rate, noise=args.noise, malformed_rate=args.malformed_rate)
+    simulator.start()
+    for device in simulator.get_devices():
+        print(device.mac_address, device.port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Archived and pruned tests read back like the rows they were created from.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from database.repositories.archive_repository import ArchiveRepository
+
+pytestmark = pytest.mark.skipif(not ArchiveRepository.is_available(), reason='requires pyarrow')
+START: datetime = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _persist(database, test_name: str, count: int, offset: int = 0) -> None:
+    for i in range(offset, offset + count):
+        database.DataRepository.persist_data(test_name, 'MAC', '2' if i % 2 else '1', START + timedelta(seconds=i),
+                                             [str(i + j / 4) for j in range(64)], '20.5', str(40 + i % 3))
+
+
+def _normalise(rows) -> list:
+    return [(int(row[0]), *row[1:5], *[float(value) for value in row[5:]]) for row in rows]
+
+
+def test_prune_round_trip(database):
+    _persist(database, 't', 50)
+    _persist(database, 'other', 5)
+    before = _normalise(database.DataRepository.get_by_test_name('t'))
+    channels_before = database.DataRepository.query_channels(test_name='t', channels=['DATA_3', 'HUMIDITY'])
+    entry = database.ArchiveRepository.archive_test('t', prune=True)
+    assert entry['pruned'] and entry['samples'] == 50 and entry['substances'] == ['1', '2']
+    assert (entry['first_datetime'], entry['last_datetime']) == ('2024-01-01 12:00:00', '2024-01-01 12:00:49')
+    count = database.conn.execute('SELECT COUNT(*) FROM Data WHERE TEST_ID=?', ['t']).fetchone()[0]
+    assert count == 0
+    assert _normalise(database.DataRepository.get_by_test_name('t')) == before
+    assert len(database.DataRepository.get_by_test_name_and_substance('t', '2')) == 25
+    timestamps, values = database.DataRepository.query_channels(test_name='t', channels=['DATA_3', 'HUMIDITY'])
+    assert np.array_equal(timestamps, channels_before[0]) and np.allclose(values, channels_before[1])
+    assert ('t',) in database.DataRepository.get_test_names()
+    assert len(database.DataRepository.get_by_test_name('other')) == 5
+
+
+def test_rows_added_after_pruning_are_appended(database):
+    _persist(database, 't', 20)
+    database.ArchiveRepository.archive_test('t', prune=True)
+    _persist(database, 't', 10, offset=20)
+    assert len(database.DataRepository.get_by_test_name('t')) == 30
+    entry = database.ArchiveRepository.archive_test('t')
+    assert entry['pruned'] and entry['samples'] == 30
+    rows = database.DataRepository.get_by_test_name('t')
+    assert len(rows) == 30 and len({row[0] for row in rows}) == 30
+    assert database.DataRepository.get_last_id_by_test_name('t') == max(int(row[0]) for row in rows)
+
+
+def test_archive_without_prune_keeps_the_rows(database):
+    _persist(database, 't', 10)
+    entry = database.ArchiveRepository.archive_test('t')
+    assert not entry['pruned']
+    assert len(database.DataRepository.get_by_test_name('t')) == 10
+    assert database.ArchiveRepository.get_pruned_entries() == []
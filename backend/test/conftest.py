@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Shared setup of the offline backend tests: the backend modules are imported from the backend directory and
+configured with a temporary DB_PATH, no logfile and an unreachable ML backend.
+Run from the backend directory: python -m pytest -q test/
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DB_PATH', os.path.join(tempfile.mkdtemp(prefix='smellinspector-test-'), 'database.db'))
+os.environ.setdefault('LOGFILE', os.devnull)
+os.environ.setdefault('LOG_LEVEL', 'silent')
+os.environ.setdefault('ML_BACKEND_URL', 'http://127.0.0.1:1')
+os.environ.setdefault('PORT_DISCOVERY_WATCH', 'false')
+os.environ.setdefault('MAINTENANCE_INTERVAL', '0')
+
+# manual scripts against a running server
+collect_ignore: list = ['flask_test.py', 'substance_test.py']
+DATA: list = [str(i) for i in range(64)]
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return str(tmp_path / 'database.db')
+
+
+@pytest.fixture
+def database(db_path):
+    from database.db_handler import DatabaseHandler
+    handler = DatabaseHandler(db_path)
+    yield handler
+    handler.MaintenanceService.stop()
+    handler.conn.close()
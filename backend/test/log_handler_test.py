@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Messages are written by the writer thread but keep the call site and the argument values of the log call.
+"""
+import threading
+
+from loguru import logger
+
+from log_handler import log_handler
+from log_handler.log_handler import Logger, Module
+
+
+class Mutable:
+    def __init__(self):
+        self.value = 1
+
+    def __str__(self):
+        return f'Mutable({self.value})'
+
+
+def test_caller_and_arguments_are_captured_on_call(monkeypatch):
+    monkeypatch.setattr(log_handler, 'LOG_LEVEL', 'debug')
+    records = []
+    sink = logger.add(lambda message: records.append(message.record), level='DEBUG')
+    try:
+        instance = Logger()
+        arg = Mutable()
+        instance.info('value', arg, module=Module.TEST)
+        arg.value = 2
+        instance.flush(timeout=5)
+        instance.close()
+    finally:
+        logger.remove(sink)
+    record = [r for r in records if 'Mutable' in r['message']][0]
+    assert record['message'] == '[TEST HANDLER] value Mutable(1)'
+    assert (record['function'], record['name']) == ('test_caller_and_arguments_are_captured_on_call', __name__)
+
+
+def test_dropped_messages_are_counted_across_threads(monkeypatch):
+    monkeypatch.setattr(log_handler, 'LOG_LEVEL', 'debug')
+    monkeypatch.setattr(log_handler, 'LOG_QUEUE_SIZE', 1)
+    records = []
+    sink = logger.add(lambda message: records.append(message.record['message']), level='DEBUG')
+    release = threading.Event()
+    instance = Logger()
+    # block the writer thread so the queue stays full
+    instance.info('blocking')
+    write_batch = instance._Logger__write_batch
+
+    def blocked_write_batch(batch):
+        release.wait(5)
+        write_batch(batch)
+
+    monkeypatch.setattr(instance, '_Logger__write_batch', blocked_write_batch)
+    instance.info('fills the queue')
+    threads = [threading.Thread(target=lambda: [instance.debug('dropped') for _ in range(500)]) for _ in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        release.set()
+        instance.flush(timeout=5)
+        instance.close()
+        logger.remove(sink)
+    dropped = sum(int(message.split()[-2]) for message in records if message.startswith('[LOGGER] Log queue full'))
+    delivered = len([message for message in records if message.startswith(('blocking', 'fills the queue', 'dropped'))])
+    assert dropped + delivered == 2 + 4 * 500
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Retention deletes in batches next to running test threads, idle runs compact the file with incremental vacuum,
+the one-off VACUUM of older databases only runs on request.
+"""
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import DATA
+from database.maintenance_service import MaintenanceService
+from exception.Exceptions import MaintenanceException
+
+
+def _persist(database, test_name: str, mac_address: str, days: float, count: int) -> None:
+    timestamp: datetime = datetime.now() - timedelta(days=days)
+    for i in range(count):
+        database.DataRepository.persist_data(test_name, mac_address, '1', timestamp - timedelta(seconds=i), DATA,
+                                             '20', '40')
+
+
+def _counts(db_path: str):
+    conn = sqlite3.connect(db_path)
+    counts = dict(conn.execute('SELECT TEST_ID, COUNT(*) FROM Data GROUP BY TEST_ID').fetchall())
+    conn.close()
+    return counts
+
+
+def test_retention_policies(database, db_path):
+    _persist(database, 'DEBUG-old', 'BB:01', 8, 300)
+    _persist(database, 'DEBUG-new', 'BB:01', 1, 100)
+    _persist(database, 'aged', 'BB:01', 40, 300)
+    _persist(database, 'aged', 'BB:01', 1, 100)
+    _persist(database, 'device', 'AA:01', 12, 200)
+    _persist(database, 'device', 'BB:01', 12, 50)
+    database.DataRepository.persist_gap('DEBUG-old', 'BB:01', datetime.now(), datetime.now(), 'test')
+    service = MaintenanceService(db_path, interval=0, max_age_days=30, device_policies={'AA:*': 10},
+                                 test_policies={'DEBUG*': 7}, batch_size=64, batch_sleep=0,
+                                 rollup_resolutions=[60, 600])
+    service.start(lambda: [])
+    report = service.run()
+    assert report['deleted_tests'] == ['DEBUG-old']
+    assert report['deleted_samples'] == 300 + 300 + 200
+    assert _counts(db_path) == {'DEBUG-new': 100, 'aged': 100, 'device': 50}
+    assert database.DataRepository.get_gaps_by_test_name('DEBUG-old') == []
+    assert database.RollupRepository.get_rollups(60, test_name='DEBUG-old') == []
+    # the rollups of trimmed tests only count the remaining samples
+    for resolution in (60, 600):
+        for test_name, count in (('aged', 100), ('device', 50), ('DEBUG-new', 100)):
+            assert sum(bucket['samples'] for bucket in
+                       database.RollupRepository.get_rollups(resolution, test_name=test_name)) == count
+
+
+def test_trimmed_rollups_match_a_rebuild(database, db_path):
+    _persist(database, 'aged', 'BB:01', 0, 120)
+    _persist(database, 'aged', 'AA:01', 0, 120)
+    service = MaintenanceService(db_path, interval=0, device_policies={'AA:*': 61 / 86400}, batch_sleep=0,
+                                 rollup_resolutions=[60, 600])
+    service.start(lambda: ['aged'])
+    report = service.run()
+    assert 0 < report['deleted_samples'] < 120
+    # the bucket containing the cutoff keeps its samples after the cutoff
+    assert _counts(db_path)['aged'] > 120
+    trimmed = {resolution: database.RollupRepository.get_rollups(resolution, test_name='aged')
+               for resolution in (60, 600)}
+    database.RollupRepository.rebuild('aged')
+    for resolution in (60, 600):
+        assert trimmed[resolution] == database.RollupRepository.get_rollups(resolution, test_name='aged')
+        assert sum(bucket['samples'] for bucket in trimmed[resolution]) == _counts(db_path)['aged']
+
+
+def test_running_test_is_not_deleted_as_a_whole(database, db_path):
+    _persist(database, 'DEBUG-running', 'BB:01', 8, 10)
+    service = MaintenanceService(db_path, interval=0, test_policies={'DEBUG*': 7}, batch_sleep=0)
+    service.start(lambda: ['DEBUG-running'])
+    report = service.run()
+    assert report['deleted_tests'] == [] and not report['idle']
+    assert _counts(db_path) == {'DEBUG-running': 10}
+
+
+def test_batched_retention_next_to_a_writer(database, db_path):
+    _persist(database, 'aged', 'BB:01', 40, 2000)
+    service = MaintenanceService(db_path, interval=0, max_age_days=30, batch_size=100, batch_sleep=0)
+    service.start(lambda: ['live'])
+    stop, writes = threading.Event(), []
+
+    def writer():
+        while not stop.is_set():
+            _persist(database, 'live', 'BB:02', 0, 1)
+            writes.append(1)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        report = service.run()
+    finally:
+        stop.set()
+        thread.join()
+    assert report['deleted_samples'] == 2000
+    assert _counts(db_path) == {'live': len(writes)}
+    assert sum(bucket['samples'] for bucket in database.RollupRepository.get_rollups(60, test_name='live')) \
+        == len(writes)
+
+
+def test_idle_run_releases_pages(database, db_path):
+    _persist(database, 'aged', 'BB:01', 40, 3000)
+    _persist(database, 'kept', 'BB:01', 0, 100)
+    service = MaintenanceService(db_path, interval=0, max_age_days=30, batch_sleep=0, vacuum_pages=64)
+    service.start(lambda: [])
+    assert service.is_incremental()
+    conn = sqlite3.connect(db_path)
+    before: int = conn.execute('PRAGMA page_count').fetchone()[0]
+    conn.close()
+    report = service.run()
+    assert report['released_pages'] > 0
+    assert report['size']['page_count'] < before // 2
+    assert report['size']['freelist_pages'] == 0
+    assert service.run()['released_pages'] == 0
+    assert len(service.get_size_history()) == 2
+
+
+@pytest.fixture
+def legacy_db_path(tmp_path) -> str:
+    """
+    A database created before auto_vacuum=INCREMENTAL.
+    """
+    path: str = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE Legacy (ID INTEGER)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_legacy_database_is_only_converted_on_request(legacy_db_path):
+    from database.db_handler import DatabaseHandler
+    database = DatabaseHandler(legacy_db_path)
+    _persist(database, 'aged', 'BB:01', 40, 1000)
+    running = ['live']
+    service = MaintenanceService(legacy_db_path, interval=0, max_age_days=30, batch_sleep=0)
+    service.start(lambda: list(running))
+    running.clear()
+    report = service.run()
+    assert report['idle'] and report['released_pages'] == 0
+    assert not service.is_incremental()
+    running.append('live')
+    with pytest.raises(MaintenanceException):
+        service.convert_to_incremental_vacuum()
+    running.clear()
+    result = service.convert_to_incremental_vacuum()
+    assert result['converted'] and result['released_pages'] > 0
+    assert service.is_incremental()
+    assert not service.convert_to_incremental_vacuum()['converted']
+    database.conn.close()
+
+
+def test_archived_test_keeps_its_rollups(database, db_path):
+    from database.repositories.archive_repository import ArchiveRepository
+    if not ArchiveRepository.is_available():
+        pytest.skip('requires pyarrow')
+    _persist(database, 'archived', 'BB:01', 40, 300)
+    _persist(database, 'archived', 'BB:01', 1, 100)
+    database.ArchiveRepository.archive_test('archived')
+    service = MaintenanceService(db_path, interval=0, max_age_days=30, batch_sleep=0, rollup_resolutions=[60, 600])
+    service.start(lambda: [])
+    assert service.run()['deleted_samples'] == 300
+    # the archive still holds the trimmed samples
+    assert sum(bucket['samples'] for bucket in database.RollupRepository.get_rollups(600, test_name='archived')) \
+        == 400
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+A lost device is only reconnected on a port reporting its MAC address.
+"""
+import pytest
+
+from exception.Exceptions import DeviceNotFoundException
+from serial_com import serial_com_handler
+from serial_com.serial_com_handler import SerialComHandler
+
+MACS: dict = {'/dev/other': 'AA:AA', '/dev/own': 'BB:BB'}
+
+
+class FakePort:
+    def __init__(self, port: str):
+        self.port = port
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def handler(monkeypatch) -> SerialComHandler:
+    monkeypatch.setattr(serial_com_handler.serial_com, 'find_com_ports_by_driver', lambda: list(MACS))
+    monkeypatch.setattr(serial_com_handler.serial_com, 'check_port_is_used', lambda port: False)
+    device = SerialComHandler.__new__(SerialComHandler)
+    device._SerialComHandler__port = FakePort('/dev/lost')
+    device._SerialComHandler__device_metadata = []
+    device._SerialComHandler__open_serial_connection = lambda serial_port, deadline: FakePort(serial_port)
+    monkeypatch.setattr(device, 'get_device_info',
+                        lambda deadline=None: ['1.0', MACS[device.get_port_name()]])
+    return device
+
+
+def test_device_is_found_by_mac_address(handler):
+    assert handler.reconnect(mac_address='BB:BB') == '/dev/own'
+
+
+def test_mac_address_of_the_last_handshake_is_used(handler):
+    handler._SerialComHandler__device_metadata = ['1.0', 'BB:BB']
+    assert handler.reconnect() == '/dev/own'
+
+
+def test_unidentified_device_is_never_accepted(handler):
+    with pytest.raises(DeviceNotFoundException):
+        handler.reconnect()
+    with pytest.raises(DeviceNotFoundException):
+        handler.reconnect(mac_address='CC:CC')
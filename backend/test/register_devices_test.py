@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Bulk registration validates its input and never registers a device after its handshake timed out.
+"""
+import json
+import time
+
+import pytest
+
+from middleware import connections_handler
+from middleware.connections_handler import MiddlewareConnectionHandler
+
+
+class FakeDevice:
+    delays: dict = {}
+    closed: list = []
+
+    def __init__(self, serial_port: str = None, deadline: float = None, fallback: bool = True):
+        self.port = serial_port
+
+    def get_device_info(self, deadline: float = None) -> list:
+        time.sleep(self.delays.get(self.port, 0))
+        return ['1.0', f'MAC-{self.port}']
+
+    def get_port_name(self) -> str:
+        return self.port
+
+    def shutdown(self) -> None:
+        self.closed.append(self.port)
+
+
+@pytest.fixture
+def middleware(monkeypatch) -> MiddlewareConnectionHandler:
+    monkeypatch.setattr(connections_handler, 'SerialComHandler', FakeDevice)
+    monkeypatch.setattr(MiddlewareConnectionHandler, '_MiddlewareConnectionHandler__REGISTRATION_GRACE_SECONDS', 0)
+    FakeDevice.delays, FakeDevice.closed = {}, []
+    return MiddlewareConnectionHandler()
+
+
+@pytest.mark.parametrize('devices', [['fast'], [{'device_nickname': 'a'}, None], [{'device_nickname': ['a']}]])
+def test_invalid_entries_are_rejected(middleware, devices):
+    result, code = middleware.register_devices(devices)
+    assert code == 400 and 'error' in json.loads(result)
+
+
+def test_timed_out_handshake_does_not_register(middleware):
+    FakeDevice.delays = {'/dev/slow': 0.5}
+    result, code = middleware.register_devices([
+        {'device_nickname': 'fast', 'com_port': '/dev/fast'},
+        {'device_nickname': 'slow', 'com_port': '/dev/slow'},
+    ], timeout=0.1)
+    fast, slow = json.loads(result)
+    assert code == 200 and fast['status'] == 200 and slow['status'] == 400
+    time.sleep(0.6)
+    connected = [row[1] for row in json.loads(middleware.get_connected_devices()[0])]
+    assert 'fast' in connected and 'slow' not in connected
+    assert FakeDevice.closed == ['/dev/slow']
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Large responses are compressed for clients accepting it, unchanged GET responses are answered with an empty 304.
+"""
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from responses import response_layer as layer
+from responses.response_layer import ResponseLayer, dumps
+
+ROWS: list = [{'id': i, 'value': f'{i * 0.25:.2f}'} for i in range(200)]
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    ResponseLayer(min_size=256).init_app(app)
+
+    @app.route('/rows', methods=['GET', 'POST'])
+    def rows():
+        return dumps(ROWS), 200
+
+    @app.route('/small')
+    def small():
+        return dumps({'ok': True}), 200
+
+    return app.test_client()
+
+
+def test_gzip_compression(client):
+    response = client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == ROWS
+
+
+@pytest.mark.skipif(layer.brotli is None, reason='requires brotli')
+def test_brotli_is_preferred(client):
+    response = client.get('/rows', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(layer.brotli.decompress(response.data)) == ROWS
+
+
+def test_small_and_unaccepted_responses_are_sent_as_is(client):
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get('/rows')
+    assert 'Content-Encoding' not in response.headers and json.loads(response.data) == ROWS
+
+
+def test_unchanged_response_is_not_modified(client):
+    response = client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+    etag: str = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    not_modified = client.get('/rows', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    # each representation has its own tag
+    assert client.get('/rows', headers={'If-None-Match': etag}).status_code == 200
+    assert 'ETag' not in client.post('/rows').headers
+
+
+def test_dumps_matches_the_standard_library():
+    value = {'rows': ROWS[:3], 'created': None, 'nested': [1.5, 'x']}
+    assert json.loads(dumps(value)) == value
+    with pytest.raises(TypeError):
+        dumps({'created': datetime(2024, 1, 1)})
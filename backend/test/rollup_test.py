@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Rollups are written in the transaction of their raw sample, also with several test threads on one connection.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from conftest import DATA
+from exception.Exceptions import InvalidDataException
+
+
+def _rollup_samples(database, resolution: int, test_name: str) -> int:
+    return sum(bucket['samples'] for bucket in database.RollupRepository.get_rollups(resolution, test_name=test_name))
+
+
+def test_rollups_match_rebuild(database):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for i in range(150):
+        database.DataRepository.persist_data('t', 'MAC', '1', start + timedelta(seconds=7 * i),
+                                             [str(i + j) for j in range(64)], '20', str(40 + i % 3))
+    incremental = database.RollupRepository.get_rollups(60, test_name='t')
+    database.RollupRepository.rebuild('t')
+    rebuilt = database.RollupRepository.get_rollups(60, test_name='t')
+    assert len(incremental) == len(rebuilt) == 18
+    for a, b in zip(incremental, rebuilt):
+        assert a['samples'] == b['samples']
+        for channel in ('DATA_0', 'DATA_63', 'HUMIDITY'):
+            assert a['channels'][channel] == b['channels'][channel]
+    assert _rollup_samples(database, 600, 't') == 150
+
+
+def test_non_numeric_sample_is_stored_without_rollup(database):
+    database.DataRepository.persist_data('t', 'MAC', '1', datetime.now(), ['x', *DATA[1:]], '20', '40')
+    database.DataRepository.persist_data('t', 'MAC', '1', datetime.now(), DATA, '20', '40')
+    assert len(database.DataRepository.get_by_test_name('t')) == 2
+    assert _rollup_samples(database, 60, 't') == 1
+
+
+def test_concurrent_writers_do_not_commit_or_roll_back_each_other(database, monkeypatch):
+    writes, failures = 300, []
+    add_sample = database.RollupRepository.add_sample
+
+    def failing_add_sample(test_name, *args):
+        if test_name == 'failing':
+            raise InvalidDataException()
+        add_sample(test_name, *args)
+
+    # the rollup update fails after the raw insert, the transaction has to be rolled back
+    monkeypatch.setattr(database.RollupRepository, 'add_sample', failing_add_sample)
+
+    def valid_writer():
+        for _ in range(writes):
+            database.DataRepository.persist_data('valid', 'MAC-1', '1', datetime.now(), DATA, '20', '40')
+
+    def failing_writer():
+        for _ in range(writes):
+            try:
+                database.DataRepository.persist_data('failing', 'MAC-2', '1', datetime.now(), DATA, '20', '40')
+            except InvalidDataException:
+                failures.append(1)
+
+    threads = [threading.Thread(target=valid_writer), threading.Thread(target=failing_writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(failures) == writes
+    assert len(database.DataRepository.get_by_test_name('valid')) == writes
+    assert len(database.DataRepository.get_by_test_name('failing')) == 0
+    assert _rollup_samples(database, 60, 'valid') == writes
+    assert _rollup_samples(database, 60, 'failing') == 0
+
+
+def test_rebuild_skips_the_samples_add_sample_skips(database):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    invalid = ['x', '', 'nan', 'inf', '1,5']
+    for i in range(60):
+        values = [str(i + j / 4) for j in range(64)]
+        if i % 6 == 0:
+            values[i % 64] = invalid[i // 6 % len(invalid)]
+        humidity: str = 'n/a' if i % 10 == 5 else str(40 + i % 3)
+        database.DataRepository.persist_data('mixed', 'MAC', '1', start + timedelta(seconds=13 * i), values,
+                                             ' 20.5 ', humidity)
+    incremental = database.RollupRepository.get_rollups(60, test_name='mixed')
+    database.RollupRepository.rebuild('mixed')
+    assert database.RollupRepository.get_rollups(60, test_name='mixed') == incremental
+    assert _rollup_samples(database, 60, 'mixed') == 60 - 10 - 6
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+The backend and the ML service are built as separate images, each with its own copy of the shared modules.
+Changes must be applied to both copies.
+"""
+import os
+
+import pytest
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ML_SERVICE_DIR: str = os.path.join(os.path.dirname(BACKEND_DIR), 'machine_learning')
+SHARED_MODULES = ['metrics/metrics.py', 'metrics/tracing.py', 'responses/response_layer.py']
+
+
+@pytest.mark.skipif(not os.path.isdir(ML_SERVICE_DIR), reason='requires the machine_learning service next to backend')
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_shared_modules_are_identical(module: str):
+    with open(os.path.join(BACKEND_DIR, module), 'rb') as f:
+        backend = f.read()
+    with open(os.path.join(ML_SERVICE_DIR, module), 'rb') as f:
+        ml_service = f.read()
+    assert backend == ml_service, f'backend/{module} and machine_learning/{module} diverged'
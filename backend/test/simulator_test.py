@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Offline tests of the serial stack against the pseudo-terminal device simulator (Linux/macOS).
+Run from the backend directory: python -m pytest -q test/simulator_test.py
+"""
+import os
+import sys
+import time
+
+import pytest
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOGFILE', os.devnull)
+os.environ.setdefault('LOG_LEVEL', 'silent')
+
+pytestmark = pytest.mark.skipif(sys.platform.startswith('win'), reason='requires pseudo-terminals')
+
+
+@pytest.fixture
+def simulator():
+    from simulator.device_simulator import DeviceSimulator
+    _simulator = DeviceSimulator(seed=42)
+    yield _simulator
+    _simulator.stop()
+
+
+def test_frames_and_commands(simulator):
+    from serial_com.serial_com_handler import SerialComHandler
+    from serial_com.posix_serial import posix_serial_api
+    device = simulator.add_device(rate=20)
+    simulator.start()
+    assert device.port in posix_serial_api.list_candidate_ports()
+    handler = SerialComHandler(device.port, fallback=False)
+    try:
+        assert handler.get_device_info()[:2] == ['SIM-1.0', device.mac_address]
+        frame = handler.read(deadline=time.monotonic() + 2).split(';')
+        assert len(frame) == 67 and frame[0] == 'start'
+        assert handler.write('FAN3')[0]
+        deadline = time.monotonic() + 2
+        while device.fan_state != 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert device.fan_state == 3
+    finally:
+        handler.shutdown()
+
+
+def test_malformed_lines_and_disconnect(simulator):
+    from serial_com.serial_com_handler import SerialComHandler
+    device = simulator.add_device(rate=50)
+    simulator.start()
+    handler = SerialComHandler(device.port, fallback=False)
+    try:
+        handler.flush()
+        device.inject_malformed(5)
+        lines = [handler.read(deadline=time.monotonic() + 2) for _ in range(20)]
+        assert any(line is not None and len(line.split(';')) != 67 for line in lines)
+        device.disconnect()
+        deadline = time.monotonic() + 5
+        while handler.read(deadline=deadline) is not None:
+            pass
+        assert not handler.is_connected()
+    finally:
+        handler.shutdown()
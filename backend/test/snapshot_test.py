@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Snapshots, backups and exports are consistent while test threads write, and include tests pruned to the archive.
+"""
+import csv
+import glob
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from conftest import DATA
+from database.repositories.archive_repository import ArchiveRepository
+from database.snapshot_service import SnapshotService
+
+requires_pyarrow = pytest.mark.skipif(not ArchiveRepository.is_available(), reason='requires pyarrow')
+
+
+@pytest.fixture
+def snapshots(db_path, tmp_path) -> SnapshotService:
+    return SnapshotService(db_path, str(tmp_path / 'snapshots'), str(tmp_path / 'backups'),
+                           backup_retention=2, pages=4, sleep=0.001)
+
+
+def _persist(database, test_name: str, count: int) -> None:
+    for _ in range(count):
+        database.DataRepository.persist_data(test_name, 'MAC', '1', datetime.now(), DATA, '20', '40')
+
+
+def test_snapshot_is_consistent_while_writing(database, snapshots):
+    _persist(database, 'seed', 2000)
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            _persist(database, 'live', 1)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        snapshot: str = snapshots.create_snapshot()
+    finally:
+        stop.set()
+        thread.join()
+    conn = sqlite3.connect(snapshot)
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    # rollups are committed with their samples, a consistent copy has one rollup sample per raw sample
+    samples: int = conn.execute('SELECT COUNT(*) FROM Data').fetchone()[0]
+    assert samples >= 2000
+    assert conn.execute('SELECT SUM(SAMPLES) FROM DataRollup WHERE RESOLUTION=60').fetchone()[0] == samples
+    conn.close()
+    assert not [name for name in os.listdir(os.path.dirname(snapshot)) if not name.endswith('.db')]
+
+
+def test_read_snapshot_is_stable(database, snapshots):
+    _persist(database, 't', 10)
+    with snapshots.read_snapshot() as conn:
+        before: int = conn.execute('SELECT COUNT(*) FROM Data').fetchone()[0]
+        _persist(database, 't', 10)
+        assert conn.execute('SELECT COUNT(*) FROM Data').fetchone()[0] == before == 10
+    assert len(database.DataRepository.get_by_test_name('t')) == 20
+
+
+def test_backup_retention(database, snapshots):
+    _persist(database, 't', 5)
+    backups = [snapshots.create_backup() for _ in range(3)]
+    assert snapshots.get_backups() == sorted(backups, reverse=True)[:2]
+    assert len(glob.glob(os.path.join(os.path.dirname(backups[0]), '*'))) == 2
+
+
+@requires_pyarrow
+def test_ml_sync_includes_pruned_archived_tests(database, monkeypatch):
+    from ml_helper import MLHelper
+    _persist(database, 'archived', 15)
+    _persist(database, 'live', 5)
+    database.ArchiveRepository.archive_test('archived', prune=True)
+    helper = MLHelper.__new__(MLHelper)
+    helper._database = database
+    sent = {}
+
+    def send(payload, url, file_path=None):
+        conn = sqlite3.connect(file_path)
+        sent.update(conn.execute('SELECT TEST_ID, COUNT(*) FROM Data GROUP BY TEST_ID').fetchall())
+        conn.close()
+
+    monkeypatch.setattr(helper, '_send_request_until_received', send)
+    helper._send_test_data('http://ml/initial-data')
+    assert sent == {'archived': 15, 'live': 5}
+
+
+@requires_pyarrow
+def test_export_csv_of_pruned_archived_test(tmp_path):
+    from middleware.connections_handler import MiddlewareConnectionHandler
+    middleware = MiddlewareConnectionHandler()
+    database = middleware._MiddlewareConnectionHandler__database
+    _persist(database, 'export-archived', 12)
+    database.ArchiveRepository.archive_test('export-archived', prune=True)
+    filename = str(tmp_path / 'export.csv')
+    result, code = middleware.export_test_csv('export-archived', filename)
+    assert (result, code) == (filename, 200)
+    with open(filename) as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert len(rows) == 13 and rows[1][1] == 'export-archived'
+    assert middleware.export_test_csv('missing', filename)[1] == 400
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Substances added or renamed through the middleware are sent to the ML backend with their current label.
+"""
+import json
+import threading
+
+import pytest
+
+from middleware.connections_handler import MiddlewareConnectionHandler
+from ml_helper import ml_helper
+
+
+@pytest.fixture
+def sent(monkeypatch) -> list:
+    payloads, delivered = [], threading.Semaphore(0)
+
+    def send(payload, url, trace=None):
+        payloads.append(payload)
+        delivered.release()
+
+    def wait_for_payload() -> dict:
+        assert delivered.acquire(timeout=5)
+        return payloads[-1]
+
+    monkeypatch.setattr(ml_helper, '_send_request_until_received', send)
+    return wait_for_payload
+
+
+def _substance_id(middleware: MiddlewareConnectionHandler, name: str, quantity: str) -> str:
+    substances = json.loads(middleware.get_substances()[0])
+    return str([row[0] for row in substances if (row[1], row[2]) == (name, quantity)][0])
+
+
+def test_ml_helper_sees_substance_changes_of_the_middleware(sent):
+    middleware = MiddlewareConnectionHandler()
+    # warm the cache before the change
+    ml_helper.send_new_data(['1'] * 64, '1')
+    sent()
+    assert middleware.add_substance('cache-test', '5ul')[1] == 200
+    substance_id: str = _substance_id(middleware, 'cache-test', '5ul')
+    ml_helper.send_new_data(['1'] * 64, substance_id)
+    assert sent()['substance'] == 'cache-test'
+    assert middleware.update_substance(substance_id, 'cache-renamed', '10ul')[1] == 200
+    ml_helper.send_new_data(['1'] * 64, substance_id)
+    payload = sent()
+    assert (payload['substance'], payload['quantity']) == ('cache-renamed', '10ul')
@@ -1,17 +1,33 @@
 #!/usr/bin/env python3
+import time
+
+STARTUP_BEGIN: float = time.monotonic()
+
 from typing import Dict, Optional, Any
 
+import io
+import os
+import shutil
 import sys
+import tempfile
 import waitress
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
 from logging_framework.log_handler import log as logger, Module
 
 import config
+from evaluation.evaluation_store import evaluation_store
+from evaluation.renderer import render_model_evaluation
+from metrics.metrics import metrics, CONTENT_TYPE
+from metrics.tracing import tracer, Trace, TRACE_HEADER
 from ml_retrainer import re_trainer
+from model_store import model_store
+from responses.response_layer import response_layer
 
 app = Flask(__name__)
 CORS(app, origins=['*'])
+response_layer.init_app(app)
+startup_seconds: Optional[float] = None
 
 
 def _get_route_dict(
@@ -48,16 +64,33 @@ def predict():
         return jsonify({
             'error': 'Invalid data provided.'
         }), 400
-    predictions = re_trainer.predict([float(n) for n in data])
+    trace: Trace = tracer.start(trace_id=request.headers.get(TRACE_HEADER))
+    predictions = re_trainer.predict([float(n) for n in data], trace=trace)
+    tracer.finish(trace)
     return jsonify({
         'predictions': predictions
     }), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+
+@app.route('/debug/traces', methods=['GET'])
+def get_traces():
+    limit = request.args.get('limit', default=100, type=int)
+    return jsonify({
+        'summary': tracer.get_summary(),
+        'traces': tracer.get_traces(limit)
+    }), 200
+
+
 @app.route('/healthcheck', methods=['GET'])
 def healthcheck():
     return jsonify({
-        'status': 'ok'
+        'status': 'ok',
+        'startup_seconds': startup_seconds
     }), 200
 
 
@@ -69,12 +102,15 @@ def persist_new_data():
             return jsonify({
                 'error': 'No data provided.'
             }), 200
+        trace: Trace = tracer.start(trace_id=request.headers.get(TRACE_HEADER))
         re_trainer.add_data(
             data['data'],
             data['substance'],
             data['quantity'],
-            data.get('humidity', '0')
+            data.get('humidity', '0'),
+            trace=trace
         )
+        tracer.finish(trace)
         return jsonify({
             'status': 'ok'
         }), 200
@@ -85,9 +121,32 @@ def persist_new_data():
         }), 200
 
 
+def _persist_initial_db_file():
+    """
+    Streams the backend database snapshot sent as request body to a temporary file and loads it.
+    """
+    handle, filename = tempfile.mkstemp(suffix='.db')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            shutil.copyfileobj(request.stream, f, 1024 * 1024)
+            size: int = f.tell()
+        if not size:
+            return jsonify({
+                'error': 'No data provided.'
+            }), 200
+        re_trainer.persist_from_db_file(filename)
+        return jsonify({
+            'status': 'ok'
+        }), 200
+    finally:
+        os.remove(filename)
+
+
 @app.route('/initial-data', methods=['POST'])
 def persist_initial_data():
     try:
+        if request.mimetype == 'application/octet-stream':
+            return _persist_initial_db_file()
         database = request.json['data']
         if database is None or database == []:
             return jsonify({
@@ -104,6 +163,66 @@ def persist_initial_data():
         }), 200
 
 
+@app.route('/models', methods=['GET'])
+def get_model_generations():
+    return jsonify({
+        'generations': model_store.get_generations()
+    }), 200
+
+
+@app.route('/models/rollback', methods=['POST'])
+def rollback_models():
+    try:
+        generation = model_store.rollback()
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    return jsonify({
+        'status': 'ok',
+        'version': generation.version
+    }), 200
+
+
+@app.route('/evaluations', methods=['GET'])
+def get_evaluations():
+    return jsonify({
+        'runs': evaluation_store.get_runs()
+    }), 200
+
+
+@app.route('/evaluations/<run_id>', methods=['GET'])
+def get_evaluation(run_id: str):
+    try:
+        run = evaluation_store.get_run(run_id)
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    if run is None:
+        return jsonify({
+            'error': 'Evaluation run not found.'
+        }), 404
+    return jsonify(run), 200
+
+
+@app.route('/evaluations/<run_id>/<model_name>/confusion-matrix', methods=['GET'])
+def render_confusion_matrix(run_id: str, model_name: str):
+    try:
+        evaluation = evaluation_store.get_model_evaluation(run_id, model_name)
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    if evaluation is None:
+        return jsonify({
+            'error': 'Model evaluation not found.'
+        }), 404
+    dpi: int = request.args.get('dpi', default=100, type=int)
+    image: bytes = render_model_evaluation(evaluation, dpi=max(50, min(dpi, 300)))
+    return send_file(io.BytesIO(image), mimetype='image/png')
+
+
 @app.route('/', methods=['GET'])
 def index():
     return jsonify([
@@ -123,7 +242,33 @@ def index():
                         'predicted_label': 'Label predicted by the model.'
                     }
                 ]
-            })
+            }),
+        _get_route_dict('/metrics', desc='Prediction and training metrics in the Prometheus text format.'),
+        _get_route_dict(
+            '/debug/traces',
+            desc='Spans of the recent /new and /predict requests (matched to backend frames by X-Trace-Id).',
+            params={
+                'limit': '(Optional) Maximum number of traces, default: 100.'
+            }
+        ),
+        _get_route_dict('/models', desc='Lists the retained model generations (newest/active first).'),
+        _get_route_dict(
+            '/models/rollback',
+            desc='Discards the active model generation and re-activates the previous one.',
+            method='POST'
+        ),
+        _get_route_dict('/evaluations', desc='Lists the stored training run evaluations (newest first).'),
+        _get_route_dict(
+            '/evaluations/<run_id>',
+            desc='Label distributions, confusion matrices and classification reports of a training run.'
+        ),
+        _get_route_dict(
+            '/evaluations/<run_id>/<model_name>/confusion-matrix',
+            desc='Renders the confusion matrix of a model in a training run as PNG.',
+            params={
+                'dpi': '(Optional) Image resolution, default: 100.'
+            }
+        )
     ])
 
 
@@ -131,4 +276,7 @@ if __name__ == '__main__':
     if '-m' in sys.argv:
         logger.info('Running in standalone mode.', module=Module.MAIN)
         config.STANDALONE_EXEC = True
+    config.log_config()
+    startup_seconds = round(time.monotonic() - STARTUP_BEGIN, 3)
+    logger.info(f'Service ready after {startup_seconds}s.', module=Module.MAIN)
     waitress.serve(app, host='0.0.0.0', port=9090)
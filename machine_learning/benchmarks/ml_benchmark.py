@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Training and inference benchmark of the ML service.
+
+Generates synthetic backend databases (64 channels, experiments of alternating air / substance exposures like
+real recordings) and measures per dataset size and model:
+- persist_from_db_data import time (the /initial-data path, including re-labelling),
+- ReTrainer._train_models wall time and peak resident memory,
+- the selected number of trees (OOB selection of the random forest, boosting rounds of XGBoost),
+- /predict latency (single calls through the Flask app) and batched adapter prediction latency.
+
+Every (size, model) pair runs in a fresh process so memory peaks are not shared. Results are written to CSV.
+The models are trained on the raw 64 channels (COMPUTE_AVERAGES, ENABLE_HUMIDITY and HUMIDITY_ONLY are disabled),
+the feature layout /predict receives, so the single-call latencies measure real predictions.
+
+Usage (from the machine_learning directory):
+    python -m benchmarks.ml_benchmark --sizes 1000 5000 20000 --models KNN RF XGB
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import platform
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+ML_SERVICE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR: str = os.path.join(ML_SERVICE_DIR, 'benchmarks', 'results')
+SUBSTANCES: Dict[str, str] = {'domol': '10mu', 'octeniderm': '20mu', 'ethanol': '10mu'}
+CSV_FIELDS: List[str] = [
+    'commit', 'timestamp', 'samples', 'model', 'error', 'import_seconds', 'train_seconds', 'train_samples',
+    'rss_before_mb', 'peak_rss_mb', 'n_estimators', 'predict_p50_ms', 'predict_p99_ms', 'predict_answered'
+]
+
+
+def generate_backend_db(path: str, samples: int, seed: int = 1) -> None:
+    """
+    Writes a synthetic backend database (Data and Substance tables).
+
+    Each experiment alternates air and substance exposures. During an exposure the sensor response approaches
+    the substance's channel signature (and the humidity rises), afterwards it decays back to the baseline.
+    :param path: the database file.
+    :param samples: the number of data rows.
+    :param seed: the random seed.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    baselines = rng.uniform(50, 500, 64)
+    signatures: Dict[str, Any] = {substance: rng.normal(0, 0.08, 64) for substance in SUBSTANCES}
+    substance_ids: Dict[str, str] = {substance: str(i + 2) for i, substance in enumerate(SUBSTANCES)}
+    conn: sqlite3.Connection = sqlite3.connect(path)
+    conn.execute('CREATE TABLE Data (ID INTEGER PRIMARY KEY AUTOINCREMENT, TEST_ID TEXT NOT NULL, '
+                 'MAC_ADDRESS TEXT NOT NULL, SUBSTANCE_ID TEXT NOT NULL, DATETIME DATE NOT NULL, '
+                 + ', '.join(f'DATA_{i} TEXT NOT NULL' for i in range(64))
+                 + ', TEMPERATURE TEXT NOT NULL, HUMIDITY TEXT NOT NULL);')
+    conn.execute('CREATE TABLE Substance (ID INTEGER PRIMARY KEY AUTOINCREMENT, SUBSTANCE_NAME TEXT NOT NULL, '
+                 'QUANTITY TEXT NOT NULL);')
+    conn.execute('INSERT INTO Substance VALUES (1, ?, ?)', ['air', ''])
+    for substance, quantity in SUBSTANCES.items():
+        conn.execute('INSERT INTO Substance VALUES (?, ?, ?)', [substance_ids[substance], substance, quantity])
+
+    rows: List[List[Any]] = []
+    timestamp: datetime = datetime(2025, 1, 1)
+    experiment: int = 0
+    while len(rows) < samples:
+        experiment += 1
+        drift = np.zeros(64)
+        level: float = 0
+        for _ in range(int(rng.integers(3, 8))):
+            substance: str = str(rng.choice(list(SUBSTANCES)))
+            for label, length, target in (('air', rng.integers(20, 60), 0.0), (substance, rng.integers(30, 120), 1.0)):
+                for _ in range(int(length)):
+                    level += (target - level) / 8
+                    drift += rng.normal(0, 0.0005, 64)
+                    signature = signatures[substance]
+                    values = baselines * (1 + level * signature + drift + rng.normal(0, 0.01, 64))
+                    humidity: float = 40 + 12 * level + rng.normal(0, 0.3)
+                    rows.append([
+                        f'bench-experiment-{experiment}', 'BE:NC:HM:AR:K0:00',
+                        '1' if label == 'air' else substance_ids[substance],
+                        timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                        *[f'{value:.2f}' for value in values],
+                        f'{24.5 + rng.normal(0, 0.05):.2f}', f'{humidity:.2f}'
+                    ])
+                    timestamp += timedelta(seconds=1.8)
+    conn.executemany(f'INSERT INTO Data VALUES (NULL, {", ".join("?" * 70)})', rows[:samples])
+    conn.commit()
+    conn.close()
+
+
+def _rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _percentile_ms(values: List[float], percentile: int) -> float:
+    if len(values) == 1:
+        return round(values[0] * 1000, 3)
+    return round(statistics.quantiles(values, n=100, method='inclusive')[percentile - 1] * 1000, 3)
+
+
+def run_single(
+        backend_db: str,
+        model: str,
+        predict_calls: int,
+        batch_sizes: List[int],
+        work_dir: str
+) -> Dict[str, Any]:
+    """
+    Benchmarks one model on one dataset in this process (the environment is prepared by run_benchmark).
+    :return: the results.
+    """
+    import config
+    config.DATABASE_FILE_PATH = os.path.join(work_dir, 'ml.db')
+    config.ENABLED_MODELS = [model]
+    config.TRAINING_WORKERS = 1
+    from ml_retrainer import re_trainer
+    from model.models import SampleGroup
+    from model_store import model_store
+    from persistence.database_handler import database_handler
+
+    with open(backend_db, 'rb') as f:
+        data: str = base64.b64encode(f.read()).decode('utf-8')
+    start: float = time.perf_counter()
+    database_handler.persist_from_db_data(data, re_label=True)
+    import_seconds: float = time.perf_counter() - start
+    del data
+
+    rss_before: float = _rss_mb()
+    start = time.perf_counter()
+    classifiers = re_trainer._train_models(
+        enable_quantities=config.ENABLE_QUANTITIES,
+        balance=config.BALANCE_DATASET,
+        balance_strategy=config.BALANCE_STRATEGY,
+        humidity_as_a_feature=config.ENABLE_HUMIDITY,
+        average_values_across_sensors=config.COMPUTE_AVERAGES,
+        use_only_humidity=config.HUMIDITY_ONLY
+    )
+    train_seconds: float = time.perf_counter() - start
+    peak_rss: float = _peak_rss_mb()
+    result: Dict[str, Any] = {
+        'model': model,
+        'import_seconds': round(import_seconds, 3),
+        'train_seconds': round(train_seconds, 3),
+        'rss_before_mb': round(rss_before, 1),
+        'peak_rss_mb': round(peak_rss, 1)
+    }
+    if model not in classifiers:
+        result['error'] = 'training failed, see the log'
+        return result
+    classifier = classifiers[model]
+    result['n_estimators'] = classifier.n_estimators
+    model_store.publish(classifiers)
+
+    samples = re_trainer._get_available_data(enable_quantities=config.ENABLE_QUANTITIES)
+    result['train_samples'] = len(samples)
+    from app import app
+    client = app.test_client()
+    latencies: List[float] = []
+    answered: int = 0
+    for i in range(predict_calls):
+        sample = samples[i * 7919 % len(samples)]
+        start = time.perf_counter()
+        response = client.post('/predict', json={'data': sample.data})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            result['error'] = f'/predict returned {response.status_code}'
+            return result
+        answered += model in response.get_json()['predictions']
+    # /predict passes the raw 64 values, models trained on another feature layout can't answer them
+    result['predict_answered'] = round(answered / predict_calls, 3)
+    if answered:
+        result['predict_p50_ms'] = _percentile_ms(latencies, 50)
+        result['predict_p99_ms'] = _percentile_ms(latencies, 99)
+
+    # Batched calls skip the HTTP layer and use the feature layout the models were trained on
+    features, _ = re_trainer._prepare_balanced_data(
+        [SampleGroup(label='benchmark', samples=samples)],
+        balance=False,
+        enable_humidity=config.ENABLE_HUMIDITY,
+        average_values_across_sensors=config.COMPUTE_AVERAGES,
+        use_only_humidity=config.HUMIDITY_ONLY
+    )
+    for batch_size in batch_sizes:
+        batch: List[List[float]] = [features[(i * 7919) % len(features)] for i in range(batch_size)]
+        timings: List[float] = []
+        for _ in range(max(3, 50 // batch_size)):
+            start = time.perf_counter()
+            classifier.predict(batch)
+            timings.append(time.perf_counter() - start)
+        median: float = statistics.median(timings)
+        result[f'batch_{batch_size}_ms'] = round(median * 1000, 3)
+        result[f'batch_{batch_size}_per_sample_us'] = round(median / batch_size * 1e6, 1)
+    return result
+
+
+def run_benchmark(
+        backend_db: str,
+        model: str,
+        predict_calls: int,
+        batch_sizes: List[int],
+        log_level: str
+) -> Dict[str, Any]:
+    """
+    Runs one model on one dataset in a fresh process.
+    """
+    with tempfile.TemporaryDirectory(prefix='ml-benchmark-') as tmp:
+        env: Dict[str, str] = {
+            **os.environ,
+            'LOGFILE': os.path.join(tmp, 'benchmark.log'),
+            'LOG_LEVEL': log_level,
+            'EVALUATION_DIR': os.path.join(tmp, 'evaluations'),
+            'ENABLED_MODELS': model,
+            'TRAINING_WORKERS': '1',
+            'TRACE_BUFFER_SIZE': '0',
+            # the feature layout of /predict
+            'COMPUTE_AVERAGES': 'false',
+            'ENABLE_HUMIDITY': 'false',
+            'HUMIDITY_ONLY': 'false'
+        }
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.ml_benchmark', '--single', backend_db, model, tmp,
+             '--predict-calls', str(predict_calls), '--batch-sizes', *[str(size) for size in batch_sizes]],
+            cwd=ML_SERVICE_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        return {'model': model, 'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else
+                f'exit code {result.returncode}'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ML_SERVICE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Training and inference benchmark of the ML service.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help='dataset sizes (rows)')
+    parser.add_argument('--models', nargs='+', default=['KNN', 'RF', 'XGB'], help='models to benchmark')
+    parser.add_argument('--predict-calls', type=int, default=200, help='single /predict calls per model')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32, 256], help='batched predict sizes')
+    parser.add_argument('--seed', type=int, default=1, help='dataset random seed')
+    parser.add_argument('--log-level', default='silent', help='LOG_LEVEL during the benchmark')
+    parser.add_argument('--csv', default=None, help='result file, default: benchmarks/results/<commit>.csv')
+    parser.add_argument('--single', nargs=3, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        backend_db, model, work_dir = args.single
+        print(json.dumps(run_single(backend_db, model.upper(), args.predict_calls, args.batch_sizes, work_dir)))
+        return
+
+    commit: Optional[str] = _git_commit()
+    timestamp: str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    fields: List[str] = CSV_FIELDS + [f'batch_{size}_{unit}' for size in args.batch_sizes
+                                      for unit in ('ms', 'per_sample_us')]
+    rows: List[Dict[str, Any]] = []
+    print(f'Python {platform.python_version()} on {platform.machine()} with {os.cpu_count()} CPUs', flush=True)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix='ml-benchmark-data-') as tmp:
+            backend_db: str = os.path.join(tmp, 'backend.db')
+            generate_backend_db(backend_db, size, seed=args.seed)
+            for model in args.models:
+                print(f'Benchmarking {model} with {size} samples...', flush=True)
+                row: Dict[str, Any] = run_benchmark(
+                    backend_db, model.upper(), args.predict_calls, args.batch_sizes, args.log_level
+                )
+                row.update({'commit': commit, 'timestamp': timestamp, 'samples': size})
+                if 'error' in row:
+                    print(f'  failed: {row["error"]}', flush=True)
+                else:
+                    print(f'  import {row["import_seconds"]}s, train {row["train_seconds"]}s, '
+                          f'peak {row["peak_rss_mb"]} MiB, trees {row.get("n_estimators")}, '
+                          f'/predict p50 {row.get("predict_p50_ms")} ms p99 {row.get("predict_p99_ms")} ms', flush=True)
+                    if row['predict_answered'] < 1:
+                        print(f'  warning: {model} answered {row["predict_answered"]:.0%} of the /predict calls '
+                              f'(feature layout differs from the raw 64 values)', flush=True)
+                rows.append(row)
+
+    output: str = args.csv or os.path.join(
+        RESULTS_DIR, f'ml-{commit or "unknown"}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.csv'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@
 import os
 import dotenv
 
-from typing import Optional
+from typing import Optional, List
 from logging_framework.log_handler import log, Module
 
 from ml_adapters.abstract_ml_adapter import SampleStrategy
@@ -18,10 +18,56 @@ BALANCE_STRATEGY: str | SampleStrategy = os.getenv('BALANCE_STRATEGY', 'UNDERSAM
 ENABLE_HUMIDITY: bool | str = os.getenv('ENABLE_HUMIDITY', True)
 COMPUTE_AVERAGES: bool | str = os.getenv('COMPUTE_AVERAGES', True)
 HUMIDITY_ONLY: bool | str = os.getenv('HUMIDITY_ONLY', False)  # Experimental
+ENABLED_MODELS: str | List[str] = os.getenv('ENABLED_MODELS', 'KNN,RF')
+INCREMENTAL_BATCH_SIZE: int | str = os.getenv('INCREMENTAL_BATCH_SIZE')
+TRAINING_WORKERS: int | str = os.getenv('TRAINING_WORKERS')
+EVALUATION_DIR: str = os.getenv('EVALUATION_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'evaluations'
+)
+EVALUATION_RETENTION: int | str = os.getenv('EVALUATION_RETENTION')
+RETAINED_MODEL_GENERATIONS: int | str = os.getenv('RETAINED_MODEL_GENERATIONS')
+TRACE_BUFFER_SIZE: int | str = os.getenv('TRACE_BUFFER_SIZE')
+TRACE_SAMPLE_RATE: float | str = os.getenv('TRACE_SAMPLE_RATE')
+RESPONSE_COMPRESSION: bool | str = os.getenv('RESPONSE_COMPRESSION', True)
+RESPONSE_COMPRESSION_MIN_SIZE: int | str = os.getenv('RESPONSE_COMPRESSION_MIN_SIZE')
+RESPONSE_COMPRESSION_LEVEL: int | str = os.getenv('RESPONSE_COMPRESSION_LEVEL')
+RESPONSE_ETAGS: bool | str = os.getenv('RESPONSE_ETAGS', True)
 try:
     RE_TRAINING_RATE = int(RE_TRAINING_RATE)
 except Exception:
     RE_TRAINING_RATE = 100
+try:
+    INCREMENTAL_BATCH_SIZE = int(INCREMENTAL_BATCH_SIZE)
+except Exception:
+    INCREMENTAL_BATCH_SIZE = 10
+try:
+    TRAINING_WORKERS = int(TRAINING_WORKERS)
+except Exception:
+    TRAINING_WORKERS = os.cpu_count() or 1
+try:
+    EVALUATION_RETENTION = int(EVALUATION_RETENTION)
+except Exception:
+    EVALUATION_RETENTION = 20
+try:
+    RETAINED_MODEL_GENERATIONS = int(RETAINED_MODEL_GENERATIONS)
+except Exception:
+    RETAINED_MODEL_GENERATIONS = 2
+try:
+    TRACE_BUFFER_SIZE = int(TRACE_BUFFER_SIZE)
+except Exception:
+    TRACE_BUFFER_SIZE = 1000
+try:
+    TRACE_SAMPLE_RATE = float(TRACE_SAMPLE_RATE)
+except Exception:
+    TRACE_SAMPLE_RATE = 1
+try:
+    RESPONSE_COMPRESSION_MIN_SIZE = int(RESPONSE_COMPRESSION_MIN_SIZE)
+except Exception:
+    RESPONSE_COMPRESSION_MIN_SIZE = 1024
+try:
+    RESPONSE_COMPRESSION_LEVEL = int(RESPONSE_COMPRESSION_LEVEL)
+except Exception:
+    RESPONSE_COMPRESSION_LEVEL = 6
 
 
 def parse_boolean(value: Optional[str] | bool) -> bool:
@@ -32,6 +78,12 @@ def parse_boolean(value: Optional[str] | bool) -> bool:
     return 'true' in value.lower()
 
 
+def parse_list(value: Optional[str]) -> List[str]:
+    if value is None:
+        return []
+    return [item.strip().upper() for item in value.split(',') if len(item.strip())]
+
+
 def parse_sample_strategy(value: str) -> SampleStrategy:
     if value is None:
         return SampleStrategy.OVERSAMPLE
@@ -45,18 +97,32 @@ BALANCE_DATASET = parse_boolean(BALANCE_DATASET)
 ENABLE_HUMIDITY = parse_boolean(ENABLE_HUMIDITY)
 COMPUTE_AVERAGES = parse_boolean(COMPUTE_AVERAGES)
 HUMIDITY_ONLY = parse_boolean(HUMIDITY_ONLY)
+RESPONSE_COMPRESSION = parse_boolean(RESPONSE_COMPRESSION)
+RESPONSE_ETAGS = parse_boolean(RESPONSE_ETAGS)
 BALANCE_STRATEGY = parse_sample_strategy(BALANCE_STRATEGY)
+ENABLED_MODELS = parse_list(ENABLED_MODELS)
+
+
+def log_config() -> None:
+    """
+    Logs the active configuration. Called on service start rather than at import time.
+    """
+    log.info(
+        'Running ML Adapter with configs:',
+        '\nRe-Training Rate:', RE_TRAINING_RATE,
+        '\nQuantities enabled:', ENABLE_QUANTITIES,
+        '\nBalancing enabled:', BALANCE_DATASET,
+        '\nBalance strategy:', BALANCE_STRATEGY,
+        '\nHumidity enabled:', ENABLE_HUMIDITY,
+        '\nCompute Averages:', COMPUTE_AVERAGES,
+        '\nHumidity only (Experimental):', HUMIDITY_ONLY,
+        '\nEnabled models:', ENABLED_MODELS,
+        '\nIncremental batch size:', INCREMENTAL_BATCH_SIZE,
+        '\nTraining workers:', TRAINING_WORKERS,
+        '\nEvaluation runs retained:', EVALUATION_RETENTION,
+        '\nModel generations retained:', RETAINED_MODEL_GENERATIONS,
+        module=Module.SETUP
+    )
 
-log.info(
-    'Running ML Adapter with configs:',
-    '\nRe-Training Rate:', RE_TRAINING_RATE,
-    '\nQuantities enabled:', ENABLE_QUANTITIES,
-    '\nBalancing enabled:', BALANCE_DATASET,
-    '\nBalance strategy:', BALANCE_STRATEGY,
-    '\nHumidity enabled:', ENABLE_HUMIDITY,
-    '\nCompute Averages:', COMPUTE_AVERAGES,
-    '\nHumidity only (Experimental):', HUMIDITY_ONLY,
-    module=Module.SETUP
-)
 
 STANDALONE_EXEC: bool = False
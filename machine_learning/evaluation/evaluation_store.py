@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import config
+from logging_framework.log_handler import Module, log
+
+
+class EvaluationStore:
+    """
+    Persists the evaluation artefacts (confusion matrices, classification reports) of training runs as JSON.
+    Layout: {EVALUATION_DIR}/{run_id}/run.json and {EVALUATION_DIR}/{run_id}/{model_name}.json
+    Rendering is done on demand, see evaluation.renderer.
+    """
+
+    RUN_FILE: str = 'run.json'
+    _VALID_NAME: re.Pattern = re.compile(r'^[A-Za-z0-9_\-]+$')
+
+    @staticmethod
+    def _write_json(path: str, content: Dict[str, Any]) -> None:
+        """
+        Writes the given content atomically to the given path.
+        """
+        temp_path: str = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(content, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _read_json(path: str) -> Dict[str, Any]:
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _get_run_dir(self, run_id: str) -> str:
+        """
+        Get the directory of a given run.
+        :param run_id: the run id.
+        :return: the run directory.
+        :raise ValueError: if the run id is invalid.
+        """
+        if not self._VALID_NAME.match(run_id):
+            raise ValueError(f'Invalid run id "{run_id}".')
+        return os.path.join(config.EVALUATION_DIR, run_id)
+
+    def _prune(self) -> None:
+        """
+        Deletes the oldest runs exceeding the configured retention.
+        """
+        runs: List[str] = self.get_runs()
+        for run_id in runs[config.EVALUATION_RETENTION:]:
+            shutil.rmtree(self._get_run_dir(run_id), ignore_errors=True)
+            log.debug(f'Deleted evaluation run {run_id}.', module=Module.EVAL)
+
+    @staticmethod
+    def new_run_id() -> str:
+        """
+        Creates a new, chronologically sortable run id.
+        :return: the run id.
+        """
+        return datetime.now().strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+
+    def save_run(self, run_id: str, y_train: List[str], y_test: List[str]) -> None:
+        """
+        Saves the metadata of a training run.
+        :param run_id: the run id.
+        :param y_train: the training labels.
+        :param y_test: the test labels.
+        :return:
+        """
+        run_dir: str = self._get_run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        self._write_json(os.path.join(run_dir, self.RUN_FILE), {
+            'run_id': run_id,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'train_distribution': dict(Counter(y_train)),
+            'test_distribution': dict(Counter(y_test)),
+        })
+        log.debug('Train label distribution:', dict(Counter(y_train)), module=Module.EVAL)
+        log.debug('Test label distribution:', dict(Counter(y_test)), module=Module.EVAL)
+        self._prune()
+
+    def save_model_evaluation(
+            self,
+            run_id: str,
+            model_name: str,
+            y_true: List[str],
+            y_pred: List[str],
+            labels: List[str]
+    ) -> None:
+        """
+        Computes and saves the confusion matrix and classification report of a trained model.
+        :param run_id: the run id.
+        :param model_name: the name of the model.
+        :param y_true: the actual test labels.
+        :param y_pred: the labels predicted by the model.
+        :param labels: the class labels learned by the model.
+        :return:
+        """
+        from sklearn.metrics import classification_report, confusion_matrix
+
+        if not self._VALID_NAME.match(model_name):
+            raise ValueError(f'Invalid model name "{model_name}".')
+        labels = [str(label) for label in labels]
+        cm = confusion_matrix(y_true, y_pred, labels=labels)
+        report: Dict[str, Any] = classification_report(y_true, y_pred, digits=3, output_dict=True, zero_division=0)
+        run_dir: str = self._get_run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        self._write_json(os.path.join(run_dir, f'{model_name}.json'), {
+            'model_name': model_name,
+            'labels': labels,
+            'confusion_matrix': cm.tolist(),
+            'report': report,
+        })
+        log.info(f'{model_name} accuracy: {report.get("accuracy", 0):.3f} (run {run_id})', module=Module.EVAL)
+
+    def get_runs(self) -> List[str]:
+        """
+        Get all stored run ids, newest first.
+        :return: the run ids.
+        """
+        if not os.path.isdir(config.EVALUATION_DIR):
+            return []
+        return sorted([
+            run_id for run_id in os.listdir(config.EVALUATION_DIR)
+            if self._VALID_NAME.match(run_id) and os.path.isdir(os.path.join(config.EVALUATION_DIR, run_id))
+        ], reverse=True)
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the metadata and model evaluations of a run.
+        :param run_id: the run id.
+        :return: the run data, or None if the run does not exist.
+        """
+        run_dir: str = self._get_run_dir(run_id)
+        run_file: str = os.path.join(run_dir, self.RUN_FILE)
+        if not os.path.isfile(run_file):
+            return None
+        run: Dict[str, Any] = self._read_json(run_file)
+        run['models'] = {}
+        for filename in sorted(os.listdir(run_dir)):
+            if filename == self.RUN_FILE or not filename.endswith('.json'):
+                continue
+            evaluation: Dict[str, Any] = self._read_json(os.path.join(run_dir, filename))
+            run['models'][evaluation['model_name']] = evaluation
+        return run
+
+    def get_model_evaluation(self, run_id: str, model_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the evaluation of a single model in a run.
+        :param run_id: the run id.
+        :param model_name: the name of the model.
+        :return: the model evaluation, or None if it does not exist.
+        """
+        if not self._VALID_NAME.match(model_name):
+            raise ValueError(f'Invalid model name "{model_name}".')
+        path: str = os.path.join(self._get_run_dir(run_id), f'{model_name}.json')
+        if not os.path.isfile(path):
+            return None
+        return self._read_json(path)
+
+
+evaluation_store: EvaluationStore = EvaluationStore()
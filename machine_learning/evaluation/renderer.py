@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Renders stored evaluation artefacts on demand.
+
+Usage:
+    python -m evaluation.renderer [run_id] [-o output_dir]
+
+Renders the confusion matrices of all models in the given run (default: latest run) as PNG files.
+"""
+import argparse
+import io
+import os
+from typing import List, Dict, Any
+
+from evaluation.evaluation_store import evaluation_store
+from logging_framework.log_handler import Module, log
+
+
+def render_confusion_matrix(
+        cm: List[List[int]],
+        labels: List[str],
+        title: str = 'Substance Classifier Confusion Matrix',
+        dpi: int = 300
+) -> bytes:
+    """
+    Renders a confusion matrix as a PNG image.
+    :param cm: the confusion matrix.
+    :param labels: the class labels.
+    :param title: the chart title.
+    :param dpi: the image resolution.
+    :return: the PNG image data.
+    """
+    # No pyplot: its global figure manager is not thread-safe, renders may run in parallel request threads
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    cm = np.asarray(cm)
+    fig = Figure(figsize=(6, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    im = ax.imshow(cm, interpolation="nearest", cmap='Blues')
+
+    # Title and colorbar
+    ax.set_title(title)
+    fig.colorbar(im, ax=ax)
+
+    # Tick marks and labels
+    tick_marks = np.arange(len(labels))
+    ax.set_xticks(tick_marks)
+    ax.set_xticklabels(labels, rotation=45, ha="right")
+    ax.set_yticks(tick_marks)
+    ax.set_yticklabels(labels)
+
+    # Annotate cells
+    thresh = cm.max() / 2.0 if cm.size else 0
+    for i in range(cm.shape[0]):
+        for j in range(cm.shape[1]):
+            ax.text(
+                j, i, format(cm[i, j], "d"),
+                ha="center", va="center",
+                color="white" if cm[i, j] > thresh else "black"
+            )
+
+    ax.set_ylabel("True label")
+    ax.set_xlabel("Predicted label")
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def render_model_evaluation(evaluation: Dict[str, Any], dpi: int = 300) -> bytes:
+    """
+    Renders the confusion matrix of a stored model evaluation.
+    :param evaluation: the model evaluation, see EvaluationStore.get_model_evaluation.
+    :param dpi: the image resolution.
+    :return: the PNG image data.
+    """
+    return render_confusion_matrix(
+        evaluation['confusion_matrix'],
+        evaluation['labels'],
+        title=f"{evaluation['model_name']} Substance Classifier Confusion Matrix",
+        dpi=dpi
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Render stored evaluation artefacts.')
+    parser.add_argument('run_id', nargs='?', help='the run to render (default: latest).')
+    parser.add_argument('-o', '--output', default='.', help='output directory.')
+    args = parser.parse_args()
+    run_id: str = args.run_id
+    if run_id is None:
+        runs: List[str] = evaluation_store.get_runs()
+        if not len(runs):
+            log.error('No evaluation runs found.', module=Module.EVAL)
+            return
+        run_id = runs[0]
+    run = evaluation_store.get_run(run_id)
+    if run is None:
+        log.error(f'Evaluation run {run_id} not found.', module=Module.EVAL)
+        return
+    os.makedirs(args.output, exist_ok=True)
+    for model_name, evaluation in run['models'].items():
+        filename: str = os.path.join(args.output, f'{model_name}_confusion_matrix_substances.png')
+        with open(filename, 'wb') as f:
+            f.write(render_model_evaluation(evaluation))
+        log.info(f'Confusion matrix saved to {filename}', module=Module.EVAL)
+
+
+if __name__ == '__main__':
+    main()
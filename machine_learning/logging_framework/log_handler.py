@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
+import atexit
 import os
+import queue
+import sys
+import threading
+import time
 from enum import Enum
-from typing import TextIO, Optional
+from typing import TextIO, Optional, Dict, List, Tuple, Any
 
 from loguru import logger
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
 LOGFILE: str = os.getenv('LOGFILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'application.log')
 LOG_LEVEL: str = os.getenv('LOG_LEVEL') or 'DEBUG'
+# Maximum number of queued messages before messages are dropped (0 logs synchronously, without a writer thread)
+LOG_QUEUE_SIZE: int = _env_int('LOG_QUEUE_SIZE', 10000)
+# Maximum number of messages written per logfile flush
+LOG_BATCH_SIZE: int = _env_int('LOG_BATCH_SIZE', 256)
+# Logfile rotation size in bytes (0 disables rotation) and number of kept rotated files
+LOG_MAX_BYTES: int = _env_int('LOG_MAX_BYTES', 10 * 1024 * 1024)
+LOG_BACKUP_COUNT: int = _env_int('LOG_BACKUP_COUNT', 5)
+# Time error messages wait for space in a full queue before they are dropped too
+LOG_ERROR_BLOCK_SECONDS: float = 1
 
 
 class Module(Enum):
@@ -19,6 +41,9 @@ class Module(Enum):
     RF = 'Random Forest Classifier'
     PRE = 'Pre-Trainer'
     XGB = 'XG-Boost'
+    SGD = 'SGD Classifier'
+    EVAL = 'Evaluation'
+    STORE = 'Model Store'
 
 
 class LogType(Enum):
@@ -29,6 +54,25 @@ class LogType(Enum):
 
 
 class Logger:
+    """
+    Logs to the console (loguru) and the logfile.
+
+    Messages are put on a bounded queue and formatted and written by a single writer thread, so logging never
+    blocks the calling thread on I/O. The logfile is flushed once per batch and rotated once it exceeds
+    LOG_MAX_BYTES. If the queue is full, debug, info and warning messages are dropped (and counted) while
+    error messages wait up to LOG_ERROR_BLOCK_SECONDS for space.
+
+    The caller (module, function, line) and the text of non-primitive arguments are captured when the message is
+    enqueued, so the console shows the original call site and objects changed after the call are logged as they were.
+    """
+
+    # Log level required for each message type, see __get_log_level
+    __LEVELS: Dict[LogType, int] = {LogType.ERROR: -1, LogType.INFO: 0, LogType.WARN: 1, LogType.DEBUG: 2}
+    __SINKS: Dict[LogType, str] = {
+        LogType.ERROR: 'ERROR', LogType.INFO: 'INFO', LogType.WARN: 'WARNING', LogType.DEBUG: 'DEBUG'
+    }
+    __STOP: object = object()
+    __PRIMITIVES: tuple = (str, int, float, bool, type(None))
 
     @staticmethod
     def __get_log_level() -> int:
@@ -57,6 +101,47 @@ class Logger:
     def __handle_args(*args) -> str:
         return ' '.join([str(val) for val in args])
 
+    @classmethod
+    def __snapshot(cls, value: Any) -> Any:
+        """
+        Converts a non-primitive value to its text at the time of the call.
+        :param value: the message or argument to log.
+        :return: the value itself if it is immutable, otherwise its str().
+        """
+        if isinstance(value, cls.__PRIMITIVES):
+            return value
+        try:
+            return str(value)
+        except Exception as e:
+            return f'<{type(value).__name__}: str() failed: {e}>'
+
+    @staticmethod
+    def __get_caller(depth: int) -> Optional[Tuple[str, str, int]]:
+        """
+        Get the call site of a log message.
+        :param depth: number of frames between the caller and this method.
+        :return: the module name, function and line of the caller.
+        """
+        try:
+            frame = sys._getframe(depth + 1)
+        except ValueError:
+            return None
+        return frame.f_globals.get('__name__', ''), frame.f_code.co_name, frame.f_lineno
+
+    @staticmethod
+    def __console_logger(caller: Optional[Tuple[str, str, int]]):
+        """
+        Get the loguru logger reporting the call site captured when the message was enqueued.
+        """
+        if caller is None:
+            return logger
+        name, function, line = caller
+
+        def patch(record: dict) -> None:
+            record.update(name=name, module=name.rpartition('.')[2], function=function, line=line)
+
+        return logger.patch(patch)
+
     def __open_fp(self) -> None:
         """
         Opens the file pointer to the specified log file.
@@ -65,17 +150,25 @@ class Logger:
             raise Exception('Logfile not specified! Running in console-mode only.')
         self.__fp: TextIO = open(LOGFILE, 'a+')
 
-    def __write_log(self, message: str, mtype: LogType) -> None:
+    def __rotate(self) -> None:
         """
-        Write logging message to logfile.
-        :param message: Message to write.
-        :param mtype: The log message type.
+        Rotates the logfile once it exceeds LOG_MAX_BYTES (application.log -> application.log.1 -> ...).
+        Regular files only, so LOGFILE=/dev/null is never rotated.
         """
-        if self.__fp is None:
+        if LOG_MAX_BYTES <= 0 or self.__fp is None or not os.path.isfile(LOGFILE):
             return
-        message = ' '.join([mtype.value, message])
-        self.__fp.write(f'{message}\n')
-        self.__fp.flush()
+        if self.__fp.tell() < LOG_MAX_BYTES:
+            return
+        self.__fp.close()
+        self.__fp = None
+        for i in range(LOG_BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(f'{LOGFILE}.{i}'):
+                os.replace(f'{LOGFILE}.{i}', f'{LOGFILE}.{i + 1}')
+        if LOG_BACKUP_COUNT > 0:
+            os.replace(LOGFILE, f'{LOGFILE}.1')
+        else:
+            os.remove(LOGFILE)
+        self.__open_fp()
 
     @staticmethod
     def __build_message(message: str, module: Module) -> str:
@@ -89,6 +182,116 @@ class Logger:
             return message
         return ' '.join([f'[{module.value}]', message])
 
+    def __format(self, record: Tuple) -> Tuple[LogType, str]:
+        mtype, message, args, module, _ = record
+        message = str(message) + ' ' + self.__handle_args(*args)
+        return mtype, self.__build_message(message=message, module=module)
+
+    def __take_dropped(self) -> int:
+        """
+        Get and reset the number of dropped messages.
+        """
+        with self.__dropped_lock:
+            dropped: int = self.__dropped
+            self.__dropped = 0
+        return dropped
+
+    def __write_batch(self, batch: List[Tuple]) -> None:
+        """
+        Formats and writes a batch of messages, flushing the logfile once.
+        """
+        dropped: int = self.__take_dropped()
+        if dropped:
+            batch.append((LogType.WARN, f'Log queue full, dropped {dropped} messages.', (), Module.LOGGER, None))
+        lines: List[str] = []
+        for record in batch:
+            try:
+                mtype, msg = self.__format(record)
+            except Exception as e:
+                mtype, msg = LogType.ERROR, self.__build_message(f'Error formatting log. Trace: {e}', Module.LOGGER)
+            self.__console_logger(record[4]).log(self.__SINKS[mtype], msg)
+            lines.append(f'{mtype.value} {msg}\n')
+        if self.__fp is None:
+            return
+        try:
+            self.__fp.write(''.join(lines))
+            self.__fp.flush()
+            self.__rotate()
+        except Exception as e:
+            logger.error('Error writing log. Trace: {}'.format(e))
+
+    def __writer_thread(self) -> None:
+        """
+        Drains the queue in batches of up to LOG_BATCH_SIZE messages.
+        """
+        while True:
+            record = self.__queue.get()
+            batch: List = []
+            stop: bool = record is self.__STOP
+            if not stop:
+                batch.append(record)
+            while not stop and len(batch) < LOG_BATCH_SIZE:
+                try:
+                    record = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self.__STOP:
+                    stop = True
+                else:
+                    batch.append(record)
+            # __write_batch may append the dropped messages warning
+            done: int = len(batch) + int(stop)
+            if len(batch) or self.__dropped:
+                self.__write_batch(batch)
+            for _ in range(done):
+                self.__queue.task_done()
+            if stop:
+                return
+
+    def __log(self, mtype: LogType, message: str, args: tuple, module: Optional[Module]) -> None:
+        """
+        Enqueues a message with its call site, formatting is deferred to the writer thread.
+        """
+        if self.__log_level < self.__LEVELS[mtype]:
+            return
+        # error/info/warning/debug -> __log
+        caller: Optional[Tuple[str, str, int]] = self.__get_caller(2)
+        record: Tuple = (mtype, self.__snapshot(message), tuple(self.__snapshot(arg) for arg in args), module, caller)
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__write_batch([record])
+            return
+        try:
+            if mtype is LogType.ERROR:
+                self.__queue.put(record, timeout=LOG_ERROR_BLOCK_SECONDS)
+            else:
+                self.__queue.put_nowait(record)
+        except queue.Full:
+            with self.__dropped_lock:
+                self.__dropped += 1
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits until the queued messages were written.
+        :param timeout: (Optional) maximum time to wait in seconds.
+        """
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        while self.__queue.unfinished_tasks and self.__thread is not None and self.__thread.is_alive():
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        """
+        Writes the queued messages and stops the writer thread (called on interpreter exit).
+        """
+        if self.__thread is None or not self.__thread.is_alive():
+            return
+        self.__queue.put(self.__STOP)
+        self.__thread.join(timeout=5)
+        if self.__fp is not None:
+            self.__fp.close()
+            self.__fp = None
+
     def error(self, message: str, *args, module: Module = None) -> None:
         """
         Log an error message.
@@ -96,10 +299,7 @@ class Logger:
         :param module: The module that logged the error.
         :return:
         """
-        message = str(message) + ' ' + self.__handle_args(*args)
-        msg = self.__build_message(message=message, module=module)
-        logger.error(msg)
-        self.__write_log(message=msg, mtype=LogType.ERROR)
+        self.__log(LogType.ERROR, message, args, module)
 
     def info(self, message: str, *args, module: Module = None) -> None:
         """
@@ -108,12 +308,7 @@ class Logger:
         :param module: The module that logged the info message.
         :return:
         """
-        if self.__log_level < 0:
-            return
-        message = str(message) + ' ' + self.__handle_args(*args)
-        msg = self.__build_message(message=message, module=module)
-        logger.info(msg)
-        self.__write_log(message=msg, mtype=LogType.INFO)
+        self.__log(LogType.INFO, message, args, module)
 
     def warning(self, message: str, *args, module: Module = None) -> None:
         """
@@ -122,12 +317,7 @@ class Logger:
         :param module: The module that logged the message.
         :return:
         """
-        if self.__log_level < 1:
-            return
-        message = str(message) + ' ' + self.__handle_args(*args)
-        msg = self.__build_message(message=message, module=module)
-        logger.warning(msg)
-        self.__write_log(message=msg, mtype=LogType.WARN)
+        self.__log(LogType.WARN, message, args, module)
 
     def debug(self, message: str, *args, module: Module = None) -> None:
         """
@@ -136,22 +326,25 @@ class Logger:
         :param module: The module that logged the message.
         :return:
         """
-        if self.__log_level < 2:
-            return
-        message = str(message) + ' ' + self.__handle_args(*args)
-        msg = self.__build_message(message=message, module=module)
-        logger.debug(msg)
-        self.__write_log(message=msg, mtype=LogType.DEBUG)
+        self.__log(LogType.DEBUG, message, args, module)
 
     def __init__(self):
         self.__fp: Optional[TextIO] = None
+        self.__queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.__dropped: int = 0
+        self.__dropped_lock: threading.Lock = threading.Lock()
+        self.__thread: Optional[threading.Thread] = None
         logger.info(self.__build_message(message='Initialising logger...', module=Module.LOGGER))
         self.__log_level = self.__get_log_level()
         try:
             self.__open_fp()
-            self.info(message='Logger initialized.', module=Module.LOGGER)
         except Exception as e:
             self.error(message=f'Error occurred! Logger running without caching. Trace: {e}', module=Module.LOGGER)
+        if LOG_QUEUE_SIZE > 0:
+            self.__thread = threading.Thread(target=self.__writer_thread, name='log-writer', daemon=True)
+            self.__thread.start()
+            atexit.register(self.close)
+        self.info(message='Logger initialized.', module=Module.LOGGER)
 
 
 log: Logger = Logger()
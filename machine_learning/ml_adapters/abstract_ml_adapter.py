@@ -39,6 +39,34 @@ class MLAdapter(ABC):
         """
         pass
 
+    def partial_fit(self, data: List[List[float]], labels: List[str]) -> None:
+        """
+        Optional: incrementally update the ML model with a new batch of labeled data.
+        Only supported by adapters where supports_partial_fit is True.
+        :param data: the new batch of training data.
+        :param labels: the labels of the new batch.
+        :return:
+        :raise NotImplementedError: if the adapter does not support incremental training.
+        :raise ValueError: if the batch contains labels the model was not trained on.
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support incremental training.')
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        """
+        Whether the adapter can be updated incrementally through partial_fit.
+        Default: False (subclasses should override if applicable).
+        """
+        return False
+
+    @property
+    def n_estimators(self) -> Optional[int]:
+        """
+        Optional: the number of trees/boosting rounds of ensemble models.
+        Default: None (subclasses should override if applicable).
+        """
+        return None
+
     @property
     def classes_(self) -> List[str]:
         """
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
+import importlib
 import uuid
 from datetime import datetime
 from typing import Dict, Any, List
 
+import config
 from logging_framework.log_handler import Module, log
 from ml_adapters.abstract_ml_adapter import MLAdapter
-from ml_adapters.knn.knn_classifier import KNNClassifier
-from ml_adapters.random_forest.random_forest_classifier import RandomForestClassifier
-# from ml_adapters.xg_boost.xg_boost_classifier import XGBoostClassifier
 
 
 class MLModelHandler:
@@ -22,6 +21,18 @@ class MLModelHandler:
         """
         return self._instances
 
+    def _load_model_class(self, ml_model: str) -> type:
+        """
+        Imports the adapter class of the given ML model type on first use.
+        Keeps sklearn/xgboost out of the service's start-up path.
+        :param ml_model: the ML model type name.
+        :return: the adapter class.
+        """
+        if ml_model not in self._loaded_models:
+            module_name, class_name = self._models[ml_model].split(':')
+            self._loaded_models[ml_model] = getattr(importlib.import_module(module_name), class_name)
+        return self._loaded_models[ml_model]
+
     def create_instance(self, ml_model: str) -> Dict[str, Any]:
         """
         Creates a ML model instance.
@@ -30,7 +41,7 @@ class MLModelHandler:
         """
         log.info(f"Creating ML model instance: {ml_model}", module=Module.ML)
         model_id: str = uuid.uuid1().hex
-        _instance: MLAdapter = self._models[ml_model]()
+        _instance: MLAdapter = self._load_model_class(ml_model)()
         _mdict = {
             'type': ml_model,
             'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -45,21 +56,24 @@ class MLModelHandler:
 
     def get_available_models(self) -> List[str]:
         """
-        Get a list of available ML models
+        Get a list of available (enabled) ML models
         :return:
         """
-        return list(self._models.keys())
+        return [model for model in self._models.keys() if model in config.ENABLED_MODELS]
 
     def __init__(self):
         """
         Default constructor.
         """
         log.info('Starting ML adapter...', module=Module.ML)
-        self._models: Dict[str, Any] = {
-            'KNN': KNNClassifier,
-            'RF': RandomForestClassifier,
-            # 'XGB': XGBoostClassifier,
+        # Adapters are referenced by import path and loaded lazily, see _load_model_class.
+        self._models: Dict[str, str] = {
+            'KNN': 'ml_adapters.knn.knn_classifier:KNNClassifier',
+            'RF': 'ml_adapters.random_forest.random_forest_classifier:RandomForestClassifier',
+            'SGD': 'ml_adapters.sgd.sgd_classifier:SGDClassifier',
+            'XGB': 'ml_adapters.xg_boost.xg_boost_classifier:XGBoostClassifier',
         }
+        self._loaded_models: Dict[str, type] = {}
         self._instances = {}
         log.info('ML adapter started.', module=Module.ML)
 
@@ -75,6 +75,13 @@ class RandomForestClassifier(MLAdapter):
         log.info('Fitting substance classifier...', module=Module.RF)
         self._clf_substance.fit(x_scaled, labels)
 
+    @property
+    def n_estimators(self) -> int:
+        """
+        The number of trees, after fit the one selected from the OOB score curve.
+        """
+        return self._clf_substance.n_estimators
+
     @property
     def classes_(self) -> List[str]:
         if hasattr(self._clf_substance, "classes_"):
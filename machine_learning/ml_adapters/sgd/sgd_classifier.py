@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+from typing import override, List
+
+from sklearn.linear_model import SGDClassifier as SkSGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from logging_framework.log_handler import Module, log
+from ml_adapters.abstract_ml_adapter import MLAdapter
+
+
+class SGDClassifier(MLAdapter):
+    """
+    Implements an incremental linear classifier trained with stochastic gradient descent.
+    The scaler keeps running statistics, so new batches can be added through partial_fit
+    without re-fitting over the full history.
+    """
+
+    def __init__(self, loss: str = 'log_loss', alpha: float = 1e-4):
+        """
+        Default constructor.
+        :param loss: the loss function used by the SGD classifier.
+        :param alpha: the regularization strength.
+        """
+        self._loss: str = loss
+        self._alpha: float = alpha
+        self._scaler: StandardScaler = StandardScaler()
+        self._clf: SkSGDClassifier = self._create_classifier()
+
+    def _create_classifier(self) -> SkSGDClassifier:
+        return SkSGDClassifier(
+            loss=self._loss,
+            alpha=self._alpha,
+            random_state=42
+        )
+
+    @override
+    def fit(self, data: List[List[float]], labels: List[str]) -> None:
+        """
+        Train the SGD classifier from scratch.
+        :param data: the training data.
+        :param labels: the training labels.
+        :return:
+        """
+        log.info('Training SGD Classifier...', module=Module.SGD)
+        log.info('Scaling data...', module=Module.SGD)
+        self._scaler = StandardScaler()
+        x_scaled = self._scaler.fit_transform(data)
+        log.info('Fitting model...', module=Module.SGD)
+        self._clf = self._create_classifier()
+        self._clf.fit(x_scaled, labels)
+
+    @override
+    def partial_fit(self, data: List[List[float]], labels: List[str]) -> None:
+        """
+        Update the scaler statistics and the classifier with a new batch.
+        :param data: the new batch of training data.
+        :param labels: the labels of the new batch.
+        :return:
+        :raise ValueError: if the model is untrained or the batch contains unknown labels.
+        """
+        if not hasattr(self._clf, 'classes_'):
+            raise ValueError('SGD classifier must be fitted before incremental updates.')
+        unknown_labels = set(labels) - set(self._clf.classes_)
+        if len(unknown_labels):
+            raise ValueError(f'Batch contains unknown labels: {sorted(unknown_labels)}')
+        log.debug('Updating SGD Classifier with batch of size', len(data), module=Module.SGD)
+        self._scaler.partial_fit(data)
+        x_scaled = self._scaler.transform(data)
+        self._clf.partial_fit(x_scaled, labels)
+
+    @override
+    def predict(self, data: List[List[float]]) -> List[str]:
+        """
+        Predict labels for given samples.
+        :param data: input data.
+        :return: predicted labels.
+        """
+        x_scaled = self._scaler.transform(data)
+        return self._clf.predict(x_scaled)
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        return True
+
+    @property
+    def classes_(self) -> List[str]:
+        if hasattr(self._clf, "classes_"):
+            return list(self._clf.classes_)
+        return []
@@ -2,7 +2,7 @@
 from typing import List
 
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.utils.class_weight import compute_sample_weight
 from sklearn.metrics import classification_report
 from xgboost import XGBClassifier
@@ -17,6 +17,7 @@ class XGBoostClassifier(MLAdapter):
     Unlike the RandomForestClassifier adapter, this does not
     split into binary steps, but directly predicts among all available classes.
     Handles class imbalance using sample weights.
+    XGBoost expects the classes as 0..n-1, so the labels are encoded before fitting and decoded on predict.
     """
 
     def __init__(self, n_estimators: int = 300, learning_rate: float = 0.1, max_depth: int = 6):
@@ -27,6 +28,7 @@ class XGBoostClassifier(MLAdapter):
         :param max_depth: maximum depth of trees.
         """
         self._scaler: StandardScaler = StandardScaler()
+        self._encoder: LabelEncoder = LabelEncoder()
         self._clf = XGBClassifier(
             n_estimators=n_estimators,
             learning_rate=learning_rate,
@@ -48,10 +50,11 @@ class XGBoostClassifier(MLAdapter):
         # Scale data
         log.info("Scaling data...", module=Module.XGB)
         x_scaled = self._scaler.fit_transform(data)
+        encoded_labels = self._encoder.fit_transform(labels)
 
         # Train/validation split
         x_train, x_val, y_train, y_val = train_test_split(
-            x_scaled, labels, test_size=0.2, stratify=labels, random_state=42
+            x_scaled, encoded_labels, test_size=0.2, stratify=encoded_labels, random_state=42
         )
 
         # Compute class-balanced weights
@@ -67,9 +70,26 @@ class XGBoostClassifier(MLAdapter):
         log.info(f"Validation accuracy: {acc_val:.3f}", module=Module.XGB)
 
         y_pred = self._clf.predict(x_val)
-        report = classification_report(y_val, y_pred, zero_division=0)
+        report = classification_report(
+            self._encoder.inverse_transform(y_val),
+            self._encoder.inverse_transform(y_pred),
+            zero_division=0
+        )
         log.info("Per-class performance:\n" + report, module=Module.XGB)
 
+    @property
+    def n_estimators(self) -> int:
+        """
+        The number of boosting rounds.
+        """
+        return self._clf.n_estimators
+
+    @property
+    def classes_(self) -> List[str]:
+        if hasattr(self._encoder, 'classes_'):
+            return self._encoder.classes_.tolist()
+        return []
+
     def predict(self, data: List[List[float]]) -> List[str]:
         """
         Predict labels for given samples.
@@ -78,4 +98,4 @@ class XGBoostClassifier(MLAdapter):
         """
         x_scaled = self._scaler.transform(data)
         preds = self._clf.predict(x_scaled)
-        return preds.tolist()
+        return self._encoder.inverse_transform(preds).tolist()
@@ -1,20 +1,38 @@
 #!/usr/bin/env python3
 import random
 import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from copy import deepcopy
-from enum import Enum
-from typing import List, Dict, Any, Tuple
-
-import numpy as np
-from matplotlib import pyplot as plt
-from sklearn.metrics import classification_report, confusion_matrix
+from typing import List, Dict, Any, Tuple, Mapping, Optional, Callable
 
 import config
+from evaluation.evaluation_store import evaluation_store
 from logging_framework.log_handler import Module, log
+from metrics.metrics import metrics, Counter, Gauge, Histogram
+from metrics.tracing import Trace
 from ml_adapters.abstract_ml_adapter import MLAdapter, SampleStrategy
 from ml_adapters.ml_handler import ml_handler
 from model.models import Sample, SampleGroup
+from model_store import model_store
 from persistence.database_handler import database_handler as db
+from training_orchestrator import training_orchestrator, TrainingResult
+
+
+PREDICT_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_ml_predict_seconds', 'Prediction latency per model.', ['model']
+)
+TRAIN_SECONDS: Histogram = metrics.histogram(
+    'smellinspector_ml_train_seconds', 'Duration of (re-)training runs.', ['kind'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+TRAIN_SAMPLES: Gauge = metrics.gauge(
+    'smellinspector_ml_train_samples', 'Dataset size of the last training run.', ['split']
+)
+SAMPLES_ADDED: Counter = metrics.counter(
+    'smellinspector_ml_samples_added_total', 'Samples received through /new.'
+)
 
 
 class ReTrainer:
@@ -31,25 +49,40 @@ class ReTrainer:
         log.info(f'Reading training data from {config.DATABASE_FILE_PATH}', module=Module.PRE)
         data: List[Dict[str, Any]] = db.get_labelled_data()
         log.info('Total Data Entries:', len(data), module=Module.PRE)
-        if enable_quantities:
-            return [Sample(
-                label=d['label'].strip().lower() + ' ' + d.get('quantity', ''),
-                data=[float(dp) for dp in d['data']],
-                humidity=d['humidity']
-            ) for d in data]
-        return [Sample(
-            label=d['label'].strip().lower(),
-            data=[float(dp) for dp in d['data']],
-            humidity=d['humidity']
+        return [ReTrainer._to_sample(
+            data=d['data'],
+            label=d['label'],
+            quantity=d.get('quantity', ''),
+            humidity=d['humidity'],
+            enable_quantities=enable_quantities
         ) for d in data]
 
     @staticmethod
-    def _train_model(data: List[List[float]], labels: List[str], model_idx: int) -> MLAdapter:
-        model_id: str = ml_handler.get_available_models()[model_idx]
-        model: Dict[str, any] = ml_handler.create_instance(model_id)
-        classifier: MLAdapter = model['instance']
-        classifier.fit(data, labels)
-        return classifier
+    def _to_sample(
+            data: List[str | float],
+            label: str,
+            quantity: str,
+            humidity: str | float,
+            enable_quantities: bool = False
+    ) -> Sample:
+        """
+        Converts a raw data entry into a sample, appending the quantity to the label if enabled.
+        :param data: the 64 sensor values.
+        :param label: the substance name.
+        :param quantity: the substance quantity.
+        :param humidity: the measured humidity.
+        :param enable_quantities: whether the quantity is part of the label.
+        :return: the converted sample.
+        """
+        if enable_quantities:
+            label = label.strip().lower() + ' ' + (quantity or '')
+        else:
+            label = label.strip().lower()
+        return Sample(
+            label=label,
+            data=[float(dp) for dp in data],
+            humidity=float(humidity)
+        )
 
     @staticmethod
     def _predict_random(model: MLAdapter, data: List[List[float]], labels: List[str]) -> None:
@@ -57,21 +90,27 @@ class ReTrainer:
         predicted_label: List[str] = model.predict([data[random_idx]])
         log.info('Predicted label:', predicted_label[0], 'actual:', labels[random_idx], module=Module.PRE)
 
-    def predict(self, data: List[float]) -> Dict[str, str]:
+    def predict(self, data: List[float], trace: Optional[Trace] = None) -> Dict[str, str]:
         """
         Makes label predictions for the given data point using all available ML adapters.
         :param data: the data from the sensor - an array of 64 values.
+        :param trace: (Optional) records a span per model.
         :return: the predicted labels as a dict of model name to predicted label.
         """
         results: Dict[str, str] = {}
         for model_name, classifier in self.classifiers.items():
             try:
-                results[model_name] = classifier.predict([data])[0]
+                with PREDICT_SECONDS.time(model_name), self._span(trace, f'predict:{model_name}'):
+                    results[model_name] = classifier.predict([data])[0]
                 log.debug(f'Model: {model_name}, predicted label: {results[model_name]}', module=Module.PRE)
             except Exception as e:
                 log.error(f'Error trying to predict label with model {model_name}. Trace:', e, module=Module.PRE)
         return results
 
+    @staticmethod
+    def _span(trace: Optional[Trace], stage: str):
+        return nullcontext() if trace is None else trace.span(stage)
+
     @staticmethod
     def _create_sample_groups_for_each_sample(samples: List[Sample]) -> List[SampleGroup]:
         """
@@ -204,38 +243,31 @@ class ReTrainer:
         return x_bal, y_bal
 
     @staticmethod
-    def save_confusion_matrix(y_true, y_pred, labels, title, filename):
-        cm = confusion_matrix(y_true, y_pred, labels=labels)
-        fig, ax = plt.subplots(figsize=(6, 5))
-        im = ax.imshow(cm, interpolation="nearest", cmap=plt.cm.Blues)
-
-        # Title and colorbar
-        ax.set_title(title)
-        plt.colorbar(im, ax=ax)
-
-        # Tick marks and labels
-        tick_marks = np.arange(len(labels))
-        ax.set_xticks(tick_marks)
-        ax.set_xticklabels(labels, rotation=45, ha="right")
-        ax.set_yticks(tick_marks)
-        ax.set_yticklabels(labels)
-
-        # Annotate cells
-        thresh = cm.max() / 2.0
-        for i in range(cm.shape[0]):
-            for j in range(cm.shape[1]):
-                ax.text(
-                    j, i, format(cm[i, j], "d"),
-                    ha="center", va="center",
-                    color="white" if cm[i, j] > thresh else "black"
-                )
-
-        ax.set_ylabel("True label")
-        ax.set_xlabel("Predicted label")
-        fig.tight_layout()
-        plt.savefig(filename, dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        log.info(f"Confusion matrix saved to {filename}", module=Module.RF)
+    def _report_results(
+            run_id: str,
+            model_name: str,
+            y_test: List[str],
+            y_pred: List[str],
+            labels: List[str]
+    ) -> None:
+        """
+        Stores the confusion matrix and classification report of a trained model.
+        Runs on the report executor, off the training critical path. Rendering happens on demand only.
+        """
+        try:
+            evaluation_store.save_model_evaluation(run_id, model_name, y_test, y_pred, labels)
+        except Exception as e:
+            log.error(f'Error storing {model_name} evaluation. Trace:', e, module=Module.PRE)
+
+    @staticmethod
+    def _report_run(run_id: str, y_train: List[str], y_test: List[str]) -> None:
+        """
+        Stores the label distributions of a training run.
+        """
+        try:
+            evaluation_store.save_run(run_id, y_train, y_test)
+        except Exception as e:
+            log.error(f'Error storing evaluation run {run_id}. Trace:', e, module=Module.PRE)
 
     def _train_models(
             self,
@@ -250,6 +282,7 @@ class ReTrainer:
         Trains all available ML models and returns them as a dict of names to MLAdapter objects.
         :return: the dictionary of names to MLAdapter objects.
         """
+        start: float = time.perf_counter()
         _samples: List[Sample] = self._get_available_data(
             enable_quantities=enable_quantities
         )
@@ -273,42 +306,76 @@ class ReTrainer:
             use_only_humidity=use_only_humidity
         )
 
-        unique_train, counts_train = np.unique(y_train, return_counts=True)
-        unique_test, counts_test = np.unique(y_test, return_counts=True)
-
-        print("Train label distribution:")
-        for label, count in zip(unique_train, counts_train):
-            print(f"  {label}: {count}")
-
-        print("\nTest label distribution:")
-        for label, count in zip(unique_test, counts_test):
-            print(f"  {label}: {count}")
-
+        TRAIN_SAMPLES.set(len(x_train), 'train')
+        TRAIN_SAMPLES.set(len(x_test), 'test')
+        run_id: str = evaluation_store.new_run_id()
+        self._report_executor.submit(self._report_run, run_id, y_train, y_test)
+        results: Dict[str, TrainingResult] = training_orchestrator.train(
+            model_names=ml_handler.get_available_models(),
+            x_train=x_train,
+            y_train=y_train,
+            x_test=x_test
+        )
         classifiers: Dict[str, MLAdapter] = {}
-        for i, model_name in enumerate(ml_handler.get_available_models()):
-            try:
-                log.info(f'Training {model_name} classifier...', module=Module.PRE)
-                _classifier = self._train_model(x_train, y_train, i)
-                y_pred = _classifier.predict(x_test)
-                report = classification_report(y_test, y_pred, digits=3)
-                self.save_confusion_matrix(
-                    y_test,
-                    y_pred,
-                    _classifier.classes_,
-                    "Substance Classifier Confusion Matrix",
-                    f"{model_name}_confusion_matrix_substances.png"
-                )
-                log.info(f"=== {model_name} Classification Report ===", module=Module.PRE)
-                log.info(report, module=Module.PRE)
-                classifiers[model_name] = _classifier
-            except Exception as e:
-                log.error(f'Error training {model_name} classifier. Trace:', e, module=Module.PRE)
+        for model_name, result in results.items():
+            classifiers[model_name] = result.classifier
+            self._report_executor.submit(
+                self._report_results,
+                run_id,
+                model_name,
+                y_test,
+                result.y_pred,
+                result.classifier.classes_
+            )
+        TRAIN_SECONDS.observe(time.perf_counter() - start, 'full')
         return classifiers
 
+    def _incremental_update_possible(self) -> bool:
+        """
+        Checks whether all active models can be updated incrementally.
+        :return: True if all trained models support partial_fit, False otherwise.
+        """
+        if not len(self.classifiers):
+            return False
+        return all(classifier.supports_partial_fit for classifier in self.classifiers.values())
+
+    def _update_models_incrementally(self) -> None:
+        """
+        Updates all models with the pending batch of samples.
+        Falls back to a full re-training if the batch cannot be applied incrementally (e.g. new labels).
+        """
+        batch: List[Sample] = self._pending_samples
+        self._pending_samples = []
+        x, y = self._prepare_balanced_data(
+            [SampleGroup(label='batch', samples=batch)],
+            balance=False,
+            enable_humidity=config.ENABLE_HUMIDITY,
+            average_values_across_sensors=config.COMPUTE_AVERAGES,
+            use_only_humidity=config.HUMIDITY_ONLY  # Experimental only
+        )
+        start: float = time.perf_counter()
+        try:
+            # Incremental models are small (linear), so the update is applied to copies that are then
+            # published as a new generation, keeping the active generation immutable.
+            classifiers: Dict[str, MLAdapter] = {}
+            for model_name, classifier in self.classifiers.items():
+                classifiers[model_name] = deepcopy(classifier)
+                classifiers[model_name].partial_fit(x, y)
+            model_store.publish(classifiers)
+            TRAIN_SECONDS.observe(time.perf_counter() - start, 'incremental')
+            log.info(f'Updated models incrementally with {len(x)} samples.', module=Module.PRE)
+        except (ValueError, NotImplementedError) as e:
+            log.info('Incremental update not possible, re-training models. Reason:', e, module=Module.PRE)
+            self._re_train_models()
+
     def _re_train_models(self) -> None:
-        old_model_data = deepcopy(self.classifiers)
+        """
+        Re-trains all models and publishes them as a new generation.
+        The active generation stays in use until the new one is complete, so no copy is needed for rollback.
+        """
+        self._pending_samples = []
         try:
-            self.classifiers = self._train_models(
+            classifiers: Dict[str, MLAdapter] = self._train_models(
                 enable_quantities=config.ENABLE_QUANTITIES,
                 balance=config.BALANCE_DATASET,
                 balance_strategy=config.BALANCE_STRATEGY,
@@ -316,28 +383,63 @@ class ReTrainer:
                 average_values_across_sensors=config.COMPUTE_AVERAGES,
                 use_only_humidity=config.HUMIDITY_ONLY  # Experimental only
             )
+            if not len(classifiers):
+                raise ValueError('No model was trained successfully.')
+            model_store.publish(classifiers)
             log.info('Re-trained successfully.', module=Module.PRE)
         except Exception as e:
-            log.error('Error re-training classifiers, reverting. Trace:', e, module=Module.PRE)
-            self.classifiers = old_model_data
+            log.error('Error re-training classifiers, keeping current models. Trace:', e, module=Module.PRE)
 
-    def add_data(self, data: List[str], label: str, quantity: str, humidity: str) -> None:
+    def add_data(
+            self,
+            data: List[str],
+            label: str,
+            quantity: str,
+            humidity: str,
+            trace: Optional[Trace] = None
+    ) -> None:
         try:
             log.debug('Adding training data. Current count:', self._re_training_count, module=Module.PRE)
-            db.add_data(data, label, quantity, humidity)
+            with self._span(trace, 'ingest'):
+                db.add_data(data, label, quantity, humidity)
+            SAMPLES_ADDED.inc()
+            if self._incremental_update_possible():
+                self._pending_samples.append(self._to_sample(
+                    data=data,
+                    label=label,
+                    quantity=quantity,
+                    humidity=humidity,
+                    enable_quantities=config.ENABLE_QUANTITIES
+                ))
+                if len(self._pending_samples) >= config.INCREMENTAL_BATCH_SIZE:
+                    with self._span(trace, 'incremental_update'):
+                        self._update_models_incrementally()
+                return
             self._re_training_count += 1
             if self._re_training_count >= config.RE_TRAINING_RATE:
                 self._re_training_count = 0
                 log.info('Reached re-training threshold, re-training models.')
-                self._re_train_models()
+                with self._span(trace, 're_train'):
+                    self._re_train_models()
         except Exception as e:
             log.error('Error adding training data. Trace:', e, module=Module.PRE)
 
     def persist_from_db_data(self, database: str) -> None:
+        self._persist_and_train(lambda: db.persist_from_db_data(database, re_label=True))
+
+    def persist_from_db_file(self, filename: str) -> None:
+        """
+        Loads a backend database file and re-trains all models.
+        :param filename: the backend database file.
+        """
+        self._persist_and_train(lambda: db.persist_from_db_file(filename, re_label=True))
+
+    def _persist_and_train(self, persist: Callable[[], None]) -> None:
         try:
-            db.persist_from_db_data(database, re_label=True)
+            persist()
+            self._pending_samples = []
             log.info('Persisted successfully. Training models...', module=Module.PRE)
-            self.classifiers = self._train_models(
+            classifiers: Dict[str, MLAdapter] = self._train_models(
                 enable_quantities=config.ENABLE_QUANTITIES,
                 balance=config.BALANCE_DATASET,
                 balance_strategy=config.BALANCE_STRATEGY,
@@ -345,13 +447,24 @@ class ReTrainer:
                 average_values_across_sensors=config.COMPUTE_AVERAGES,
                 use_only_humidity=config.HUMIDITY_ONLY  # Experimental only
             )
+            if not len(classifiers):
+                raise ValueError('No model was trained successfully, keeping current models.')
+            model_store.publish(classifiers)
             log.info('Models trained successfully.', module=Module.PRE)
         except Exception as e:
             log.error('Error persisting training data. Trace:', e, module=Module.PRE)
 
+    @property
+    def classifiers(self) -> Mapping[str, MLAdapter]:
+        """
+        The classifiers of the active model generation.
+        """
+        return model_store.get_classifiers()
+
     def __init__(self):
-        self.classifiers: Dict[str, MLAdapter] = {}
         self._re_training_count: int = 0
+        self._pending_samples: List[Sample] = []
+        self._report_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
 
 
 re_trainer: ReTrainer = ReTrainer()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Deque, Optional
+
+import config
+from logging_framework.log_handler import Module, log
+from ml_adapters.abstract_ml_adapter import MLAdapter
+
+
+@dataclass(frozen=True)
+class ModelGeneration:
+    version: int
+    created: str
+    classifiers: Mapping[str, MLAdapter]
+
+
+class ModelStore:
+    """
+    Keeps the trained models as immutable generations.
+    A new generation is published atomically after a successful training run, while the previous
+    generations are retained (by reference, not copied) for rollback.
+    """
+
+    _EMPTY: Mapping[str, MLAdapter] = MappingProxyType({})
+
+    def current(self) -> Optional[ModelGeneration]:
+        """
+        Get the active model generation.
+        :return: the active generation, or None if no models were published yet.
+        """
+        generations = self._generations
+        if not len(generations):
+            return None
+        return generations[-1]
+
+    def get_classifiers(self) -> Mapping[str, MLAdapter]:
+        """
+        Get the classifiers of the active generation.
+        :return: a read-only dict of model names to MLAdapter objects.
+        """
+        generation: Optional[ModelGeneration] = self.current()
+        if generation is None:
+            return self._EMPTY
+        return generation.classifiers
+
+    def publish(self, classifiers: Dict[str, MLAdapter]) -> ModelGeneration:
+        """
+        Publishes a new generation of classifiers and makes it the active one.
+        The oldest generations are dropped once the retention limit is reached.
+        :param classifiers: a dict of model names to trained MLAdapter objects.
+        :return: the published generation.
+        """
+        with self._lock:
+            self._version += 1
+            generation: ModelGeneration = ModelGeneration(
+                version=self._version,
+                created=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                classifiers=MappingProxyType(dict(classifiers))
+            )
+            self._generations.append(generation)
+        log.info(f'Published model generation {generation.version} with models:',
+                 list(classifiers.keys()), module=Module.STORE)
+        return generation
+
+    def rollback(self) -> ModelGeneration:
+        """
+        Discards the active generation and re-activates the previous one.
+        :return: the re-activated generation.
+        :raise ValueError: if no previous generation is retained.
+        """
+        with self._lock:
+            if len(self._generations) < 2:
+                raise ValueError('No previous model generation available.')
+            discarded: ModelGeneration = self._generations.pop()
+            generation: ModelGeneration = self._generations[-1]
+        log.info(f'Rolled back from model generation {discarded.version} to {generation.version}.',
+                 module=Module.STORE)
+        return generation
+
+    def get_generations(self) -> List[Dict[str, Any]]:
+        """
+        Get an overview of the retained generations, newest first.
+        :return: the version, creation time and model names of each generation.
+        """
+        # publish/rollback mutate the deque from other threads, iterating it directly may raise RuntimeError
+        with self._lock:
+            generations: List[ModelGeneration] = list(self._generations)
+        return [{
+            'version': generation.version,
+            'created': generation.created,
+            'models': list(generation.classifiers.keys()),
+        } for generation in reversed(generations)]
+
+    def __init__(self, retained_generations: int = 2):
+        """
+        Default constructor.
+        :param retained_generations: the number of generations kept, including the active one.
+        """
+        self._generations: Deque[ModelGeneration] = deque(maxlen=max(1, retained_generations))
+        self._version: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+
+model_store: ModelStore = ModelStore(retained_generations=config.RETAINED_MODEL_GENERATIONS)
@@ -2,14 +2,13 @@
 import base64
 import os.path
 import sqlite3
+import threading
 import traceback
 import uuid
-import config
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 import config
 from logging_framework.log_handler import log as logger, Module
-from ml_adapters import data_relabeller
 from persistence.queries import data_queries
 
 
@@ -126,6 +125,7 @@ class DatabaseHandler:
             'humidity': result['HUMIDITY']
         } for result in results]
         if re_label_using_avg_humidity:
+            from ml_adapters import data_relabeller
             logger.info('Re-labeling data with average humidity.', module=Module.DB)
             data_relabeller.re_label_data(data)
         return data
@@ -159,23 +159,53 @@ class DatabaseHandler:
 
     def persist_from_db_data(self, data: str, re_label: bool = False) -> None:
         try:
-            logger.info('Resetting database...', module=Module.DB)
-            self.conn = self._init_db()
-            logger.info('Attempting to load data from db file...', module=Module.DB)
             temp_filename: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), uuid.uuid4().hex + '.db')
-            data = base64.b64decode(data)
             with open(temp_filename, 'wb') as f:
-                f.write(data)
-            self._parse_data(temp_filename, re_label_using_avg_humidity=re_label)
+                f.write(base64.b64decode(data))
+        except Exception as e:
+            logger.error('Error persisting data from companion software. Trace:', e, module=Module.DB)
+            return
+        try:
+            self.persist_from_db_file(temp_filename, re_label=re_label)
+        finally:
             os.remove(temp_filename)
+
+    def persist_from_db_file(self, filename: str, re_label: bool = False) -> None:
+        """
+        Replaces the database contents with the data of a backend database file (e.g. a streamed snapshot).
+        :param filename: the backend database file.
+        :param re_label: whether to re-label the samples using the average humidity.
+        """
+        try:
+            logger.info('Resetting database...', module=Module.DB)
+            self.conn = self._init_db()
+            logger.info('Attempting to load data from db file...', module=Module.DB)
+            self._parse_data(filename, re_label_using_avg_humidity=re_label)
             logger.info('Loaded data from db file.', module=Module.DB)
         except Exception as e:
             logger.error('Error persisting data from companion software. Trace:', e, module=Module.DB)
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        The database connection. The database is (re-)created on first use instead of at import time,
+        so that importing the service stays fast and respects the standalone flag.
+        """
+        if self._conn is None:
+            with self._init_lock:
+                if self._conn is None:
+                    self._conn = self._init_db()
+                    logger.info('Database Handler initialized.', module=Module.DB)
+        return self._conn
+
+    @conn.setter
+    def conn(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
     def __init__(self):
         logger.info('Starting Database Handler...', module=Module.DB)
-        self.conn: sqlite3.Connection = self._init_db()
-        logger.info('Database Handler initialized.', module=Module.DB)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._init_lock: threading.Lock = threading.Lock()
 
 
 database_handler: DatabaseHandler = DatabaseHandler()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Start-up profile of the ML service, based on "python -X importtime".
+Ensures heavy dependencies are not imported when the service module is loaded.
+"""
+import os
+import subprocess
+import sys
+from typing import Dict
+
+ML_SERVICE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['matplotlib', 'sklearn', 'scipy', 'xgboost', 'numpy']
+# Cumulative import time budget for "import app" in microseconds.
+IMPORT_TIME_BUDGET_US: int = int(os.getenv('IMPORT_TIME_BUDGET_US', 1_500_000))
+
+
+def _profile_imports(module: str = 'app') -> Dict[str, int]:
+    """
+    Imports the given module in a fresh interpreter with -X importtime.
+    :param module: the module to import.
+    :return: a dict of imported module names to their cumulative import time in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ML_SERVICE_DIR,
+        env={**os.environ, 'LOGFILE': os.devnull},
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stderr
+    imports: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            imports[fields[2].strip()] = int(fields[1])
+        except (IndexError, ValueError):
+            continue  # Header line
+    return imports
+
+
+def test_no_heavy_imports_on_startup():
+    imports = _profile_imports()
+    for heavy_module in HEAVY_MODULES:
+        loaded = [name for name in imports if name == heavy_module or name.startswith(heavy_module + '.')]
+        assert not loaded, f'"{heavy_module}" is imported on start-up: {loaded[:5]}'
+
+
+def test_startup_import_time_budget():
+    imports = _profile_imports()
+    assert 'app' in imports
+    assert imports['app'] <= IMPORT_TIME_BUDGET_US, \
+        f'Importing the service took {imports["app"]}us (budget: {IMPORT_TIME_BUDGET_US}us).'
+
+
+def test_database_not_created_on_import():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import app; from persistence.database_handler import database_handler; '
+                               'print(database_handler._conn is None)'],
+        cwd=ML_SERVICE_DIR,
+        env={**os.environ, 'LOGFILE': os.devnull},
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('True')
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Training workers are reused across re-trainings and start without the service's main module and logger.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ML_SERVICE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_SCRIPT: str = '''
+import json
+import os
+import sys
+
+# module-level side effects like the Flask app of app.py, must only run in the service process
+with open(os.environ['IMPORT_MARKER'], 'a') as f:
+    f.write(f'{os.getpid()}\\n')
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.environ['ML_SERVICE_DIR'])
+    from training_orchestrator import training_orchestrator
+
+    x = [[i % 3, i % 5, i % 7] for i in range(90)]
+    y = [str(i % 3) for i in range(90)]
+    trained = [sorted(training_orchestrator.train(['KNN', 'RF'], x, y, x)) for _ in range(2)]
+    pool = training_orchestrator._get_pool()
+    probe = "(sorted(m for m in ('app', 'flask', 'waitress') if m in __import__('sys').modules), " \\
+            "getattr(__import__('sys').modules.get('__mp_main__'), '__file__', None), " \\
+            "__import__('threading').active_count(), __import__('os').environ['LOGFILE'])"
+    modules, main_file, threads, logfile = pool.submit(eval, probe).result()
+    print(json.dumps({'trained': trained, 'reused': pool is training_orchestrator._get_pool(), 'modules': modules,
+                      'main_file': main_file, 'threads': threads, 'logfile': logfile}))
+'''
+
+
+def test_workers_do_not_import_the_service(tmp_path):
+    script = tmp_path / 'service.py'
+    script.write_text(SERVICE_SCRIPT)
+    marker, logfile = tmp_path / 'imports', tmp_path / 'service.log'
+    env = {**os.environ, 'IMPORT_MARKER': str(marker), 'ML_SERVICE_DIR': ML_SERVICE_DIR, 'LOGFILE': str(logfile),
+           'LOG_LEVEL': 'info', 'TRAINING_WORKERS': '2'}
+    result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            timeout=300)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report['trained'] == [['KNN', 'RF'], ['KNN', 'RF']]
+    assert report['reused']
+    assert len(marker.read_text().split()) == 1
+    assert report['modules'] == [] and report['main_file'] != str(script)
+    assert report['threads'] == 1 and report['logfile'] == os.devnull
+    assert logfile.read_text().count('Training KNN classifier...') == 2
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from importlib.machinery import ModuleSpec
+from typing import List, Dict, Optional, TYPE_CHECKING
+
+import config
+from logging_framework.log_handler import Module, log
+from training_worker import TrainingResult, fit_model, init_worker
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class TrainingOrchestrator:
+    """
+    Trains multiple ML models concurrently in a persistent pool of stateless worker processes.
+    The pool is started on the first concurrent training and reused by every re-training, the workers are forked
+    from a forkserver that only preloaded training_worker (not the service) and don't write the service's logfile.
+    The feature matrices are written once to disk and memory-mapped read-only by every worker,
+    so they are not pickled per model.
+    """
+
+    @staticmethod
+    def _get_mp_context() -> multiprocessing.context.BaseContext:
+        """
+        Get the multiprocessing context for the worker pool.
+        The service process is multithreaded (request threads, log writer) and has initialised OpenMP during
+        pre-training, forking it can deadlock the workers on locks held by other threads. The forkserver is a fresh,
+        single-threaded interpreter that imports training_worker once, forking a worker from it is cheap.
+        :return: the multiprocessing context.
+        """
+        context: multiprocessing.context.BaseContext = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['training_worker'])
+        return context
+
+    @staticmethod
+    def __detach_main_module() -> None:
+        """
+        Workers restore the parent's main module by importing it again as __mp_main__, for the service that is
+        app.py with its Flask app, metrics and model store. They only run training_worker, and multiprocessing skips
+        a main module named '__main__'.
+        """
+        main_module = sys.modules['__main__']
+        spec: Optional[ModuleSpec] = getattr(main_module, '__spec__', None)
+        if spec is None or spec.name != '__main__':
+            main_module.__spec__ = ModuleSpec('__main__', None)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the worker pool, starting it on first use.
+        """
+        with self.__lock:
+            if self.__pool is None:
+                self.__detach_main_module()
+                self.__pool = ProcessPoolExecutor(
+                    max_workers=config.TRAINING_WORKERS,
+                    mp_context=self._get_mp_context(),
+                    initializer=init_worker
+                )
+            return self.__pool
+
+    def __discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """
+        Drops a broken pool (e.g. a worker was killed), the next training starts a new one.
+        """
+        with self.__lock:
+            if self.__pool is pool:
+                self.__pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _train_sequentially(
+            model_names: List[str],
+            x_train: 'np.ndarray',
+            y_train: List[str],
+            x_test: 'np.ndarray'
+    ) -> Dict[str, TrainingResult]:
+        results: Dict[str, TrainingResult] = {}
+        for model_name in model_names:
+            try:
+                log.info(f'Training {model_name} classifier...', module=Module.PRE)
+                results[model_name] = fit_model(model_name, x_train, y_train, x_test)
+            except Exception as e:
+                log.error(f'Error training {model_name} classifier. Trace:', e, module=Module.PRE)
+        return results
+
+    def _train_in_pool(
+            self,
+            model_names: List[str],
+            x_train: 'np.ndarray',
+            y_train: List[str],
+            x_test: 'np.ndarray'
+    ) -> Dict[str, TrainingResult]:
+        import numpy as np
+
+        results: Dict[str, TrainingResult] = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            x_train_path: str = os.path.join(tmp_dir, 'x_train.npy')
+            x_test_path: str = os.path.join(tmp_dir, 'x_test.npy')
+            np.save(x_train_path, x_train)
+            np.save(x_test_path, x_test)
+            pool: ProcessPoolExecutor = self._get_pool()
+            futures: Dict[str, Future] = {}
+            for model_name in model_names:
+                log.info(f'Training {model_name} classifier...', module=Module.PRE)
+                futures[model_name] = pool.submit(fit_model, model_name, x_train_path, y_train, x_test_path)
+            for model_name, future in futures.items():
+                try:
+                    results[model_name] = future.result()
+                except BrokenProcessPool as e:
+                    log.error(f'Worker of the {model_name} classifier died. Trace:', e, module=Module.PRE)
+                    self.__discard_pool(pool)
+                except Exception as e:
+                    log.error(f'Error training {model_name} classifier. Trace:', e, module=Module.PRE)
+        return results
+
+    def train(
+            self,
+            model_names: List[str],
+            x_train: List[List[float]],
+            y_train: List[str],
+            x_test: List[List[float]]
+    ) -> Dict[str, TrainingResult]:
+        """
+        Trains the given models and predicts the test set with each of them.
+        Models that fail to train are logged and left out of the result.
+        :param model_names: the ML model type names to train.
+        :param x_train: the training features.
+        :param y_train: the training labels.
+        :param x_test: the test features.
+        :return: a dict of model names to training results.
+        """
+        import numpy as np
+
+        x_train: 'np.ndarray' = np.asarray(x_train, dtype=np.float64)
+        x_test: 'np.ndarray' = np.asarray(x_test, dtype=np.float64)
+        workers: int = min(config.TRAINING_WORKERS, len(model_names))
+        if workers <= 1:
+            return self._train_sequentially(model_names, x_train, y_train, x_test)
+        log.info(f'Training {len(model_names)} models with {workers} worker processes...', module=Module.PRE)
+        return self._train_in_pool(model_names, x_train, y_train, x_test)
+
+    def __init__(self):
+        self.__pool: Optional[ProcessPoolExecutor] = None
+        self.__lock: threading.Lock = threading.Lock()
+
+
+training_orchestrator: TrainingOrchestrator = TrainingOrchestrator()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Entry module of the training worker processes (see TrainingOrchestrator).
+
+The forkserver preloads this module and forks the workers from it. It imports neither the service nor the logging
+framework, the model adapters (and with them config and the logger) are imported by the workers after init_worker
+pointed the logger away from the service's logfile.
+"""
+import os
+from dataclasses import dataclass
+from typing import List, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ml_adapters.abstract_ml_adapter import MLAdapter
+
+
+@dataclass
+class TrainingResult:
+    model_name: str
+    classifier: 'MLAdapter'
+    y_pred: List[str]
+
+
+def init_worker() -> None:
+    """
+    Runs once in every worker process before the first model is trained.
+    Workers log errors to the console only, without a writer thread. The service process logs the training progress
+    and owns (and rotates) the logfile.
+    """
+    os.environ['LOGFILE'] = os.devnull
+    os.environ['LOG_LEVEL'] = 'silent'
+    os.environ['LOG_QUEUE_SIZE'] = '0'
+
+
+def fit_model(model_name: str, x_train: Any, y_train: List[str], x_test: Any) -> TrainingResult:
+    """
+    Trains a single model and predicts the test set.
+    :param model_name: the ML model type name.
+    :param x_train: the training features, or the path of a .npy file to memory-map.
+    :param y_train: the training labels.
+    :param x_test: the test features, or the path of a .npy file to memory-map.
+    :return: the trained model and its test set predictions.
+    """
+    import numpy as np
+    from ml_adapters.ml_handler import ml_handler
+
+    if isinstance(x_train, str):
+        x_train = np.load(x_train, mmap_mode='r')
+    if isinstance(x_test, str):
+        x_test = np.load(x_test, mmap_mode='r')
+    classifier: 'MLAdapter' = ml_handler.create_instance(model_name)['instance']
+    classifier.fit(x_train, y_train)
+    y_pred: List[str] = list(classifier.predict(x_test))
+    return TrainingResult(model_name=model_name, classifier=classifier, y_pred=y_pred)